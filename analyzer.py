@@ -4,20 +4,32 @@ import re
 import random
 import string
 import math
+import heapq
+from functools import partial
+from operator import itemgetter
 # 尝试导入 jieba_fast（更快），如果失败则回退到 jieba（标准版本）
 try:
     import jieba_fast as jieba
 except ImportError:
     import jieba
 from collections import Counter, defaultdict
+# numpy 为可选依赖，未安装时退回纯 Python 统计
+try:
+    import numpy as np
+except ImportError:
+    np = None
 import config as cfg
 from utils import (
     is_emoji,
-    parse_timestamp,
-    parse_datetime,
-    clean_text,
     calculate_entropy,
     analyze_single_chars,
+    read_stopwords_file,
+)
+from sketch import SpaceSavingCounter
+from progress import as_tracker
+from interaction_graph import InteractionGraphBuilder, REPLY, AT
+from corpus import (
+    MessageColumns, RepeatChains, BOT_SUB_MSG_TYPES, build_uin_to_name, get_corpus, reply_ref_id,
 )
 from logger import get_logger, init_logging
 
@@ -34,11 +46,30 @@ except (AttributeError, Exception):
 logger = get_logger('analyzer')
 
 _STOPWORDS_CACHE = None
+_STOPWORDS_LOADED = False  # 缓存中是否为已从文件加载的停用词（而非禁用时的空集合）
 
 _DIGIT_SYMBOL_PATTERN = re.compile(r'^[\d\W]+$')
 _URL_PATTERN = re.compile(r'https?://')
 _SENTENCE_SPLIT_PATTERN = re.compile(r'[，。！？、；：""''（）\s\n\r,\.!?\(\)]')
 
+# 趣味榜单名称 -> ChatAnalyzer 上的统计字段（顺序即报告中的展示顺序）
+RANKING_FIELDS = [
+    ('话痨榜', 'user_msg_count'),
+    ('字数榜', 'user_char_count'),
+    ('长文王', 'user_char_per_msg'),
+    ('图片狂魔', 'user_image_count'),
+    ('合并转发王', 'user_forward_count'),
+    ('回复狂', 'user_reply_count'),
+    ('被回复最多', 'user_replied_count'),
+    ('艾特狂', 'user_at_count'),
+    ('被艾特最多', 'user_ated_count'),
+    ('表情帝', 'user_emoji_count'),
+    ('链接分享王', 'user_link_count'),
+    ('深夜党', 'user_night_count'),
+    ('早起鸟', 'user_morning_count'),
+    ('复读机', 'user_repeat_count'),
+]
+
 def load_stopwords(force_enable=None):
     """
     加载停用词
@@ -46,14 +77,14 @@ def load_stopwords(force_enable=None):
     Args:
         force_enable: 如果为True，强制加载停用词；如果为False，强制不加载；如果为None，使用配置文件的值
     """
-    global _STOPWORDS_CACHE
+    global _STOPWORDS_CACHE, _STOPWORDS_LOADED
     
     # 如果强制禁用，直接返回空集合
     if force_enable is False:
         return set()
     
-    # 如果缓存已存在且不是强制启用，直接返回缓存
-    if _STOPWORDS_CACHE is not None and force_enable is not True:
+    # 如果缓存已存在且不是强制启用（或已加载过停用词文件），直接返回缓存
+    if _STOPWORDS_CACHE is not None and (force_enable is not True or _STOPWORDS_LOADED):
         return _STOPWORDS_CACHE
     
     # 决定是否启用停用词
@@ -88,8 +119,7 @@ def load_stopwords(force_enable=None):
     if stopwords_path:
         try:
             encoding = getattr(cfg, 'STOPWORDS_ENCODING', 'utf-8')
-            with open(stopwords_path, 'r', encoding=encoding) as f:
-                file_words = {line.strip() for line in f if line.strip() and not line.startswith('#')}
+            file_words = read_stopwords_file(stopwords_path, encoding)
             stopwords.update(file_words)
             file_count = len(file_words)
             logger.info(f"📚 从文件加载停用词 {file_count} 个 (来源: {os.path.basename(stopwords_path)})")
@@ -111,21 +141,81 @@ def load_stopwords(force_enable=None):
     logger.info(f"✅ 停用词总数: {total_count} 个 (文件: {file_count}, 手动: {manual_count})")
     
     _STOPWORDS_CACHE = stopwords
+    _STOPWORDS_LOADED = True
     return _STOPWORDS_CACHE
 
 
+def preload_shared_resources():
+    """
+    预先加载各次分析共用的资源（jieba 基础词典、停用词）
+    用作进程池的 initializer：每个工作进程只加载一次，之后的分析任务直接复用
+    """
+    if hasattr(jieba, 'initialize'):
+        jieba.initialize()
+    load_stopwords(force_enable=True)
+
+
+# 分析结果格式或统计口径变化时递增，使按内容哈希缓存的旧分析结果失效
+ANALYZER_VERSION = '1'
+
+_UNSET = object()
+
+
+class AnalysisOptions:
+    """
+    单次分析的参数
+
+    显式传入的项覆盖 config.py 中的同名配置（如 TOP_N=50、MIN_FREQ=3），其余项读取 config.py。
+    参数只保存在本对象中，不修改 config 模块，同一进程中的多个分析可以并发执行。
+    """
+
+    def __init__(self, start_date=_UNSET, end_date=_UNSET, use_stopwords=_UNSET, **overrides):
+        """
+        Args:
+            start_date: 消息起始日期（YYYY-MM-DD，包含），None 表示不限；未传入时使用 MESSAGE_START_DATE
+            end_date: 消息结束日期（YYYY-MM-DD，包含），None 表示不限；未传入时使用 MESSAGE_END_DATE
+            use_stopwords: 是否使用停用词库；未传入时使用 USE_STOPWORDS
+            **overrides: 覆盖的其他配置项，名称与 config.py 相同
+        """
+        values = {name.upper(): value for name, value in overrides.items()}
+        if start_date is not _UNSET:
+            values['MESSAGE_START_DATE'] = start_date or None
+        if end_date is not _UNSET:
+            values['MESSAGE_END_DATE'] = end_date or None
+        if use_stopwords is not _UNSET and use_stopwords is not None:
+            values['USE_STOPWORDS'] = bool(use_stopwords)
+        self._values = values
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        values = self.__dict__.get('_values', {})
+        if name in values:
+            return values[name]
+        return getattr(cfg, name)
+
+
 class ChatAnalyzer:
-    def __init__(self, data, use_stopwords=None):
+    def __init__(self, data, use_stopwords=None, progress=None, options=None):
+        """
+        Args:
+            data: 群聊数据（包含messages和chatInfo）
+            use_stopwords: 是否使用停用词库，None 时使用 options / 配置文件的值
+            progress: 可选的进度回调或 ProgressTracker（见 progress.py）
+            options: 本次分析的参数（AnalysisOptions），None 时全部使用配置文件的值
+        """
         self.data = data
+        self.options = options if options is not None else AnalysisOptions()
+        self.progress = as_tracker(progress)
         self.messages = data.get('messages', [])
         self.chat_name = data.get('chatName', data.get('chatInfo', {}).get('name', '未知群聊'))
 
-        # 如果传入了use_stopwords参数，使用传入的值；否则使用配置文件的值
+        # 如果传入了use_stopwords参数，使用传入的值；否则使用 options / 配置文件的值
         if use_stopwords is not None:
             self.use_stopwords = use_stopwords
         else:
             # 安全获取USE_STOPWORDS，如果不存在则默认为False
-            self.use_stopwords = getattr(cfg, 'USE_STOPWORDS', False)
+            self.use_stopwords = getattr(self.options, 'USE_STOPWORDS', False)
         
         # 根据use_stopwords参数决定是否加载停用词
         if self.use_stopwords:
@@ -133,10 +223,18 @@ class ChatAnalyzer:
         else:
             self.stopwords = set()
         
+        # 机器人UIN集合（仅在启用机器人过滤时生效）
+        if getattr(self.options, 'FILTER_BOT_MESSAGES', True):
+            self._bot_uins = {str(uin) for uin in getattr(self.options, 'BOT_UINS', [])}
+        else:
+            self._bot_uins = set()
+        
         self._filter_messages_and_build_mappings()
         self.word_freq = Counter()
         self.word_samples = defaultdict(list)
-        self.word_contributors = defaultdict(Counter)
+        self.contributor_mode = self._resolve_contributor_mode()
+        # 热词贡献者只统计最终 Top 热词（_count_top_word_contributors）
+        self.word_contributors = {}
         self.user_msg_count = Counter()
         self.user_char_count = Counter()
         self.user_char_per_msg = {}
@@ -151,24 +249,39 @@ class ChatAnalyzer:
         self.user_night_count = Counter()
         self.user_morning_count = Counter()
         self.user_repeat_count = Counter()
+        self.repeat_chains = None
+        self.interaction_graph = None
         self.hour_distribution = Counter()
         self.discovered_words = set()
         self.merged_words = {}
         self.single_char_stats = {}  
-        self.cleaned_texts_with_sender = []  # 改为存储 (文本, 发送者uin) 元组
+        self._text_positions = []  # 有效文本消息在共享语料中的位置
+        # numpy 分组统计：逐条消息写入列，分析结束后用 bincount 汇总
+        self._stat_columns = None
+        self._stat_arrays = {}
+        self._stat_first_seen = {}
+        # 排行快照（_filter_results 之后计算一次，供各报告生成器复用）
+        self._top_words_snapshot = None
+        self._rankings_snapshot = None
 
     
     def _filter_messages_and_build_mappings(self):
         """
-        合并时间过滤和构建 uin 到 name 及 msgid_to_sender 的映射，
+        合并时间过滤和构建 uin 到 name 的映射，
         减少两次遍历带来的性能开销
         """
-        # 安全获取时间过滤配置
-        message_start_date = getattr(cfg, 'MESSAGE_START_DATE', None)
-        message_end_date = getattr(cfg, 'MESSAGE_END_DATE', None)
+        # 安全获取时间过滤参数
+        message_start_date = getattr(self.options, 'MESSAGE_START_DATE', None)
+        message_end_date = getattr(self.options, 'MESSAGE_END_DATE', None)
         
+        # 文本清洗、时间解析、发送者下标与回复索引在加载阶段一次性完成（与 PersonalAnalyzer 共享），
+        # 之后所有按用户统计的数据都以下标为键
+        self.corpus = get_corpus(self.data)
+        self.message_index = self.corpus.index
+        self.senders = self.corpus.senders
+
         if message_start_date is None and message_end_date is None:
-            filtered_messages = self.messages
+            self._positions = range(len(self.messages))
         else:
             from datetime import datetime
             start_dt = None
@@ -192,19 +305,19 @@ class ChatAnalyzer:
                 except Exception as e:
                     logger.warning(f"结束日期格式错误: {message_end_date}, 错误: {e}")
             
-            filtered_messages = []
-            for msg in self.messages:
-                timestamp = msg.get('timestamp', '')
-                msg_dt = parse_datetime(timestamp)
-                if msg_dt is None:
+            start_ts = start_dt.timestamp() if start_dt else None
+            end_ts = end_dt.timestamp() if end_dt else None
+            self._positions = []
+            for pos, ts in enumerate(self.corpus.timestamps):
+                if ts != ts:  # 时间无效
                     continue
-                if start_dt and msg_dt < start_dt:
+                if start_ts is not None and ts < start_ts:
                     continue
-                if end_dt and msg_dt > end_dt:
+                if end_ts is not None and ts > end_ts:
                     continue
-                filtered_messages.append(msg)
+                self._positions.append(pos)
             
-            filtered_count = len(filtered_messages)
+            filtered_count = len(self._positions)
             original_count = len(self.messages)
             if start_dt or end_dt:
                 time_range = []
@@ -215,115 +328,105 @@ class ChatAnalyzer:
                 logger.info(f"⏰ 时间范围过滤: {' '.join(time_range)}")
                 logger.info(f"   原始消息: {original_count} 条, 过滤后: {filtered_count} 条")
 
-        self.messages = filtered_messages
-        
-        uin_names = defaultdict(list)
-        uin_member_names = {}
-        msgid_to_sender = {}
-        all_uins = set()
+        if not isinstance(self._positions, range):
+            self.messages = [self.messages[pos] for pos in self._positions]
+        self.uin_to_name = build_uin_to_name(
+            msg for msg in self.messages if not self._is_bot_message(msg)
+        )
 
-        for msg in self.messages:
-            if self._is_bot_message(msg):
-                continue
-            sender = msg.get('sender', {})
-            uin = sender.get('uin')
-            name = (sender.get('name') or '').strip()
-            msg_id = msg.get('messageId')
-            if uin:
-                all_uins.add(uin)
-            if uin and name:
-                if not uin_names[uin] or uin_names[uin][-1] != name:
-                    uin_names[uin].append(name)
-            if uin:
-                raw_msg = msg.get('rawMessage', {})
-                send_member_name = raw_msg.get('sendMemberName', '').strip()
-                if send_member_name:
-                    uin_member_names[uin] = send_member_name
-            if msg_id and uin:
-                msgid_to_sender[msg_id] = uin
-
-        self.uin_to_name = {}
-        for uin in all_uins:
-            chosen_name = None
-            
-            # 优先使用有效的name
-            if uin in uin_names:
-                names = uin_names[uin]
-                for name in reversed(names):
-                    if name != str(uin):
-                        chosen_name = name
-                        break
-                if chosen_name is None and names:
-                    chosen_name = names[-1]
-            
-            # 其次使用sendMemberName
-            if chosen_name is None and uin in uin_member_names:
-                chosen_name = uin_member_names[uin]
-            
-            # 兜底：使用uin本身
-            if chosen_name is None or chosen_name == str(uin):
-                chosen_name = f"用户{uin}" 
-            
-            self.uin_to_name[uin] = chosen_name
-        
-        self.msgid_to_sender = msgid_to_sender
+    def _resolve_contributor_mode(self):
+        """决定热词贡献者的统计方式：'exact'（精确）或 'sketch'（有界近似）"""
+        mode = getattr(self.options, 'CONTRIBUTOR_MODE', 'auto')
+        if mode in ('exact', 'sketch'):
+            return mode
+        if mode != 'auto':
+            logger.warning(f"未知的 CONTRIBUTOR_MODE: {mode}，使用 auto")
+        exact_max = getattr(self.options, 'CONTRIBUTOR_EXACT_MAX_MESSAGES', 200000)
+        if len(self.messages) <= exact_max:
+            return 'exact'
+        logger.info(f"📉 消息数超过 {exact_max}，热词贡献者使用 Space-Saving 近似统计")
+        return 'sketch'
+
+    def _new_contributor_table(self):
+        """创建 词 -> 贡献者计数 的映射"""
+        if self.contributor_mode == 'sketch':
+            size = max(getattr(self.options, 'CONTRIBUTOR_SKETCH_SIZE', 50), self.options.CONTRIBUTOR_TOP_N)
+            return defaultdict(partial(SpaceSavingCounter, size))
+        return defaultdict(Counter)
 
     def _is_bot_message(self, msg):
         """判断是否为机器人消息（基于 subMsgType 或 配置的机器人UIN）"""
         # 安全获取FILTER_BOT_MESSAGES，如果不存在则默认为True
-        filter_bot = getattr(cfg, 'FILTER_BOT_MESSAGES', True)
+        filter_bot = getattr(self.options, 'FILTER_BOT_MESSAGES', True)
         if not filter_bot:
             return False
         
         raw_msg = msg.get('rawMessage', {})
         sub_msg_type = raw_msg.get('subMsgType', 0)
-        if sub_msg_type in [577, 65]:
+        if sub_msg_type in BOT_SUB_MSG_TYPES:
             return True
         
-        # 安全获取BOT_UINS，如果不存在则默认为空列表
-        bot_uins = getattr(cfg, 'BOT_UINS', [])
-        if bot_uins:
+        if self._bot_uins:
             sender_uin = msg.get('sender', {}).get('uin')
-            if sender_uin and str(sender_uin) in [str(uin) for uin in bot_uins]:
+            if sender_uin and str(sender_uin) in self._bot_uins:
                 return True
         
         return False
 
     def get_name(self, uin):
-        return self.uin_to_name.get(uin, f"未知用户({uin})")
+        return self.uin_to_name.get(str(uin), f"未知用户({uin})")
+
+    def _sender_name(self, sender_idx):
+        """按发送者下标取显示名称"""
+        return self.get_name(self.senders.uin(sender_idx))
 
     def analyze(self):
         logger.info(f"📊 开始分析: {self.chat_name}")
         logger.info(f"📝 消息总数: {len(self.messages)}")
 
+        progress = self.progress
+        # 分析期间缓存分词结果（词组合并、贡献者统计复用第一轮/重新分词的结果），结束后释放
+        self.corpus.cache_tokens = True
+
         logger.info("🧹 第一轮：处理消息，预处理文本、统计词频和趣味数据...")
+        progress.start('processing', total=len(self.messages))
         self._process_messages_once()
 
         logger.info("🔤 分析单字独立性...")
-        self.single_char_stats = analyze_single_chars(
-            [text for text, _ in self.cleaned_texts_with_sender]
-        )
+        progress.start('single_chars', total=len(self._text_positions))
+        self.single_char_stats = analyze_single_chars(self._iter_texts())
 
         logger.info("🔍 新词发现...")
+        progress.start('discovering', total=len(self._text_positions))
         discovered_count = self._discover_new_words()  
 
         logger.info("🔗 词组合并...")
+        progress.start('merging', total=len(self._text_positions))
         merged_count = self._merge_word_pairs()  
 
         if discovered_count > 0 or merged_count > 0:
             logger.info(f"🔄 发现 {discovered_count} 个新词，合并 {merged_count} 个词组")
             logger.info("🔄 重新分词以应用新词...")
+            progress.start('reprocessing', total=len(self._text_positions))
             self._reprocess_word_frequency()
         
-        logger.info("🧹 释放临时内存...")
-        if self.cleaned_texts_with_sender:
-            memory_mb = len(self.cleaned_texts_with_sender) * 100 / 1024 / 1024
-            self.cleaned_texts_with_sender.clear()
-            logger.debug(f"已释放约 {memory_mb:.1f} MB 内存")
-
         logger.info("🧹 过滤整理...")
+        progress.start('filtering')
         self._filter_results()
 
+        logger.info("👥 统计热词贡献者...")
+        progress.start('contributors', total=len(self._text_positions))
+        self._count_top_word_contributors()
+        progress.finish()
+
+        logger.info("🧹 释放临时内存...")
+        self.corpus.cache_tokens = False
+        self.corpus.reset_tokens()
+        if self._text_positions:
+            memory_mb = len(self._text_positions) * 8 / 1024 / 1024
+            self._text_positions = []
+            logger.debug(f"已释放约 {memory_mb:.1f} MB 内存")
+
         logger.info("✅ 分析完成!")
 
     def _process_messages_once(self):
@@ -331,10 +434,21 @@ class ChatAnalyzer:
 
         skipped = 0
         bot_filtered = 0
-        prev_clean = None
-        prev_sender = None
-
-        for msg in self.messages:
+        senders = self.senders
+        filter_bot = getattr(self.options, 'FILTER_BOT_MESSAGES', True)
+        columns = MessageColumns() if self._use_numpy_stats() else None
+        self._stat_columns = columns
+        night_owl_hours = getattr(self.options, 'NIGHT_OWL_HOURS', range(0, 6))
+        early_bird_hours = getattr(self.options, 'EARLY_BIRD_HOURS', range(6, 9))
+        corpus = self.corpus
+        repeat_chains = RepeatChains(corpus)
+        interactions = InteractionGraphBuilder()
+        sample_count = getattr(self.options, 'SAMPLE_COUNT', 10)
+
+        progress = self.progress
+        for done, (pos, msg) in enumerate(zip(self._positions, self.messages)):
+            if not done & 0xFFF:
+                progress.update(done)
 
             if self._is_bot_message(msg):
                 continue
@@ -347,35 +461,18 @@ class ChatAnalyzer:
                 bot_filtered += 1
                 continue
             
-            sender_uin = msg.get('sender', {}).get('uin')
-            if not sender_uin:
+            sender_idx = corpus.sender[pos]
+            if sender_idx < 0:
                 continue
             
             content = msg.get('content', {})
             text = content.get('text', '') if isinstance(content, dict) else ''
-
-            at_contents = []
-            if '@' in text:
-                elements = msg.get('rawMessage', {}).get('elements', [])
-                for element in elements:
-                    text_element = element.get('textElement')
-                    if not text_element:
-                        continue
-                        
-                    at_type = text_element.get('atType', 0)
-                    content_text = text_element.get('content', '')
-                    
-                    if at_type == 2 and content_text:
-                        at_contents.append(content_text)
-                        
-            cleaned = clean_text(text, at_contents)
+            cleaned = corpus.cleaned[pos]
             
             if cleaned and len(cleaned) >= 1:
-                self.cleaned_texts_with_sender.append((cleaned, sender_uin))
-
-                words = list(jieba.cut(cleaned))
+                self._text_positions.append(pos)
 
-                for word in words:
+                for word in corpus.tokens(pos):
                     word = word.strip()
                     if not word:
                         continue
@@ -383,14 +480,12 @@ class ChatAnalyzer:
                         continue
                     
                     self.word_freq[word] += 1
-                    if sender_uin:
-                        self.word_contributors[word][sender_uin] += 1
-                    sample_count = getattr(cfg, 'SAMPLE_COUNT', 10)
                     if len(self.word_samples[word]) < sample_count * 3:
                         self.word_samples[word].append(cleaned)
 
-                self.user_msg_count[sender_uin] += 1
-                self.user_char_count[sender_uin] += len(cleaned)
+                if columns is None:
+                    self.user_msg_count[sender_idx] += 1
+                    self.user_char_count[sender_idx] += len(cleaned)
             else:
                 if text:
                     skipped += 1
@@ -424,8 +519,7 @@ class ChatAnalyzer:
                     at_uid = text_elem.get('atUid', '')
                     at_uid_str = str(at_uid) if at_uid else ''
                     if at_type > 0 and at_uid_str and at_uid_str != '0' and at_uid_str != '':
-                        self.user_at_count[sender_uin] += 1
-                        self.user_ated_count[at_uid_str] += 1
+                        interactions.add(AT, sender_idx, senders.intern(at_uid_str))
                     
                     # 链接统计
                     text_content = text_elem.get('content', '')
@@ -444,67 +538,137 @@ class ChatAnalyzer:
                     
                     # 优先用 senderUid（如果有的话）
                     target_uin = reply_elem.get('senderUid')
-                    
-                    # 如果没有，回退到用 msgId 查找
-                    if not target_uin or target_uin == '0':
-                        ref_msg_id = reply_elem.get('sourceMsgIdInRecords')
-                        if not ref_msg_id or ref_msg_id == '0':
-                            ref_msg_id = reply_elem.get('replayMsgId')
-                        
-                        if ref_msg_id and ref_msg_id != '0':
-                            target_uin = self.msgid_to_sender.get(ref_msg_id)
-                    
+                    ref_msg_id = reply_ref_id(reply_elem)
+                    target_idx = None
                     if target_uin and str(target_uin) != '0':
-                        self.user_replied_count[str(target_uin)] += 1
+                        target_idx = senders.intern(target_uin)
+                    else:
+                        # 如果没有，回退到用 msgId 在共享索引中查找（不计入机器人消息）
+                        target_idx = self.message_index.sender_of(
+                            ref_msg_id, include_bots=not filter_bot
+                        )
+                        if target_idx is not None and senders.uin(target_idx) in self._bot_uins:
+                            target_idx = None
+                    
+                    if target_idx is not None:
+                        ref_ts = self.message_index.timestamp_of(ref_msg_id)
+                        msg_ts = corpus.timestamps[pos]
+                        latency = msg_ts - ref_ts if ref_ts is not None else None
+                        interactions.add(REPLY, sender_idx, target_idx, latency)
             
             # 统计各项数据
-            if image_count > 0:
-                self.user_image_count[sender_uin] += image_count  
+            if image_count > 0 and columns is None:
+                self.user_image_count[sender_idx] += image_count  
             
             if has_reply:
-                self.user_reply_count[sender_uin] += 1
+                self.user_reply_count[sender_idx] += 1
             
             if has_link:
-                self.user_link_count[sender_uin] += 1
+                self.user_link_count[sender_idx] += 1
             
             if has_forward:
-                self.user_forward_count[sender_uin] += 1    
+                self.user_forward_count[sender_idx] += 1    
 
             emojis = content.get('emojis', []) if isinstance(content, dict) else []
             emoji_count = len(emojis) + emoji_count_from_elements
             if emoji_count > 0:
-                self.user_emoji_count[sender_uin] += emoji_count
+                self.user_emoji_count[sender_idx] += emoji_count
             
-            hour = parse_timestamp(msg.get('timestamp', ''))
-            if hour is not None:
+            hour = corpus.hour_at(pos)
+            if columns is not None:
+                columns.append(
+                    sender_idx,
+                    len(cleaned) if cleaned else -1,
+                    image_count,
+                    -1 if hour is None else hour,
+                )
+            elif hour is not None:
                 self.hour_distribution[hour] += 1
-                # 安全获取时间范围配置
-                night_owl_hours = getattr(cfg, 'NIGHT_OWL_HOURS', range(0, 6))
-                early_bird_hours = getattr(cfg, 'EARLY_BIRD_HOURS', range(6, 9))
                 if hour in night_owl_hours:
-                    self.user_night_count[sender_uin] += 1
+                    self.user_night_count[sender_idx] += 1
                 if hour in early_bird_hours:
-                    self.user_morning_count[sender_uin] += 1
+                    self.user_morning_count[sender_idx] += 1
             
-            if cleaned and len(cleaned) >= 2:
-                if cleaned == prev_clean and sender_uin != prev_sender:
-                    self.user_repeat_count[sender_uin] += 1
-
-            prev_clean = cleaned
-            prev_sender = sender_uin
+            repeat_chains.add(pos)
         
         # 处理跳过及机器人消息计数日志
-        if cfg.FILTER_BOT_MESSAGES and bot_filtered > 0:
-            logger.debug(f"有效文本: {len(self.cleaned_texts_with_sender)} 条, 跳过: {skipped} 条, 过滤机器人: {bot_filtered} 条")
+        if self.options.FILTER_BOT_MESSAGES and bot_filtered > 0:
+            logger.debug(f"有效文本: {len(self._text_positions)} 条, 跳过: {skipped} 条, 过滤机器人: {bot_filtered} 条")
         else:
-            logger.debug(f"有效文本: {len(self.cleaned_texts_with_sender)} 条, 跳过: {skipped} 条")
+            logger.debug(f"有效文本: {len(self._text_positions)} 条, 跳过: {skipped} 条")
+
+        if columns is not None:
+            self._aggregate_stat_columns(night_owl_hours, early_bird_hours)
+
+        repeat_chains.close()
+        self.repeat_chains = repeat_chains
+        self.user_repeat_count = repeat_chains.repeat_counts()
+
+        # @ 与回复关系汇总为稀疏互动图，相关榜单直接取度数
+        self.interaction_graph = interactions.build(len(senders))
+        self.user_at_count = self.interaction_graph.out_degree(AT)
+        self.user_ated_count = self.interaction_graph.in_degree(AT)
+        self.user_replied_count = self.interaction_graph.in_degree(REPLY)
 
         # 计算人均字数（保留1位小数）
-        for uin in self.user_msg_count:
-            msg_count = self.user_msg_count[uin]
-            char_count = self.user_char_count[uin]
+        for sender_idx in self.user_msg_count:
+            msg_count = self.user_msg_count[sender_idx]
+            char_count = self.user_char_count[sender_idx]
             if msg_count >= 10:
-                self.user_char_per_msg[uin] = round(char_count / msg_count, 1)
+                self.user_char_per_msg[sender_idx] = round(char_count / msg_count, 1)
+
+    def _iter_texts(self):
+        """按顺序产出有效文本消息的清洗后文本"""
+        cleaned = self.corpus.cleaned
+        return (cleaned[pos] for pos in self._text_positions)
+
+    def _use_numpy_stats(self):
+        return np is not None and getattr(self.options, 'USE_NUMPY_STATS', True)
+
+    def _aggregate_stat_columns(self, night_owl_hours, early_bird_hours):
+        """用 numpy 对按列存储的消息做分组求和，得到各用户统计和时段分布"""
+        sender, chars, images, hours = self._stat_columns.to_numpy()
+        n_senders = len(self.senders)
+
+        has_text = chars >= 0
+        text_sender = sender[has_text]
+        has_hour = hours >= 0
+        night_mask = np.isin(hours, np.asarray(list(night_owl_hours), dtype=np.int8))
+        morning_mask = np.isin(hours, np.asarray(list(early_bird_hours), dtype=np.int8))
+
+        has_image = images > 0
+        night_mask &= has_hour
+        morning_mask &= has_hour
+        arrays = {
+            'user_msg_count': np.bincount(text_sender, minlength=n_senders),
+            'user_char_count': np.bincount(text_sender, weights=chars[has_text], minlength=n_senders),
+            'user_image_count': np.bincount(sender[has_image], weights=images[has_image], minlength=n_senders),
+            'user_night_count': np.bincount(sender[night_mask], minlength=n_senders),
+            'user_morning_count': np.bincount(sender[morning_mask], minlength=n_senders),
+        }
+        masks = {
+            'user_msg_count': has_text,
+            'user_char_count': has_text,
+            'user_image_count': has_image,
+            'user_night_count': night_mask,
+            'user_morning_count': morning_mask,
+        }
+        self._stat_arrays = {field: arr.astype(np.int64) for field, arr in arrays.items()}
+        self._stat_first_seen = {
+            field: self._first_seen_rows(sender, masks[field], n_senders) for field in arrays
+        }
+
+        # 同步回 Counter（按首次计入的顺序插入，与逐条累加的 Counter 一致），保持对外接口不变
+        for field, arr in self._stat_arrays.items():
+            first_seen = self._stat_first_seen[field]
+            nonzero = np.flatnonzero(arr)
+            nonzero = nonzero[np.argsort(first_seen[nonzero], kind='stable')]
+            setattr(self, field, Counter(dict(zip(nonzero.tolist(), arr[nonzero].tolist()))))
+        hour_counts = np.bincount(hours[has_hour], minlength=24)
+        self.hour_distribution = Counter({h: int(c) for h, c in enumerate(hour_counts) if c})
+
+        self._stat_columns = None
+        logger.debug(f"numpy 分组统计完成: {len(sender)} 条消息, {n_senders} 个用户")
 
     def _discover_new_words(self):
         """新词发现"""
@@ -513,7 +677,10 @@ class ChatAnalyzer:
         right_neighbors = defaultdict(Counter)
         total_chars = 0
         
-        for text, _ in self.cleaned_texts_with_sender:
+        progress = self.progress
+        for done, text in enumerate(self._iter_texts()):
+            if not done & 0xFFF:
+                progress.update(done)
             sentences = re.split(_SENTENCE_SPLIT_PATTERN, text)
             for sentence in sentences:
                 sentence = sentence.strip()
@@ -538,14 +705,14 @@ class ChatAnalyzer:
                             right_neighbors[ngram]['<EOS>'] += 1
         
         for word, freq in ngram_freq.items():
-            if freq < cfg.NEW_WORD_MIN_FREQ:
+            if freq < self.options.NEW_WORD_MIN_FREQ:
                 continue
             
             # 邻接熵
             left_ent = calculate_entropy(left_neighbors[word])
             right_ent = calculate_entropy(right_neighbors[word])
             min_ent = min(left_ent, right_ent)
-            if min_ent < cfg.ENTROPY_THRESHOLD:
+            if min_ent < self.options.ENTROPY_THRESHOLD:
                 continue
             
             # PMI
@@ -560,13 +727,16 @@ class ChatAnalyzer:
             if min_pmi == float('inf'):
                 min_pmi = 0
             
-            if min_pmi < cfg.PMI_THRESHOLD:
+            if min_pmi < self.options.PMI_THRESHOLD:
                 continue
             
             self.discovered_words.add(word)
         
         for word in self.discovered_words:
             jieba.add_word(word, freq=1000)
+        if self.discovered_words:
+            # 词典已变化，之前缓存的分词结果失效
+            self.corpus.reset_tokens()
         
         discovered_count = len(self.discovered_words)
 
@@ -578,8 +748,11 @@ class ChatAnalyzer:
         bigram_counter = Counter()
         word_right_counter = Counter()
         
-        for text, _ in self.cleaned_texts_with_sender:
-            words = [w for w in jieba.cut(text) if w.strip()]
+        progress = self.progress
+        for done, pos in enumerate(self._text_positions):
+            if not done & 0xFFF:
+                progress.update(done)
+            words = [w for w in self.corpus.tokens(pos) if w.strip()]
             for i in range(len(words) - 1):
                 w1, w2 = words[i].strip(), words[i+1].strip()
                 if not w1 or not w2:
@@ -591,19 +764,21 @@ class ChatAnalyzer:
         
         for (w1, w2), count in bigram_counter.items():
             merged = w1 + w2
-            if len(merged) > cfg.MERGE_MAX_LEN:
+            if len(merged) > self.options.MERGE_MAX_LEN:
                 continue
-            if count < cfg.MERGE_MIN_FREQ:
+            if count < self.options.MERGE_MIN_FREQ:
                 continue
             
             # 条件概率 P(w2|w1)
             if word_right_counter[w1] > 0:
                 prob = count / word_right_counter[w1]
-                if prob >= cfg.MERGE_MIN_PROB:
+                if prob >= self.options.MERGE_MIN_PROB:
                     self.merged_words[merged] = (w1, w2, count, prob)
                     jieba.add_word(merged, freq=count * 1000)
 
         merged_count = len(self.merged_words)
+        if merged_count:
+            self.corpus.reset_tokens()
         
         logger.debug(f"合并 {len(self.merged_words)} 个词组")
         
@@ -618,14 +793,16 @@ class ChatAnalyzer:
         # 清空旧的词频统计
         self.word_freq = Counter()
         self.word_samples = defaultdict(list)
-        self.word_contributors = defaultdict(Counter)
         
         # 重新处理每条消息
-        for cleaned, sender_uin in self.cleaned_texts_with_sender:
-            # 重新分词
-            words = list(jieba.cut(cleaned))
-            
-            for word in words:
+        corpus = self.corpus
+        progress = self.progress
+        for done, pos in enumerate(self._text_positions):
+            if not done & 0xFFF:
+                progress.update(done)
+            cleaned = corpus.cleaned[pos]
+            # 重新分词（词典已更新，分词缓存已清空）
+            for word in corpus.tokens(pos):
                 word = word.strip()
                 if not word:
                     continue
@@ -634,27 +811,49 @@ class ChatAnalyzer:
                 
                 # 重新统计
                 self.word_freq[word] += 1
-                if sender_uin:
-                    self.word_contributors[word][sender_uin] += 1
-                if len(self.word_samples[word]) < cfg.SAMPLE_COUNT * 3:
+                if len(self.word_samples[word]) < self.options.SAMPLE_COUNT * 3:
                     self.word_samples[word].append(cleaned)
         
         logger.debug(f"重新分词完成，当前词汇总数: {len(self.word_freq)}")
 
+    def _count_top_word_contributors(self):
+        """
+        只为 Top 热词统计贡献者：热词确定后再遍历一遍有效文本，
+        分词结果来自分析期间的分词缓存，不会为每个出现过的词都建一张贡献者表
+        """
+        top_words = {word for word, _ in self.get_top_words()}
+        table = self._new_contributor_table()
+        use_sketch = self.contributor_mode == 'sketch'
+        corpus = self.corpus
+        progress = self.progress
+        for done, pos in enumerate(self._text_positions):
+            if not done & 0xFFF:
+                progress.update(done)
+            sender_idx = corpus.sender[pos]
+            for word in corpus.tokens(pos):
+                word = word.strip()
+                if word not in top_words:
+                    continue
+                if use_sketch:
+                    table[word].add(sender_idx)
+                else:
+                    table[word][sender_idx] += 1
+        self.word_contributors = dict(table)
+
     def _filter_results(self):
         """过滤结果"""
         filtered_freq = Counter()
         
         for word, freq in self.word_freq.items():
-            if len(word) < cfg.MIN_WORD_LEN or len(word) > cfg.MAX_WORD_LEN:
+            if len(word) < self.options.MIN_WORD_LEN or len(word) > self.options.MAX_WORD_LEN:
                 continue
-            if freq < cfg.MIN_FREQ:
+            if freq < self.options.MIN_FREQ:
                 continue
             if is_emoji(word):
                 filtered_freq[word] = freq
                 continue
 
-            if word in cfg.WHITELIST:
+            if word in self.options.WHITELIST:
                 filtered_freq[word] = freq
                 continue
             
@@ -667,7 +866,7 @@ class ChatAnalyzer:
                 stats = self.single_char_stats.get(word)
                 if stats:
                     total, indep, ratio = stats
-                    if ratio < cfg.SINGLE_MIN_SOLO_RATIO or indep < cfg.SINGLE_MIN_SOLO_COUNT:
+                    if ratio < self.options.SINGLE_MIN_SOLO_RATIO or indep < self.options.SINGLE_MIN_SOLO_COUNT:
                         continue
                 else:
                     continue
@@ -679,14 +878,62 @@ class ChatAnalyzer:
         # 采样
         for word in self.word_samples:
             samples = self.word_samples[word]
-            sample_count = getattr(cfg, 'SAMPLE_COUNT', 10)
+            sample_count = getattr(self.options, 'SAMPLE_COUNT', 10)
             if len(samples) > sample_count:
                 self.word_samples[word] = random.sample(samples, sample_count)
         
         logger.debug(f"过滤后 {len(self.word_freq)} 个词")
 
+        self._build_rankings_snapshot()
+
+    def _build_rankings_snapshot(self):
+        """用堆选择一次性计算热词和各榜单的 Top-K，避免重复全量排序"""
+        by_value = itemgetter(1)
+        self._top_words_snapshot = heapq.nlargest(self.options.TOP_N, self.word_freq.items(), key=by_value)
+        rankings = {}
+        for title, field in RANKING_FIELDS:
+            if field in self._stat_arrays:
+                rankings[title] = self._top_k_from_array(
+                    self._stat_arrays[field], self._stat_first_seen[field], self.options.RANK_TOP_N
+                )
+            else:
+                rankings[title] = self._top_k_from_counter(getattr(self, field), self.options.RANK_TOP_N)
+        self._rankings_snapshot = rankings
+
+    @staticmethod
+    def _top_k_from_counter(counter, n):
+        """
+        对 下标 -> 数值 的统计取 Top-N：数值降序，并列时按首次计入的先后
+        （各统计按消息顺序累加，插入顺序即首次计入的顺序，与 Counter.most_common 一致）
+        """
+        ranked = heapq.nlargest(n, ((value, -first_seen, idx)
+                                    for first_seen, (idx, value) in enumerate(counter.items())))
+        return [(idx, value) for value, _, idx in ranked]
+
+    @staticmethod
+    def _first_seen_rows(sender, mask, n_senders):
+        """每个发送者首次计入某项统计的消息行号（从未计入为消息总数），用于榜单并列时排序"""
+        first_seen = np.full(n_senders, len(sender), dtype=np.int64)
+        rows = np.flatnonzero(mask)
+        senders, first = np.unique(sender[rows], return_index=True)
+        first_seen[senders] = rows[first]
+        return first_seen
+
+    @staticmethod
+    def _top_k_from_array(values, first_seen, n):
+        """对按发送者下标排列的数组取 Top-N：数值降序，并列时按首次计入的先后（与 _top_k_from_counter 一致）"""
+        order = np.lexsort((first_seen, -values))[:n]
+        return [(idx, int(values[idx])) for idx in order.tolist() if values[idx] > 0]
+
+    def _get_rankings_snapshot(self):
+        if self._rankings_snapshot is None:
+            self._build_rankings_snapshot()
+        return self._rankings_snapshot
+
     def get_top_words(self, n=None):
-        n = n or cfg.TOP_N
+        n = n or self.options.TOP_N
+        if self._top_words_snapshot is not None and n <= self.options.TOP_N:
+            return self._top_words_snapshot[:n]
         return self.word_freq.most_common(n)
 
     def get_word_detail(self, word):
@@ -694,34 +941,24 @@ class ChatAnalyzer:
             'word': word,
             'freq': self.word_freq.get(word, 0),
             'samples': self.word_samples.get(word, []),
-            'contributors': [(self.get_name(uin), count) 
-                           for uin, count in self.word_contributors[word].most_common(cfg.CONTRIBUTOR_TOP_N)]
+            'contributors': [(self._sender_name(idx), count) 
+                           for idx, count in self._top_contributors(word)]
         }
 
+    def _top_contributors(self, word):
+        """热词的前 CONTRIBUTOR_TOP_N 位贡献者（下标, 次数）；非 Top 热词没有贡献者统计"""
+        contributors = self.word_contributors.get(word)
+        if not contributors:
+            return []
+        return contributors.most_common(self.options.CONTRIBUTOR_TOP_N)
+
     def get_fun_rankings(self):
         rankings = {}
-        
-        def fmt(counter, top_n=cfg.RANK_TOP_N):
-            return [(self.get_name(uin), count) for uin, count in counter.most_common(top_n)]
-        
-        rankings['话痨榜'] = fmt(self.user_msg_count)
-        rankings['字数榜'] = fmt(self.user_char_count)
-        
-        sorted_avg = sorted(self.user_char_per_msg.items(), key=lambda x: x[1], reverse=True)[:cfg.RANK_TOP_N]
-        rankings['长文王'] = [(self.get_name(uin), f"{avg:.1f}字/条") for uin, avg in sorted_avg]
-        
-        rankings['图片狂魔'] = fmt(self.user_image_count)
-        rankings['合并转发王'] = fmt(self.user_forward_count)
-        rankings['回复狂'] = fmt(self.user_reply_count)
-        rankings['被回复最多'] = fmt(self.user_replied_count)
-        rankings['艾特狂'] = fmt(self.user_at_count)
-        rankings['被艾特最多'] = fmt(self.user_ated_count)
-        rankings['表情帝'] = fmt(self.user_emoji_count)
-        rankings['链接分享王'] = fmt(self.user_link_count)
-        rankings['深夜党'] = fmt(self.user_night_count)
-        rankings['早起鸟'] = fmt(self.user_morning_count)
-        rankings['复读机'] = fmt(self.user_repeat_count)
-        
+        for title, ranked in self._get_rankings_snapshot().items():
+            if title == '长文王':
+                rankings[title] = [(self._sender_name(idx), f"{avg:.1f}字/条") for idx, avg in ranked]
+            else:
+                rankings[title] = [(self._sender_name(idx), count) for idx, count in ranked]
         return rankings
     
     def export_json(self):
@@ -736,13 +973,13 @@ class ChatAnalyzer:
                 'freq': freq,
                 'contributors': [
                     {
-                        'name': self.get_name(uin),
-                        'uin': uin,
+                        'name': self._sender_name(idx),
+                        'uin': self.senders.uin(idx),
                         'count': count
                     }
-                    for uin, count in self.word_contributors[word].most_common(cfg.CONTRIBUTOR_TOP_N)
+                    for idx, count in self._top_contributors(word)
                 ],
-                'samples': self.word_samples.get(word, [])[:getattr(cfg, 'SAMPLE_COUNT', 10)]
+                'samples': self.word_samples.get(word, [])[:getattr(self.options, 'SAMPLE_COUNT', 10)]
             })
 
         result = {
@@ -754,32 +991,16 @@ class ChatAnalyzer:
         }
         
         # 趣味榜单（包含uin）
-        def fmt_with_uin(counter, top_n=cfg.RANK_TOP_N):
-            return [
-                {'name': self.get_name(uin), 'uin': uin, 'value': count}
-                for uin, count in counter.most_common(top_n)
-            ]
-        
-        result['rankings']['话痨榜'] = fmt_with_uin(self.user_msg_count)
-        result['rankings']['字数榜'] = fmt_with_uin(self.user_char_count)
-        
-        # 长文王特殊处理
-        sorted_avg = sorted(self.user_char_per_msg.items(), key=lambda x: x[1], reverse=True)[:cfg.RANK_TOP_N]
-        result['rankings']['长文王'] = [
-            {'name': self.get_name(uin), 'uin': uin, 'value': f"{avg:.1f}字/条"}
-            for uin, avg in sorted_avg
-        ]
-        
-        result['rankings']['图片狂魔'] = fmt_with_uin(self.user_image_count)
-        result['rankings']['合并转发王'] = fmt_with_uin(self.user_forward_count)
-        result['rankings']['回复狂'] = fmt_with_uin(self.user_reply_count)
-        result['rankings']['被回复最多'] = fmt_with_uin(self.user_replied_count)
-        result['rankings']['艾特狂'] = fmt_with_uin(self.user_at_count)
-        result['rankings']['被艾特最多'] = fmt_with_uin(self.user_ated_count)
-        result['rankings']['表情帝'] = fmt_with_uin(self.user_emoji_count)
-        result['rankings']['链接分享王'] = fmt_with_uin(self.user_link_count)
-        result['rankings']['深夜党'] = fmt_with_uin(self.user_night_count)
-        result['rankings']['早起鸟'] = fmt_with_uin(self.user_morning_count)
-        result['rankings']['复读机'] = fmt_with_uin(self.user_repeat_count)
+        for title, ranked in self._get_rankings_snapshot().items():
+            if title == '长文王':
+                result['rankings'][title] = [
+                    {'name': self._sender_name(idx), 'uin': self.senders.uin(idx), 'value': f"{avg:.1f}字/条"}
+                    for idx, avg in ranked
+                ]
+            else:
+                result['rankings'][title] = [
+                    {'name': self._sender_name(idx), 'uin': self.senders.uin(idx), 'value': count}
+                    for idx, count in ranked
+                ]
         
         return result
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析任务内存准入控制
+按导出文件解压后的大小估算每个分析的内存占用，
+已准入任务的估算总和不超过内存预算；超出时排队，单个任务超出预算或排队过多时直接拒绝
+"""
+
+import os
+import sys
+import threading
+from typing import Dict, Optional
+
+# 添加父目录到路径以导入 logger
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+MB = 1024 * 1024
+
+# 估算参数（按实测：解析后的消息列表与分析中的 n-gram 统计表约为 JSON 文本的 7 倍）
+BYTES_FACTOR = 7
+# 分析进程的固定开销（解释器、jieba 词典等）
+BASE_BYTES = 200 * MB
+# 个人报告流式读取，只保留目标用户的消息与紧凑的消息索引（实测约为 JSON 文本的 0.5 倍，按 1 倍估算）
+PERSONAL_BYTES_FACTOR = 1
+PERSONAL_BASE_BYTES = 50 * MB
+
+
+class AdmissionRejected(RuntimeError):
+    """分析任务未被准入（超出内存预算或排队过多）"""
+
+
+def detect_memory_limit() -> Optional[int]:
+    """容器内存上限（cgroup v2 / v1），不在容器中时返回物理内存大小"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < (1 << 60):
+            return int(value)
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def estimate_memory(file_bytes: Optional[int] = None) -> int:
+    """估算一次群聊分析的内存占用（字节），file_bytes 为解压后的 JSON 大小（见 utils.export_content_size）"""
+    return BASE_BYTES + (file_bytes or 0) * BYTES_FACTOR
+
+
+def estimate_personal_memory(file_bytes: Optional[int] = None) -> int:
+    """估算一次个人报告分析（PersonalAnalyzer.from_file）的内存占用（字节）"""
+    return PERSONAL_BASE_BYTES + (file_bytes or 0) * PERSONAL_BYTES_FACTOR
+
+
+class MemoryAdmission:
+    """
+    内存准入控制器（每个服务进程一个）
+
+    submit 时调用 reserve 登记排队（超出预算或排队过多抛出 AdmissionRejected），
+    调度时调用 try_acquire 检查内存预算（不阻塞，预算不足时任务留在队列中），结束后调用 release 归还。
+    没有任务在执行时总会准入，避免估算偏大的任务永远等待。
+    """
+
+    def __init__(self, budget_bytes: int, max_waiting: int = 8):
+        self.budget = budget_bytes
+        self.max_waiting = max_waiting
+        self._lock = threading.Lock()
+        self._reserved = 0
+        self._running = 0
+        self._waiting = 0
+        self.rejected = 0
+
+    def fits_budget(self, estimate: int) -> bool:
+        """单个任务的估算是否在预算之内（不登记排队）"""
+        return estimate <= self.budget
+
+    def reserve(self, estimate: int, limit_waiting: bool = True):
+        """
+        登记一个排队任务；limit_waiting 为 False 时不受排队数量限制
+        （批量任务整体提交，文件数由批量接口自身限制）
+        """
+        with self._lock:
+            if estimate > self.budget:
+                self.rejected += 1
+                raise AdmissionRejected(
+                    f"预计需要内存 {estimate // MB} MB，超过分析内存预算 {self.budget // MB} MB"
+                )
+            if limit_waiting and self._waiting >= self.max_waiting:
+                self.rejected += 1
+                raise AdmissionRejected("当前分析任务过多，请稍后再试")
+            self._waiting += 1
+
+    def cancel(self):
+        """已 reserve 但不再执行的任务（如提交失败）撤销排队登记"""
+        with self._lock:
+            self._waiting -= 1
+
+    def try_acquire(self, estimate: int, queued: bool = True) -> bool:
+        """
+        内存预算足够时占用预算并返回 True，否则返回 False（不阻塞）
+        queued 为 False 表示调用方没有先 reserve（如请求内同步执行的个人报告）
+        """
+        with self._lock:
+            if self._running and self._reserved + estimate > self.budget:
+                return False
+            if queued:
+                self._waiting -= 1
+            self._running += 1
+            self._reserved += estimate
+            return True
+
+    def release(self, estimate: int):
+        with self._lock:
+            self._running -= 1
+            self._reserved -= estimate
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "budget_mb": self.budget // MB,
+                "reserved_mb": self._reserved // MB,
+                "running": self._running,
+                "waiting": self._waiting,
+                "rejected": self.rejected,
+            }
@@ -8,21 +8,24 @@ Licensed under AGPL-3.0: https://www.gnu.org/licenses/agpl-3.0.html
 """
 
 import os
+import gzip
 import json
 import uuid
 import base64
 import requests
 import asyncio
-from typing import List, Dict
+from typing import List, Dict, Optional
 from io import BytesIO
 
-from flask import Flask, request, jsonify, send_from_directory, session
+from flask import Flask, Response, request, jsonify, send_from_directory, session, stream_with_context
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from dotenv import load_dotenv
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 import secrets
+import time
 import hmac
 import hashlib
 
@@ -33,14 +36,20 @@ import sys
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
-import config
-import analyzer as analyzer_mod
+from analyzer import ANALYZER_VERSION
 from image_generator import ImageGenerator, AIWordSelector
-from utils import load_json
-from personal_analyzer import PersonalAnalyzer
+from utils import export_content_size, ExportTooLarge
+from personal_analyzer import PersonalAnalyzer, PERSONAL_ANALYZER_VERSION
+from name_index import NameIndex
 
 from backend.db_service import DatabaseService
 from backend.json_storage import JSONStorageService
+from backend.cache import PersonalReportCache, AnalysisResultCache, ReportPayloadCache, etag_matches
+from backend.admission import (
+    MemoryAdmission, AdmissionRejected, detect_memory_limit, estimate_memory, estimate_personal_memory,
+)
+from backend.janitor import TempJanitor
+from backend.jobs import JobManager, create_job_store, analyze_chat_export, DONE, FAILED
 
 # 导入日志系统
 import sys
@@ -69,6 +78,8 @@ RATE_LIMIT_GET_REPORT = os.getenv('RATE_LIMIT_GET_REPORT', '100 per hour')
 RATE_LIMIT_LIST_REPORTS = os.getenv('RATE_LIMIT_LIST_REPORTS', '200 per hour')
 RATE_LIMIT_GENERATE_IMAGE = os.getenv('RATE_LIMIT_GENERATE_IMAGE', '30 per hour')
 RATE_LIMIT_DELETE_REPORT = os.getenv('RATE_LIMIT_DELETE_REPORT', '50 per hour')
+RATE_LIMIT_JOB_STATUS = os.getenv('RATE_LIMIT_JOB_STATUS', '3600 per hour')
+RATE_LIMIT_BATCH = os.getenv('RATE_LIMIT_BATCH', '5 per hour')
 RATE_LIMIT_IP_LIST = os.getenv('RATE_LIMIT_IP_LIST', '127.0.0.1')
 
 # AI功能开关
@@ -87,7 +98,15 @@ SECURITY_HEADER_REFERRER_POLICY = os.getenv('SECURITY_HEADER_REFERRER_POLICY', '
 SECURITY_HEADER_HSTS = os.getenv('SECURITY_HEADER_HSTS', '')
 
 # 文件验证配置
-ALLOWED_FILE_EXTENSIONS = os.getenv('ALLOWED_FILE_EXTENSIONS', 'json').split(',')
+# 压缩格式（.json.gz / .json.zst / .zip）按文件头识别，边读边解压
+ALLOWED_FILE_EXTENSIONS = os.getenv('ALLOWED_FILE_EXTENSIONS', 'json,json.gz,json.zst,zip').split(',')
+
+# 流式上传：请求体直接是导出文件（可为 gzip / zstd / zip 压缩，可为分块传输），原样写入临时文件后交给分析进程解析
+UPLOAD_STREAMING_ENABLED = os.getenv('UPLOAD_STREAMING_ENABLED', 'true').lower() == 'true'
+STREAMED_UPLOAD_MIMETYPES = {
+    'application/json', 'application/gzip', 'application/x-gzip', 'application/zstd',
+    'application/zip', 'application/x-zip-compressed', 'application/octet-stream'
+}
 
 logger.info(f"{'='*60}")
 logger.info(f"🔒 安全配置状态")
@@ -161,6 +180,8 @@ CORS(app, resources={
 # Flask配置
 max_size_mb = int(os.getenv('MAX_UPLOAD_SIZE_MB', '1024'))
 app.config['MAX_CONTENT_LENGTH'] = max_size_mb * 1024 * 1024
+# 导出内容解压后的大小上限：gzip / zip / zstd 解压超过上限时中止读取并返回 413；0 表示不限制
+MAX_EXPORT_CONTENT_BYTES = int(os.getenv('MAX_EXPORT_CONTENT_MB', '4096')) * 1024 * 1024
 app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', secrets.token_hex(32))
 app.config['SESSION_COOKIE_SECURE'] = os.getenv('SESSION_COOKIE_SECURE', 'false').lower() == 'true'
 app.config['SESSION_COOKIE_HTTPONLY'] = True
@@ -227,6 +248,145 @@ else:
         logger.error(f"存储服务初始化失败: {e}")
         db_service = None
 
+# 个人报告缓存（内存 LRU + 磁盘）
+PERSONAL_CACHE_ENABLED = os.getenv('PERSONAL_CACHE_ENABLED', 'true').lower() == 'true'
+personal_cache = None
+if PERSONAL_CACHE_ENABLED:
+    personal_cache = PersonalReportCache(
+        os.getenv('PERSONAL_CACHE_DIR', os.path.join(PROJECT_ROOT, "runtime_outputs", "cache", "personal")),
+        max_items=int(os.getenv('PERSONAL_CACHE_MAX_ITEMS', '256')),
+        max_bytes=int(os.getenv('PERSONAL_CACHE_MAX_MB', '64')) * 1024 * 1024,
+    )
+    logger.info("✅ 个人报告缓存已启用")
+
+# 群聊分析结果缓存：同一份导出（按内容哈希）以相同参数重复上传时跳过分析
+ANALYSIS_CACHE_ENABLED = os.getenv('ANALYSIS_CACHE_ENABLED', 'true').lower() == 'true'
+analysis_cache = None
+if ANALYSIS_CACHE_ENABLED:
+    analysis_cache = AnalysisResultCache(
+        os.getenv('ANALYSIS_CACHE_DIR', os.path.join(PROJECT_ROOT, "runtime_outputs", "cache", "analysis")),
+        max_items=int(os.getenv('ANALYSIS_CACHE_MAX_ITEMS', '32')),
+        max_bytes=int(os.getenv('ANALYSIS_CACHE_MAX_MB', '128')) * 1024 * 1024,
+    )
+    logger.info("✅ 群聊分析结果缓存已启用")
+
+# 报告页面数据缓存（内存 LRU；配置 REDIS_URL 时多个服务进程共享 Redis 缓存）
+REPORT_CACHE_ENABLED = os.getenv('REPORT_CACHE_ENABLED', 'true').lower() == 'true'
+report_payload_cache = None
+if REPORT_CACHE_ENABLED:
+    report_payload_cache = ReportPayloadCache(
+        max_items=int(os.getenv('REPORT_CACHE_MAX_ITEMS', '512')),
+        max_bytes=int(os.getenv('REPORT_CACHE_MAX_MB', '64')) * 1024 * 1024,
+        redis_url=REDIS_URL,
+        ttl=int(os.getenv('REPORT_CACHE_TTL_HOURS', '24')) * 3600,
+    )
+    logger.info("✅ 报告页面缓存已启用")
+
+# 后台分析任务队列（SQLite 文件存储；配置 REDIS_URL 时使用 Redis）
+JOB_WORKERS = max(1, int(os.getenv('JOB_WORKERS', '2')))
+JOB_TTL_HOURS = int(os.getenv('JOB_TTL_HOURS', '24'))
+job_store = create_job_store(
+    os.getenv('JOB_STORE_PATH', os.path.join(PROJECT_ROOT, "runtime_outputs", "jobs", "jobs.sqlite3")),
+    redis_url=REDIS_URL,
+    ttl=JOB_TTL_HOURS * 3600,
+)
+
+# 分析内存准入控制：按导出大小估算内存，超出预算的任务排队，单个任务超出预算或排队过多时拒绝
+# 预算按服务进程计算，未配置时取内存上限的 70% 再按 gunicorn 进程数（WEB_CONCURRENCY）平分
+ANALYSIS_ADMISSION_ENABLED = os.getenv('ANALYSIS_ADMISSION_ENABLED', 'true').lower() == 'true'
+analysis_admission = None
+if ANALYSIS_ADMISSION_ENABLED:
+    budget_mb = int(os.getenv('ANALYSIS_MEMORY_BUDGET_MB', '0') or 0)
+    if budget_mb > 0:
+        budget_bytes = budget_mb * 1024 * 1024
+    else:
+        memory_limit = detect_memory_limit()
+        web_processes = max(1, int(os.getenv('WEB_CONCURRENCY', '1') or 1))
+        budget_bytes = int(memory_limit * 0.7 / web_processes) if memory_limit else 0
+    if budget_bytes > 0:
+        analysis_admission = MemoryAdmission(
+            budget_bytes,
+            max_waiting=int(os.getenv('ANALYSIS_MAX_WAITING', '8')),
+        )
+        logger.info(f"✅ 分析内存准入控制已启用: 预算 {budget_bytes // (1024 * 1024)} MB")
+    else:
+        logger.warning("⚠️ 无法确定内存上限，分析内存准入控制未启用（可设置 ANALYSIS_MEMORY_BUDGET_MB）")
+
+job_manager = JobManager(job_store, max_workers=JOB_WORKERS, ttl=JOB_TTL_HOURS * 3600,
+                         admission=analysis_admission)
+# 上一个服务进程退出（重启、被杀）时遗留的排队中/执行中任务不会再执行，启动时标记为失败
+job_manager.reap_orphans()
+# 单个 SSE 连接的最长保持时间（秒），到时由服务端关闭、浏览器自动重连，避免长期占用 worker
+JOB_EVENTS_MAX_SECONDS = int(os.getenv('JOB_EVENTS_MAX_SECONDS', '55'))
+JOB_EVENTS_POLL_SECONDS = float(os.getenv('JOB_EVENTS_POLL_SECONDS', '0.5'))
+# 批量上传单次最多文件数
+BATCH_MAX_FILES = int(os.getenv('BATCH_MAX_FILES', '500'))
+
+# 临时目录：上传文件 <report_id>.json 与等待选词的分析结果 <report_id>_result.json.gz
+TEMP_DIR = os.path.join(PROJECT_ROOT, "runtime_outputs", "temp")
+
+# 运行时目录清理：放弃选词的上传会一直留下临时文件，后台定期按保留时长和大小上限清理临时目录与磁盘缓存
+TEMP_JANITOR_ENABLED = os.getenv('TEMP_JANITOR_ENABLED', 'true').lower() == 'true'
+temp_janitor = None
+if TEMP_JANITOR_ENABLED:
+    temp_janitor = TempJanitor(
+        interval=float(os.getenv('TEMP_JANITOR_INTERVAL_MINUTES', '10')) * 60,
+        protect=float(os.getenv('TEMP_JANITOR_PROTECT_MINUTES', '60')) * 60,
+    )
+    temp_janitor.add(
+        TEMP_DIR,
+        ttl=float(os.getenv('TEMP_FILE_TTL_HOURS', '24')) * 3600,
+        max_bytes=int(os.getenv('TEMP_DIR_MAX_MB', '2048')) * 1024 * 1024,
+    )
+    cache_ttl = float(os.getenv('CACHE_FILE_TTL_DAYS', '30')) * 86400
+    cache_max_bytes = int(os.getenv('CACHE_DIR_MAX_MB', '1024')) * 1024 * 1024
+    if analysis_cache:
+        temp_janitor.add(analysis_cache.results.cache_dir, ttl=cache_ttl, max_bytes=cache_max_bytes)
+    if personal_cache:
+        temp_janitor.add(personal_cache.reports.cache_dir.parent, ttl=cache_ttl, max_bytes=cache_max_bytes)
+    temp_janitor.start()
+    logger.info("✅ 运行时目录清理已启用")
+logger.info(f"✅ 分析任务队列已启用: {type(job_store).__name__}, 并发 {JOB_WORKERS}")
+
+
+def is_streamed_upload() -> bool:
+    """请求体是否为流式上传的导出文件（而不是 multipart 表单）"""
+    return request.mimetype in STREAMED_UPLOAD_MIMETYPES
+
+
+def export_too_large(path: str) -> bool:
+    """按 gzip 尾部 / zip 目录 / zstd 帧头记录的解压后大小预先检查上限（读取时仍会逐字节限制）"""
+    return bool(MAX_EXPORT_CONTENT_BYTES) and export_content_size(path) > MAX_EXPORT_CONTENT_BYTES
+
+
+def export_read_limit(content_bytes: int) -> int:
+    """
+    分析时读取导出的解压上限（0 表示不限制）：启用内存准入时不超过估算内存所依据的内容大小，
+    文件头记录的大小不实（如 gzip 长度字段超过 4GB 后回绕）时读取中止，而不是超出预留的内存
+    """
+    limits = [limit for limit in (MAX_EXPORT_CONTENT_BYTES, content_bytes if analysis_admission else 0) if limit]
+    return min(limits) if limits else 0
+
+
+def export_too_large_response():
+    return jsonify({"error": f"解压后的聊天记录超过 {MAX_EXPORT_CONTENT_BYTES // (1024 * 1024)} MB 上限"}), 413
+
+
+def save_upload_with_hash(stream, path: str) -> str:
+    """
+    分块保存上传内容（multipart 中的文件流或流式上传的请求体），同时计算内容的 sha256
+    保存的是原始（可能压缩的）字节，由分析进程读取时再解压解析
+    """
+    digest = hashlib.sha256()
+    with open(path, 'wb') as f:
+        while True:
+            chunk = stream.read(1024 * 1024)
+            if not chunk:
+                break
+            digest.update(chunk)
+            f.write(chunk)
+    return digest.hexdigest()
+
 
 def generate_ai_comments(selected_word_objects: List[Dict]) -> Dict[str, str]:
     # 使用OpenAI API为每个热词生成犀利的AI锐评
@@ -272,8 +432,14 @@ def health():
         },
         "features": {
             "ai_comment_enabled": AI_COMMENT_ENABLED,
-            "ai_word_selection_enabled": AI_WORD_SELECTION_ENABLED
-        }
+            "ai_word_selection_enabled": AI_WORD_SELECTION_ENABLED,
+            "streaming_upload": UPLOAD_STREAMING_ENABLED
+        },
+        "load": {
+            "job_workers": JOB_WORKERS,
+            "admission": analysis_admission.stats() if analysis_admission else None
+        },
+        "storage": temp_janitor.stats() if temp_janitor else None
     })
 
 @app.route("/api/csrf-token", methods=["GET"])
@@ -287,8 +453,9 @@ def allowed_file(filename):
     """检查文件类型是否允许（根据配置）"""
     if not filename or '.' not in filename:
         return False
-    ext = filename.rsplit('.', 1)[1].lower()
-    return ext in ALLOWED_FILE_EXTENSIONS
+    # 支持多段扩展名（如 json.gz）
+    lowered = filename.lower()
+    return any(lowered.endswith('.' + ext.strip().lower()) for ext in ALLOWED_FILE_EXTENSIONS if ext.strip())
 
 
 @app.route("/api/upload", methods=["POST"])
@@ -299,188 +466,545 @@ def upload_and_analyze():
 
     user_id = get_or_create_user_id()
 
-    file = request.files.get("file")
-    if not file:
-        return jsonify({"error": "缺少文件"}), 400
+    # 流式上传时文件名与参数在查询字符串中，否则在 multipart 表单中
+    streamed = is_streamed_upload()
+    if streamed:
+        if not UPLOAD_STREAMING_ENABLED:
+            return jsonify({"error": "未启用流式上传，请使用表单上传文件"}), 400
+        params = request.args
+        filename = params.get("filename", "")
+        file = None
+    else:
+        params = request.form
+        file = request.files.get("file")
+        if not file:
+            return jsonify({"error": "缺少文件"}), 400
+        filename = file.filename
 
-    if not file.filename:
+    if not filename:
         return jsonify({"error": "文件名为空"}), 400
 
-    if not allowed_file(file.filename):
+    if not allowed_file(filename):
         allowed_exts = ', '.join(ALLOWED_FILE_EXTENSIONS)
         return jsonify({"error": f"只允许上传以下类型文件: {allowed_exts}"}), 400
 
     # 使用 secure_filename 防止路径遍历攻击（根据配置）
     if FILE_SECURITY_CHECK:
-        safe_filename = secure_filename(file.filename)
+        safe_filename = secure_filename(filename)
     else:
-        safe_filename = file.filename
+        safe_filename = filename
 
-    auto_select = request.form.get("auto_select", "false").lower() == "true"
-    use_stopwords = request.form.get("use_stopwords", "false").lower() == "true"
-    logger.info(f"🔍 收到上传请求 - auto_select参数: {request.form.get('auto_select')}, 解析后: {auto_select}")
+    auto_select = params.get("auto_select", "false").lower() == "true"
+    use_stopwords = params.get("use_stopwords", "false").lower() == "true"
+    logger.info(f"🔍 收到上传请求 - auto_select参数: {params.get('auto_select')}, 解析后: {auto_select}")
     logger.info(f"🔍 使用停用词库: {use_stopwords}")
-    logger.info(f"🔍 收到上传请求 - auto_select参数: {request.form.get('auto_select')}, 解析后: {auto_select}")
-
-    start_date = request.form.get('start_date')
-    end_date = request.form.get('end_date')
 
+    start_date = params.get('start_date') or None
+    end_date = params.get('end_date') or None
     if start_date:
-        config.MESSAGE_START_DATE = start_date
         logger.info(f"设置消息开始时间过滤：{start_date}")
-    else:
-        config.MESSAGE_START_DATE = None
-
     if end_date:
-        config.MESSAGE_END_DATE = end_date
         logger.info(f"设置消息结束时间过滤：{end_date}")
-    else:
-        config.MESSAGE_END_DATE = None
 
     report_id = str(uuid.uuid4())
 
     # 添加请求日志（增强安全审计）
     logger.info(f"{'='*60}")
     logger.info(f"📤 收到上传请求 | Report ID: {report_id}")
-    logger.debug(f"原文件名: {file.filename}")
+    logger.debug(f"原文件名: {filename}")
     logger.debug(f"安全文件名: {safe_filename}")
-    logger.debug(f"文件大小: {file.content_length or '未知'} 字节")
+    logger.debug(f"文件大小: {request.content_length or '未知'} 字节")
+    logger.debug(f"流式上传: {streamed}")
     logger.debug(f"AI自动选词: {auto_select}")
     logger.debug(f"请求来源: {request.remote_addr}")
     logger.debug(f"User-Agent: {request.headers.get('User-Agent', '未知')}")
     logger.info(f"{'='*60}\n")
 
-    # 临时保存文件
-    base_dir = os.path.join(PROJECT_ROOT, "runtime_outputs")
-    temp_dir = os.path.join(base_dir, "temp")
-    os.makedirs(temp_dir, exist_ok=True)
-    temp_path = os.path.join(temp_dir, f"{report_id}.json")
-    file.save(temp_path)
+    # 上传内容原样写入临时文件（同时计算内容哈希），由分析进程读取解析，
+    # 服务进程不持有解析后的数据，排队期间也不占用内存
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    temp_path = os.path.join(TEMP_DIR, f"{report_id}.json")
+    # 请求体是压缩后的大小，接收完成后按文件记录的解压后大小估算内存，在解析之前完成准入
+    try:
+        export_hash = save_upload_with_hash(request.stream if streamed else file.stream, temp_path)
+    except RequestEntityTooLarge:
+        cleanup_temp_files(temp_path)
+        raise
+    except Exception as exc:
+        logger.error(f"❌ 接收上传内容失败: {exc}")
+        cleanup_temp_files(temp_path)
+        return jsonify({"error": f"接收上传内容失败: {exc}"}), 400
+    if export_too_large(temp_path):
+        cleanup_temp_files(temp_path)
+        return export_too_large_response()
 
+    # 分析交给后台任务，立即返回任务ID，客户端轮询 /api/jobs/<job_id>
     try:
-        # 使用流式解析加载JSON（避免内存溢出）
-        data = load_json(temp_path)
-        analyzer = analyzer_mod.ChatAnalyzer(data, use_stopwords=use_stopwords)
-        analyzer.analyze()
-        report = analyzer.export_json()
+        job_id, deduplicated = submit_upload_job(
+            report_id, export_hash, temp_path, user_id,
+            auto_select=auto_select, use_stopwords=use_stopwords, start_date=start_date, end_date=end_date,
+        )
+    except AdmissionRejected as exc:
+        logger.warning(f"⚠️ 分析任务未被准入: {exc}")
+        cleanup_temp_files(temp_path)
+        response = jsonify({"error": f"服务器繁忙：{exc}"})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    except Exception as exc:
+        logger.error(f"❌ 创建分析任务失败: {exc}")
+        cleanup_temp_files(temp_path)
+        return jsonify({"error": f"创建分析任务失败: {exc}"}), 500
 
-        all_words = report.get('topWords', [])[:100]
+    return jsonify({
+        "job_id": job_id,
+        "report_id": report_id,
+        "status": "queued",
+        "status_url": f"/api/jobs/{job_id}",
+        "export_hash": export_hash,
+        "deduplicated": deduplicated
+    }), 202
+
+
+def submit_upload_job(report_id: str, export_hash: str, temp_path: str, user_id: str,
+                      auto_select: bool, use_stopwords: bool, start_date: Optional[str],
+                      end_date: Optional[str], group: Optional[str] = None):
+    """
+    提交上传分析任务，返回 (任务ID, 是否命中分析结果缓存)
+    按导出解压后的大小预留分析内存，分析进程读取时解压字节数不超过预留所依据的大小；
+    未被准入时抛出 AdmissionRejected（临时文件由调用方清理）
+    """
+    content_bytes = export_content_size(temp_path)
+    # 同一份导出、相同时间范围与停用词设置已分析过：直接复用分析结果，跳过解析与分析
+    cache_args = (export_hash, start_date, end_date, use_stopwords, ANALYZER_VERSION)
+    cached_report = analysis_cache.get(*cache_args) if analysis_cache else None
+    task, task_args = analyze_chat_export, (temp_path,)
+    if cached_report is not None:
+        logger.info(f"♻️ 命中分析结果缓存: {export_hash[:12]}，跳过分析")
+        cleanup_temp_files(temp_path)
+        temp_path = None
+        task, task_args = None, ()
+
+    def release_upload():
+        if temp_janitor:
+            temp_janitor.release(temp_path)
+
+    def on_complete(report):
+        release_upload()
+        if analysis_cache and cached_report is None:
+            analysis_cache.set(*cache_args, report)
+        with app.app_context():
+            return complete_upload(report_id, report, auto_select, use_stopwords, user_id, temp_path)
+
+    def on_error(exc):
+        release_upload()
+        cleanup_temp_files(temp_path)
 
-        # 确保有足够的词汇
-        if len(all_words) == 0:
-            logger.error("❌ 分析结果中没有找到任何热词")
-            cleanup_temp_files(temp_path)
-            return jsonify({"error": "分析结果中没有找到热词，请检查聊天记录文件"}), 500
-
-        if auto_select:
-            logger.info("✅ 进入自动选词模式")
-            # 自动选词模式：根据AI功能是否开启选择不同的选词方式
-            if AI_WORD_SELECTION_ENABLED:
-                logger.info("🤖 启动AI智能选词...")
-                ai_selector = AIWordSelector()
-
-                if ai_selector.client:
-                    selected_word_objects = ai_selector.select_words(all_words, top_n=200)
-
-                    if selected_word_objects:
-                        # 按词频从高到低排序
-                        selected_word_objects_sorted = sorted(
-                            selected_word_objects,
-                            key=lambda w: w['freq'],
-                            reverse=True
-                        )
-                        selected_words = [w['word'] for w in selected_word_objects_sorted[:10]]
-                        # 如果AI选词少于10个，用前10个热词补齐
-                        if len(selected_words) < 10:
-                            logger.warning(f"AI选词只有{len(selected_words)}个，用前10个热词补齐")
-                            selected_words = [w['word'] for w in all_words[:10]]
-                        logger.info(f"✅ AI选词成功（已按词频排序）: {', '.join(selected_words)}")
-                    else:
-                        logger.warning("AI选词失败，使用前10个热词")
-                        selected_words = [w['word'] for w in all_words[:10]]
-                else:
-                    logger.warning("OpenAI未配置或客户端未就绪，使用前10个热词")
-                    selected_words = [w['word'] for w in all_words[:10]]
-            else:
-                # AI功能未开启，直接使用前10个热词
-                logger.info("📋 使用默认前10个热词（AI功能未开启）")
-                if len(all_words) < 10:
-                    logger.warning(f"可用词汇只有{len(all_words)}个，少于10个")
-                selected_words = [w['word'] for w in all_words[:10]]
-                if len(selected_words) < 10:
-                    logger.error(f"无法选择10个词，只有{len(selected_words)}个可用词汇")
-                    raise ValueError(f"可用词汇不足10个，无法生成报告")
-
-            user_id = get_or_create_user_id()
-            logger.info(f"📝 准备生成报告，已选择{len(selected_words)}个词: {', '.join(selected_words[:5])}...")
-            result = finalize_report(
-                report_id=report_id,
-                analyzer=None,  
-                selected_words=selected_words,
-                auto_mode=True,
-                report_data=report,
-                user_id=user_id
+    # 排队与分析期间上传文件不被运行时目录清理删除（包括其他服务进程的清理器）
+    if temp_janitor:
+        temp_janitor.hold(temp_path)
+    try:
+        job_id = job_manager.submit(
+            'upload',
+            task,
+            args=task_args,
+            kwargs={'use_stopwords': use_stopwords, 'start_date': start_date, 'end_date': end_date,
+                    'max_bytes': export_read_limit(content_bytes)},
+            owner=user_id,
+            on_complete=on_complete,
+            on_error=on_error,
+            cached_result=cached_report,
+            memory=estimate_memory(content_bytes),
+            group=group,
+        )
+    except Exception:
+        release_upload()
+        raise
+    return job_id, cached_report is not None
+
+
+@app.route("/api/batches", methods=["POST"])
+@limiter.limit(RATE_LIMIT_BATCH if SECURITY_ENABLED and RATE_LIMIT_BATCH else "1000000 per hour")
+def upload_batch():
+    """
+    批量上传多个群的导出文件（multipart 表单，字段 files 可重复），参数与 /api/upload 相同
+    各群的分析作为同一分组的后台任务提交，与其他用户的上传轮流执行；
+    返回批量任务ID，客户端轮询 /api/batches/<batch_id> 获取各群状态
+    """
+    if not db_service:
+        return jsonify({"error": "数据库服务未初始化"}), 500
+
+    user_id = get_or_create_user_id()
+    files = [f for f in request.files.getlist("files") if f and f.filename]
+    if not files:
+        return jsonify({"error": "缺少文件"}), 400
+    if len(files) > BATCH_MAX_FILES:
+        return jsonify({"error": f"单次最多上传 {BATCH_MAX_FILES} 个文件"}), 400
+
+    params = request.form
+    options = {
+        'auto_select': params.get("auto_select", "false").lower() == "true",
+        'use_stopwords': params.get("use_stopwords", "false").lower() == "true",
+        'start_date': params.get('start_date') or None,
+        'end_date': params.get('end_date') or None,
+    }
+
+    batch_id = str(uuid.uuid4())
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    logger.info(f"📦 收到批量上传 | Batch ID: {batch_id} | 文件数: {len(files)}")
+
+    items = []
+    for file in files:
+        filename = file.filename
+        item = {"filename": filename, "job_id": None, "report_id": None}
+        items.append(item)
+        if not allowed_file(filename):
+            item.update(status=FAILED, error=f"只允许上传以下类型文件: {', '.join(ALLOWED_FILE_EXTENSIONS)}")
+            continue
+
+        report_id = str(uuid.uuid4())
+        temp_path = os.path.join(TEMP_DIR, f"{report_id}.json")
+        try:
+            export_hash = save_upload_with_hash(file.stream, temp_path)
+            if export_too_large(temp_path):
+                raise ExportTooLarge(MAX_EXPORT_CONTENT_BYTES)
+            job_id, deduplicated = submit_upload_job(
+                report_id, export_hash, temp_path, user_id,
+                group=batch_id, **options,
             )
-            logger.info(f"✅ 自动选词模式报告生成完成，返回结果: {result.get_json() if hasattr(result, 'get_json') else result}")
+        except Exception as exc:
+            logger.warning(f"⚠️ 批量任务中的文件未能提交: {filename} | {exc}")
             cleanup_temp_files(temp_path)
-            return result
+            item.update(status=FAILED, error=str(exc))
+            continue
+        item.update(job_id=job_id, report_id=report_id, export_hash=export_hash, deduplicated=deduplicated)
+
+    job_manager.create_batch(batch_id, user_id, items)
+    submitted = sum(1 for item in items if item['job_id'])
+    logger.info(f"📦 批量任务已排队: {batch_id} | 已提交 {submitted}/{len(items)}")
+
+    return jsonify({
+        "batch_id": batch_id,
+        "status": "queued",
+        "status_url": f"/api/batches/{batch_id}",
+        "submitted": submitted,
+        "items": items,
+    }), 202
+
+
+def load_owned_job(job_id: str):
+    """
+    读取任务并校验所有者（与删除报告相同，按会话中的用户ID比对），
+    返回 (任务, None)；任务不存在或不属于当前用户时返回 (None, 错误响应)
+    """
+    job = job_manager.get(job_id)
+    if not job:
+        return None, (jsonify({"error": "任务不存在或已过期"}), 404)
+    user_id = get_or_create_user_id()
+    if job.get('owner') != user_id:
+        logger.warning(f"⚠️ 权限拒绝: 用户 {user_id} 尝试访问任务 {job_id} (所有者: {job.get('owner')})")
+        return None, (jsonify({"error": "无权限访问此任务"}), 403)
+    return job, None
+
+
+@app.route("/api/batches/<batch_id>", methods=["GET"])
+@limiter.limit(RATE_LIMIT_JOB_STATUS if SECURITY_ENABLED and RATE_LIMIT_JOB_STATUS else "1000000 per hour")
+def get_batch_status(batch_id):
+    """
+    查询批量任务状态
+
+    返回: status（running/done）、total、counts（各状态数量）、progress（0~1），
+    items 为各群的 filename、job_id、report_id、status、stage、progress、result、error
+    """
+    _, error = load_owned_job(batch_id)
+    if error:
+        return error
+    batch = job_manager.get_batch(batch_id)
+    if not batch:
+        return jsonify({"error": "批量任务不存在或已过期"}), 404
+    return jsonify(batch)
+
+
+def select_top_words(all_words: List[Dict]) -> List[str]:
+    """自动选词：AI 选词开启时由 AI 选择，否则取前10个热词"""
+    if AI_WORD_SELECTION_ENABLED:
+        logger.info("🤖 启动AI智能选词...")
+        ai_selector = AIWordSelector()
+
+        if ai_selector.client:
+            selected_word_objects = ai_selector.select_words(all_words, top_n=200)
+
+            if selected_word_objects:
+                # 按词频从高到低排序
+                selected_word_objects_sorted = sorted(
+                    selected_word_objects,
+                    key=lambda w: w['freq'],
+                    reverse=True
+                )
+                selected_words = [w['word'] for w in selected_word_objects_sorted[:10]]
+                # 如果AI选词少于10个，用前10个热词补齐
+                if len(selected_words) < 10:
+                    logger.warning(f"AI选词只有{len(selected_words)}个，用前10个热词补齐")
+                    selected_words = [w['word'] for w in all_words[:10]]
+                logger.info(f"✅ AI选词成功（已按词频排序）: {', '.join(selected_words)}")
+                return selected_words
+            logger.warning("AI选词失败，使用前10个热词")
         else:
-            result_temp_path = os.path.join(temp_dir, f"{report_id}_result.json")
-            with open(result_temp_path, 'w', encoding='utf-8') as f:
-                json.dump(report, f, ensure_ascii=False, indent=2)
+            logger.warning("OpenAI未配置或客户端未就绪，使用前10个热词")
+        return [w['word'] for w in all_words[:10]]
+
+    # AI功能未开启，直接使用前10个热词
+    logger.info("📋 使用默认前10个热词（AI功能未开启）")
+    if len(all_words) < 10:
+        logger.warning(f"可用词汇只有{len(all_words)}个，少于10个")
+    selected_words = [w['word'] for w in all_words[:10]]
+    if len(selected_words) < 10:
+        logger.error(f"无法选择10个词，只有{len(selected_words)}个可用词汇")
+        raise ValueError(f"可用词汇不足10个，无法生成报告")
+    return selected_words
+
+
+def complete_upload(report_id: str, report: Dict, auto_select: bool, use_stopwords: bool,
+                    user_id: str, temp_path: str = None) -> Dict:
+    """
+    上传任务分析完成后的处理（需要应用上下文）
+    自动选词模式直接生成报告；手动模式保存分析结果等待 /api/finalize
+    返回原上传接口的响应内容，失败时抛出异常（临时文件由任务失败回调清理）
+    """
+    all_words = report.get('topWords', [])[:100]
 
-            return jsonify({
-                "report_id": report_id,
-                "chat_name": report.get('chatName', '未知群聊'),
-                "message_count": report.get('messageCount', 0),
-                "available_words": all_words,
-                "stopwords_enabled": use_stopwords
-            })
-    except Exception as exc:
-        import traceback
-        error_trace = traceback.format_exc()
-        logger.error(f"❌ upload_and_analyze失败: {exc}")
-        logger.error(f"错误堆栈:\n{error_trace}")
-        traceback.print_exc()
+    # 确保有足够的词汇
+    if len(all_words) == 0:
+        logger.error("❌ 分析结果中没有找到任何热词")
+        raise ValueError("分析结果中没有找到热词，请检查聊天记录文件")
+
+    if not auto_select:
+        save_pending_result(report_id, report)
+        # 选词只需要分析结果，上传的原始文件已不再需要
         cleanup_temp_files(temp_path)
-        return jsonify({"error": f"分析失败: {exc}"}), 500
+
+        return {
+            "report_id": report_id,
+            "chat_name": report.get('chatName', '未知群聊'),
+            "message_count": report.get('messageCount', 0),
+            "available_words": all_words,
+            "stopwords_enabled": use_stopwords
+        }
+
+    logger.info("✅ 进入自动选词模式")
+    selected_words = select_top_words(all_words)
+    logger.info(f"📝 准备生成报告，已选择{len(selected_words)}个词: {', '.join(selected_words[:5])}...")
+    response = finalize_report(
+        report_id=report_id,
+        analyzer=None,
+        selected_words=selected_words,
+        auto_mode=True,
+        report_data=report,
+        user_id=user_id
+    )
+    if isinstance(response, tuple):
+        response, _ = response
+    result = response.get_json()
+    if result.get('error'):
+        raise RuntimeError(result['error'])
+    logger.info(f"✅ 自动选词模式报告生成完成，返回结果: {result}")
+    cleanup_temp_files(temp_path)
+    return result
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+@limiter.limit(RATE_LIMIT_JOB_STATUS if SECURITY_ENABLED and RATE_LIMIT_JOB_STATUS else "1000000 per hour")
+def get_job_status(job_id):
+    """
+    查询分析任务状态
+
+    返回: status（queued/running/done/failed）、stage、progress（0~1），
+    完成时附带 result（与原同步上传接口的返回内容相同），失败时附带 error
+    """
+    job, error = load_owned_job(job_id)
+    if error:
+        return error
+
+    payload = {
+        "job_id": job_id,
+        "kind": job['kind'],
+        "status": job['status'],
+        "stage": job['stage'],
+        "progress": job['progress'],
+        "created_at": job['created_at'],
+        "updated_at": job['updated_at'],
+    }
+    if job.get('detail'):
+        payload["detail"] = job['detail']
+    if job['status'] == DONE:
+        payload["result"] = job['result']
+    elif job['status'] == FAILED:
+        payload["error"] = f"分析失败: {job['error']}"
+    return jsonify(payload)
+
+
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.route("/api/jobs/<job_id>/events", methods=["GET"])
+@limiter.limit(RATE_LIMIT_JOB_STATUS if SECURITY_ENABLED and RATE_LIMIT_JOB_STATUS else "1000000 per hour")
+def stream_job_events(job_id):
+    """
+    以 Server-Sent Events 推送任务进度
+
+    事件：
+    - progress: {status, stage, progress, detail: {stage, fraction, progress, done, total, rate, elapsed}}
+    - done:     {result}，随后关闭连接
+    - failed:   {error}，随后关闭连接
+    连接最长保持 JOB_EVENTS_MAX_SECONDS 秒，之后由 EventSource 自动重连
+    """
+    _, error = load_owned_job(job_id)
+    if error:
+        return error
+
+    def generate():
+        yield "retry: 1000\n\n"
+        deadline = time.monotonic() + JOB_EVENTS_MAX_SECONDS
+        last_update = None
+        last_heartbeat = time.monotonic()
+        while time.monotonic() < deadline:
+            job = job_manager.get(job_id)
+            if job is None:
+                yield _sse('failed', {"error": "任务不存在或已过期"})
+                return
+            if job['status'] == DONE:
+                yield _sse('done', {"result": job['result']})
+                return
+            if job['status'] == FAILED:
+                yield _sse('failed', {"error": f"分析失败: {job['error']}"})
+                return
+            if job['updated_at'] != last_update:
+                last_update = job['updated_at']
+                last_heartbeat = time.monotonic()
+                yield _sse('progress', {
+                    "status": job['status'],
+                    "stage": job['stage'],
+                    "progress": job['progress'],
+                    "detail": job.get('detail'),
+                })
+            elif time.monotonic() - last_heartbeat >= 15:
+                last_heartbeat = time.monotonic()
+                yield ": keep-alive\n\n"
+            time.sleep(JOB_EVENTS_POLL_SECONDS)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/api/jobs/<job_id>/result", methods=["GET"])
+@limiter.limit(RATE_LIMIT_JOB_STATUS if SECURITY_ENABLED and RATE_LIMIT_JOB_STATUS else "1000000 per hour")
+def get_job_result(job_id):
+    """获取已完成任务的结果；未完成返回 202，失败返回 500"""
+    job, error = load_owned_job(job_id)
+    if error:
+        return error
+    if job['status'] == DONE:
+        return jsonify(job['result'])
+    if job['status'] == FAILED:
+        return jsonify({"error": f"分析失败: {job['error']}"}), 500
+    return jsonify({"job_id": job_id, "status": job['status'], "progress": job['progress']}), 202
 
 
 @app.route("/api/personal-report", methods=["POST"])
 @limiter.limit(RATE_LIMIT_UPLOAD if SECURITY_ENABLED and RATE_LIMIT_UPLOAD else "1000000 per hour")
 def generate_personal_report():
-    """生成个人年度报告"""
+    """
+    生成个人年度报告
+    
+    可以上传文件，也可以只传入之前响应中返回的 export_hash（同一份导出无需重新上传）；
+    流式上传时请求体直接是导出文件，参数放在查询字符串中
+    """
     try:
-        if 'file' not in request.files:
-            return jsonify({"error": "未上传文件"}), 400
-        
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({"error": "未选择文件"}), 400
+        streamed = is_streamed_upload()
+        if streamed and not UPLOAD_STREAMING_ENABLED:
+            return jsonify({"error": "未启用流式上传，请使用表单上传文件"}), 400
+        params = request.args if streamed else request.form
         
-        target_name = request.form.get('target_name', '').strip()
+        target_name = params.get('target_name', '').strip()
         if not target_name:
             return jsonify({"error": "未指定要分析的用户名称"}), 400
         
-        use_stopwords = request.form.get("use_stopwords", "false").lower() == "true"
+        use_stopwords = params.get("use_stopwords", "false").lower() == "true"
+        export_hash = params.get('export_hash', '').strip()
         
-        # 保存临时文件
-        base_dir = os.path.join(PROJECT_ROOT, "runtime_outputs")
-        temp_dir = os.path.join(base_dir, "temp")
-        os.makedirs(temp_dir, exist_ok=True)
+        file = None if streamed else request.files.get('file')
+        if file is None and not export_hash and not streamed:
+            return jsonify({"error": "未上传文件"}), 400
+        if file is not None and file.filename == '':
+            return jsonify({"error": "未选择文件"}), 400
         
         report_id = str(uuid.uuid4())
-        temp_path = os.path.join(temp_dir, f"{report_id}.json")
-        file.save(temp_path)
+        temp_path = None
+        
+        if streamed or file is not None:
+            # 保存临时文件（同时计算导出内容哈希），之后流式读取，不在内存中保留整个群聊
+            os.makedirs(TEMP_DIR, exist_ok=True)
+            temp_path = os.path.join(TEMP_DIR, f"{report_id}.json")
+            try:
+                export_hash = save_upload_with_hash(request.stream if streamed else file.stream, temp_path)
+            except RequestEntityTooLarge:
+                cleanup_temp_files(temp_path)
+                raise
+            except Exception as exc:
+                logger.error(f"❌ 接收上传内容失败: {exc}")
+                cleanup_temp_files(temp_path)
+                return jsonify({"error": f"接收上传内容失败: {exc}"}), 400
+            if export_too_large(temp_path):
+                cleanup_temp_files(temp_path)
+                return export_too_large_response()
         
         try:
-            # 加载JSON数据
-            data = load_json(temp_path)
+            report = None
             
-            # 创建个人分析器
-            analyzer = PersonalAnalyzer(data, target_name, use_stopwords=use_stopwords)
-            analyzer.analyze()
-            report = analyzer.export_json()
+            # 先查缓存：由成员名称索引解析目标用户，再按 (哈希, UIN, 停用词, 版本) 取报告
+            members = personal_cache.get_members(export_hash) if personal_cache else None
+            if members:
+                cached_uin = NameIndex.from_dict(members).resolve(target_name)
+                if cached_uin:
+                    report = personal_cache.get_report(
+                        export_hash, cached_uin, use_stopwords, PERSONAL_ANALYZER_VERSION
+                    )
+                    if report is not None:
+                        logger.info(f"⚡ 个人报告命中缓存: {target_name} (UIN: {cached_uin})")
+            
+            if report is None:
+                if temp_path is None:
+                    return jsonify({"error": "缓存已失效，请重新上传文件", "code": "CACHE_MISS"}), 404
+                # 个人报告在请求内同步分析，与后台分析任务共用内存预算：预算不足时不排队，直接返回 503
+                content_bytes = export_content_size(temp_path)
+                memory = estimate_personal_memory(content_bytes)
+                if analysis_admission:
+                    if not analysis_admission.fits_budget(memory):
+                        cleanup_temp_files(temp_path)
+                        return jsonify({"error": "聊天记录过大，超出服务器可用于分析的内存"}), 413
+                    if not analysis_admission.try_acquire(memory, queued=False):
+                        cleanup_temp_files(temp_path)
+                        response = jsonify({"error": "服务器繁忙：当前分析任务过多，请稍后再试"})
+                        response.headers['Retry-After'] = '30'
+                        return response, 503
+                try:
+                    # 流式读取：只保留目标用户的消息和紧凑的回复索引，不加载整个群聊
+                    analyzer = PersonalAnalyzer.from_file(temp_path, target_name, use_stopwords=use_stopwords,
+                                                          max_bytes=export_read_limit(content_bytes))
+                    analyzer.analyze()
+                    report = analyzer.export_json()
+                finally:
+                    if analysis_admission:
+                        analysis_admission.release(memory)
+                
+                if personal_cache:
+                    personal_cache.set_members(export_hash, analyzer.name_index.to_dict())
+                    personal_cache.set_report(
+                        export_hash, analyzer.target_uin, use_stopwords, PERSONAL_ANALYZER_VERSION, report
+                    )
             
             # 保存到数据库
             if db_service:
@@ -501,10 +1025,15 @@ def generate_personal_report():
             return jsonify({
                 "success": True,
                 "report_id": report_id,
+                "export_hash": export_hash,
                 "report": report,
                 "report_url": f"/personal-report/{report_id}"
             })
             
+        except ExportTooLarge as e:
+            cleanup_temp_files(temp_path)
+            logger.warning(f"⚠️ {e}")
+            return export_too_large_response()
         except ValueError as e:
             cleanup_temp_files(temp_path)
             return jsonify({"error": str(e)}), 400
@@ -551,16 +1080,10 @@ def finalize_report_endpoint():
     logger.info(f"{'='*60}\n")
     
     try:
-        base_dir = os.path.join(PROJECT_ROOT, "runtime_outputs")
-        temp_dir = os.path.join(base_dir, "temp")
-        result_temp_path = os.path.join(temp_dir, f"{report_id}_result.json")
-        
-        if not os.path.exists(result_temp_path):
-            return jsonify({"error": "分析结果已过期，请重新上传"}), 404
-        
         logger.info("📂 加载已缓存的分析结果...")
-        with open(result_temp_path, 'r', encoding='utf-8') as f:
-            report = json.load(f)
+        report = load_pending_result(report_id)
+        if report is None:
+            return jsonify({"error": "分析结果已过期，请重新上传"}), 404
         
 
         user_id = get_or_create_user_id()
@@ -574,11 +1097,10 @@ def finalize_report_endpoint():
             user_id=user_id
         )
         
-        # 清理临时文件
-        original_json_path = os.path.join(temp_dir, f"{report_id}.json")
-        cleanup_temp_files(result_temp_path)
-        if os.path.exists(original_json_path):
-            cleanup_temp_files(original_json_path)
+        # 清理临时文件（含旧版未压缩的分析结果和上传文件）
+        cleanup_temp_files(pending_result_path(report_id))
+        for name in (f"{report_id}_result.json", f"{report_id}.json"):
+            cleanup_temp_files(os.path.join(TEMP_DIR, name))
         
         return result
     except Exception as exc:
@@ -669,6 +1191,30 @@ def finalize_report(report_id: str, analyzer, selected_words: List[str],
         return jsonify({"error": f"最终化失败: {exc}"}), 500
 
 
+def pending_result_path(report_id: str) -> str:
+    return os.path.join(TEMP_DIR, f"{report_id}_result.json.gz")
+
+
+def save_pending_result(report_id: str, report: Dict):
+    """保存等待选词的分析结果（gzip 压缩）"""
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    with gzip.open(pending_result_path(report_id), 'wt', encoding='utf-8', compresslevel=6) as f:
+        json.dump(report, f, ensure_ascii=False)
+
+
+def load_pending_result(report_id: str) -> Optional[Dict]:
+    """读取等待选词的分析结果，兼容旧版未压缩的 _result.json；不存在（已过期）时返回 None"""
+    path = pending_result_path(report_id)
+    if os.path.exists(path):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+    legacy_path = os.path.join(TEMP_DIR, f"{report_id}_result.json")
+    if os.path.exists(legacy_path):
+        with open(legacy_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return None
+
+
 def cleanup_temp_files(file_path: str):
     try:
         if file_path and os.path.exists(file_path):
@@ -698,6 +1244,28 @@ def list_reports():
         return jsonify({"error": f"查询失败: {exc}"}), 500
 
 
+@app.route("/api/personal-report/candidates", methods=["GET"])
+@limiter.limit(RATE_LIMIT_LIST_REPORTS if SECURITY_ENABLED and RATE_LIMIT_LIST_REPORTS else "1000000 per hour")
+def personal_report_candidates():
+    """按名称模糊查找群成员（"你是不是要找"），需要此前上传过同一份导出"""
+    export_hash = request.args.get('export_hash', '').strip()
+    query = request.args.get('q', '').strip()
+    if not export_hash or not query:
+        return jsonify({"error": "缺少 export_hash 或 q 参数"}), 400
+    
+    try:
+        limit = min(max(int(request.args.get('limit', 5)), 1), 50)
+    except ValueError:
+        limit = 5
+    
+    members = personal_cache.get_members(export_hash) if personal_cache else None
+    if not members:
+        return jsonify({"error": "缓存已失效，请重新上传文件", "code": "CACHE_MISS"}), 404
+    
+    candidates = NameIndex.from_dict(members).search(query, limit)
+    return jsonify({"success": True, "candidates": candidates})
+
+
 @app.route("/api/personal-reports", methods=["GET"])
 @limiter.limit(RATE_LIMIT_LIST_REPORTS if SECURITY_ENABLED and RATE_LIMIT_LIST_REPORTS else "1000000 per hour")
 def list_personal_reports():
@@ -845,13 +1413,34 @@ def get_report_api(report_id):
         return jsonify({"error": "数据库服务未初始化"}), 500
     
     try:
-        report = db_service.get_report(report_id)
-        if not report:
+        if report_payload_cache is None:
+            report = db_service.get_report(report_id)
+            if not report:
+                return jsonify({"error": "报告不存在"}), 404
+            return jsonify(process_report_data_for_frontend(report))
+
+        # 先只查询报告版本，命中缓存时无需读取报告和重新生成页面数据
+        version = db_service.get_report_version(report_id)
+        if version is None:
             return jsonify({"error": "报告不存在"}), 404
-        
-        processed_data = process_report_data_for_frontend(report)
-        
-        return jsonify(processed_data)
+
+        cached = report_payload_cache.get(report_id, version)
+        if cached is None:
+            report = db_service.get_report(report_id)
+            if not report:
+                return jsonify({"error": "报告不存在"}), 404
+            body = app.json.dumps(process_report_data_for_frontend(report))
+            cached = report_payload_cache.set(report_id, version, body)
+        body, etag = cached
+
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        # 允许浏览器缓存，但每次使用前需用 ETag 向服务端确认
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     except Exception as exc:
         import traceback
         traceback.print_exc()
@@ -875,9 +1464,12 @@ def delete_report(report_id):
             logger.warning(f"⚠️ 权限拒绝: 用户 {user_id} 尝试删除报告 {report_id} (所有者: {report.get('user_id')})")
             return jsonify({"error": "无权限删除此报告"}), 403
         
+        version = db_service.get_report_version(report_id) if report_payload_cache else None
         success = db_service.delete_report(report_id)
         if not success:
             return jsonify({"error": "删除失败"}), 500
+        if version is not None:
+            report_payload_cache.invalidate(report_id, version)
         
         logger.info(f"✅ 报告已删除: {report_id} (用户: {user_id})")
         return jsonify({"success": True, "message": "报告已删除"})
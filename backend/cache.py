@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析结果缓存
+内存 LRU（按条目数和字节数限制）+ 磁盘 JSON 两级缓存；
+报告页面数据使用内存 LRU + 可选 Redis 两级缓存
+"""
+
+import json
+import os
+import sys
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+# 添加父目录到路径以导入 logger
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger import get_logger
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = get_logger(__name__)
+
+
+class LRUCache:
+    """线程安全的内存 LRU 缓存，同时限制条目数和总字节数"""
+
+    def __init__(self, max_items: int = 128, max_bytes: int = 64 * 1024 * 1024):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, size: int):
+        """写入缓存；size 为该条目的估算字节数，超过总上限的条目不缓存"""
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (value, size)
+            self._bytes += size
+            while self._data and (len(self._data) > self.max_items or self._bytes > self.max_bytes):
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is None:
+                return default
+            self._bytes -= entry[1]
+            return entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "items": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ResultCache:
+    """
+    JSON 结果两级缓存：先查内存 LRU，未命中再查磁盘
+    键为任意可 repr 的元组，磁盘文件名为键的 sha256
+    """
+
+    def __init__(self, cache_dir, max_items: int = 128, max_bytes: int = 64 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.memory = LRUCache(max_items=max_items, max_bytes=max_bytes)
+
+    def _path(self, key) -> Path:
+        digest = hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+        return self.cache_dir / f"{digest}.json"
+
+    def get(self, key) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+
+        path = self._path(key)
+        if not path.exists():
+            return None
+        try:
+            text = path.read_text(encoding='utf-8')
+            value = json.loads(text)
+            # 更新修改时间，磁盘清理按修改时间淘汰时相当于 LRU
+            os.utime(path)
+        except Exception as e:
+            logger.warning(f"⚠️ 读取缓存失败，已忽略: {path.name} | {e}")
+            return None
+        self.memory.set(key, value, len(text))
+        return value
+
+    def set(self, key, value):
+        text = json.dumps(value, ensure_ascii=False)
+        self.memory.set(key, value, len(text))
+        path = self._path(key)
+        tmp_path = path.with_suffix('.tmp')
+        try:
+            tmp_path.write_text(text, encoding='utf-8')
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"⚠️ 写入缓存失败: {path.name} | {e}")
+
+    def delete(self, key):
+        self.memory.pop(key)
+        path = self._path(key)
+        if path.exists():
+            path.unlink()
+
+
+class PersonalReportCache:
+    """
+    个人报告缓存
+
+    - 报告：键为 (导出文件哈希, 目标UIN, 是否使用停用词, 分析器版本)
+    - 成员名单：键为导出文件哈希，保存 uin -> 名称 映射，
+      使同一份导出再次请求时无需重新上传和解析即可解析目标用户
+    """
+
+    def __init__(self, cache_dir, max_items: int = 128, max_bytes: int = 64 * 1024 * 1024):
+        cache_dir = Path(cache_dir)
+        self.reports = ResultCache(cache_dir / "reports", max_items=max_items, max_bytes=max_bytes)
+        self.members = ResultCache(cache_dir / "members", max_items=max_items, max_bytes=max_bytes)
+
+    @staticmethod
+    def report_key(export_hash: str, target_uin: str, use_stopwords: bool, version: str):
+        return ('personal', export_hash, str(target_uin), bool(use_stopwords), version)
+
+    def get_report(self, export_hash, target_uin, use_stopwords, version) -> Optional[Dict]:
+        return self.reports.get(self.report_key(export_hash, target_uin, use_stopwords, version))
+
+    def set_report(self, export_hash, target_uin, use_stopwords, version, report: Dict):
+        self.reports.set(self.report_key(export_hash, target_uin, use_stopwords, version), report)
+
+    def get_members(self, export_hash) -> Optional[Dict]:
+        return self.members.get(('members', export_hash))
+
+    def set_members(self, export_hash, members: Dict):
+        self.members.set(('members', export_hash), members)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {"reports": self.reports.memory.stats(), "members": self.members.memory.stats()}
+
+
+class AnalysisResultCache:
+    """
+    群聊分析结果去重索引
+
+    键为 (导出文件内容哈希, 开始日期, 结束日期, 是否使用停用词, 分析器版本)，
+    值为 ChatAnalyzer.export_json() 的结果；同一份导出重复上传时直接复用，跳过解析与分析
+    """
+
+    def __init__(self, cache_dir, max_items: int = 32, max_bytes: int = 128 * 1024 * 1024):
+        self.results = ResultCache(cache_dir, max_items=max_items, max_bytes=max_bytes)
+
+    @staticmethod
+    def key(export_hash: str, start_date: Optional[str], end_date: Optional[str],
+            use_stopwords: bool, version: str):
+        return ('analysis', export_hash, start_date or '', end_date or '', bool(use_stopwords), version)
+
+    def get(self, export_hash, start_date, end_date, use_stopwords, version) -> Optional[Dict]:
+        return self.results.get(self.key(export_hash, start_date, end_date, use_stopwords, version))
+
+    def set(self, export_hash, start_date, end_date, use_stopwords, version, report: Dict):
+        self.results.set(self.key(export_hash, start_date, end_date, use_stopwords, version), report)
+
+    def stats(self) -> Dict[str, int]:
+        return self.results.memory.stats()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    If-None-Match 请求头是否匹配 etag（不含引号）
+    按 RFC 9110 使用弱比较：忽略 W/ 前缀，"*" 匹配任意内容
+    """
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*':
+            return True
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == f'"{etag}"':
+            return True
+    return False
+
+
+class ReportPayloadCache:
+    """
+    报告页面数据缓存（/api/reports/<id> 的响应体）
+
+    键为 (报告ID, 报告版本)，版本取自存储中的更新时间，报告更新后旧条目不再命中；
+    值为序列化后的 JSON 文本及其强 ETag。进程内 LRU 为一级缓存，
+    配置 Redis 时作为多个服务进程共享的二级缓存
+    """
+
+    def __init__(self, max_items: int = 512, max_bytes: int = 64 * 1024 * 1024,
+                 redis_url: str = '', ttl: int = 86400, prefix: str = 'report_payload:'):
+        self.memory = LRUCache(max_items=max_items, max_bytes=max_bytes)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.client = None
+        if redis_url:
+            if redis is None:
+                logger.warning("⚠️ 已配置 REDIS_URL 但未安装 redis，报告缓存仅使用内存")
+            else:
+                try:
+                    client = redis.Redis.from_url(redis_url)
+                    client.ping()
+                    self.client = client
+                except Exception as e:
+                    logger.warning(f"⚠️ 连接 Redis 失败，报告缓存仅使用内存: {e}")
+
+    @staticmethod
+    def make_etag(body: str) -> str:
+        """响应体内容的哈希（不含引号），内容相同则 ETag 相同"""
+        return hashlib.sha256(body.encode('utf-8')).hexdigest()[:32]
+
+    def _redis_key(self, report_id: str, version: str) -> str:
+        return f"{self.prefix}{report_id}:{version}"
+
+    def get(self, report_id: str, version: str) -> Optional[Tuple[str, str]]:
+        """返回 (响应体, ETag)，未命中返回 None"""
+        key = (report_id, version)
+        entry = self.memory.get(key)
+        if entry is not None or self.client is None:
+            return entry
+        try:
+            body = self.client.get(self._redis_key(report_id, version))
+        except Exception as e:
+            logger.warning(f"⚠️ 读取 Redis 报告缓存失败: {e}")
+            return None
+        if body is None:
+            return None
+        body = body.decode('utf-8')
+        entry = (body, self.make_etag(body))
+        self.memory.set(key, entry, len(body))
+        return entry
+
+    def set(self, report_id: str, version: str, body: str) -> Tuple[str, str]:
+        """写入缓存并返回 (响应体, ETag)"""
+        entry = (body, self.make_etag(body))
+        self.memory.set((report_id, version), entry, len(body))
+        if self.client is not None:
+            try:
+                self.client.setex(self._redis_key(report_id, version), self.ttl, body.encode('utf-8'))
+            except Exception as e:
+                logger.warning(f"⚠️ 写入 Redis 报告缓存失败: {e}")
+        return entry
+
+    def invalidate(self, report_id: str, version: str):
+        self.memory.pop((report_id, version))
+        if self.client is not None:
+            try:
+                self.client.delete(self._redis_key(report_id, version))
+            except Exception as e:
+                logger.warning(f"⚠️ 删除 Redis 报告缓存失败: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.memory.stats()
+        stats["redis"] = self.client is not None
+        return stats
@@ -208,6 +208,27 @@ class DatabaseService:
             if conn:
                 conn.close()
     
+    def get_report_version(self, report_id: str) -> Optional[str]:
+        """报告版本标识（只查询 updated_at），报告不存在时返回 None"""
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor(pymysql.cursors.DictCursor)
+            
+            sql = "SELECT updated_at FROM reports WHERE report_id = %s"
+            cursor.execute(sql, (report_id,))
+            result = cursor.fetchone()
+            
+            if not result:
+                return None
+            return str(result['updated_at'])
+        except Exception as e:
+            logger.error(f"获取报告版本失败: {e}")
+            return None
+        finally:
+            if conn:
+                conn.close()
+    
     def list_reports(self, page: int = 1, page_size: int = 20, 
                     chat_name: Optional[str] = None, user_id: Optional[str] = None) -> Dict[str, Any]:
         conn = None
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行时目录清理
+后台线程定期扫描临时上传目录和磁盘缓存目录：
+- 超过保留时长未修改的文件直接删除
+- 目录总大小超过上限时按修改时间从旧到新删除（磁盘缓存读取时会更新修改时间，相当于 LRU），
+  最近 protect 秒内修改的文件不因大小上限删除
+- 排队中/执行中任务的上传文件用 hold 登记，每次扫描前更新其修改时间，
+  本进程与其他服务进程的清理器都视其为最近写入而不会删除（protect 至少为扫描间隔的 2 倍）
+"""
+
+import os
+import sys
+import time
+import threading
+from typing import Any, Dict, List
+
+# 添加父目录到路径以导入 logger
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+MB = 1024 * 1024
+
+
+def _scan_files(directory: str) -> List[os.DirEntry]:
+    """递归列出目录中的文件"""
+    files = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    files.extend(_scan_files(entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    files.append(entry)
+    except FileNotFoundError:
+        pass
+    return files
+
+
+class TempJanitor:
+    """运行时目录清理器；多个服务进程各自运行时删除操作互不影响（文件已被删除时忽略）"""
+
+    def __init__(self, interval: float = 600, protect: float = 3600):
+        self.interval = interval
+        # 被 hold 的文件每个扫描间隔更新一次修改时间，protect 不小于 2 个间隔才能保证其他进程不会删除
+        self.protect = max(protect, interval * 2)
+        self._dirs = []  # (目录, 保留秒数, 大小上限字节数)
+        self._held = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.usage = {}  # 目录 -> {files, bytes}
+        self.sweeps = 0
+        self.files_removed = 0
+        self.bytes_reclaimed = 0
+        self.last_sweep_at = None
+        self.last_sweep_seconds = None
+
+    def add(self, directory: str, ttl: float, max_bytes: int = 0):
+        """登记需要清理的目录；ttl 为 0 时不按时间清理，max_bytes 为 0 时不限制大小"""
+        self._dirs.append((str(directory), ttl, max_bytes))
+
+    def hold(self, path: str):
+        """登记仍在使用的文件（如排队中任务的上传文件），使用结束后调用 release"""
+        if path:
+            with self._lock:
+                self._held.add(os.path.abspath(path))
+
+    def release(self, path: str):
+        if path:
+            with self._lock:
+                self._held.discard(os.path.abspath(path))
+
+    def _touch_held(self):
+        """更新被 hold 文件的修改时间，其他服务进程的清理器按 protect 与 ttl 判断时视其为最近写入"""
+        for path in list(self._held):
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                self._held.discard(path)
+            except OSError as e:
+                logger.warning(f"⚠️ 更新文件时间失败: {path} | {e}")
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name='temp-janitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.warning(f"⚠️ 清理运行时目录失败: {e}")
+            self._stop.wait(self.interval)
+
+    def sweep(self) -> Dict[str, int]:
+        """扫描一遍所有登记的目录，返回本次删除的文件数和释放的字节数"""
+        with self._lock:
+            self._touch_held()
+            started = time.time()
+            removed = reclaimed = 0
+            for directory, ttl, max_bytes in self._dirs:
+                count, size = self._sweep_dir(directory, ttl, max_bytes, started)
+                removed += count
+                reclaimed += size
+            self.sweeps += 1
+            self.files_removed += removed
+            self.bytes_reclaimed += reclaimed
+            self.last_sweep_at = started
+            self.last_sweep_seconds = round(time.time() - started, 3)
+        if removed:
+            logger.info(f"🧹 已清理运行时文件 {removed} 个，释放 {reclaimed / MB:.1f} MB")
+        return {"files_removed": removed, "bytes_reclaimed": reclaimed}
+
+    def _sweep_dir(self, directory: str, ttl: float, max_bytes: int, now: float):
+        files = []
+        for entry in _scan_files(directory):
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        removed = reclaimed = 0
+        kept = []
+        for mtime, size, path in files:
+            if ttl and now - mtime > ttl and self._remove(path):
+                removed += 1
+                reclaimed += size
+            else:
+                kept.append((mtime, size, path))
+
+        total = sum(size for _, size, _ in kept)
+        if max_bytes and total > max_bytes:
+            kept.sort()
+            remaining = []
+            for mtime, size, path in kept:
+                if total > max_bytes and now - mtime > self.protect and self._remove(path):
+                    removed += 1
+                    reclaimed += size
+                    total -= size
+                else:
+                    remaining.append((mtime, size, path))
+            kept = remaining
+            if total > max_bytes:
+                logger.warning(f"⚠️ 目录 {directory} 仍超出大小上限（{total / MB:.1f}/{max_bytes / MB:.0f} MB），"
+                               f"剩余文件均为最近写入")
+
+        self.usage[directory] = {"files": len(kept), "bytes": total}
+        return removed, reclaimed
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            logger.warning(f"⚠️ 删除文件失败: {path} | {e}")
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        directories = {}
+        for directory, _, max_bytes in self._dirs:
+            usage = self.usage.get(directory, {"files": 0, "bytes": 0})
+            # 只返回目录名，不暴露服务器上的完整路径
+            directories[os.path.basename(directory.rstrip(os.sep))] = dict(usage, max_bytes=max_bytes)
+        return {
+            "sweeps": self.sweeps,
+            "files_removed": self.files_removed,
+            "bytes_reclaimed": self.bytes_reclaimed,
+            "last_sweep_at": self.last_sweep_at,
+            "last_sweep_seconds": self.last_sweep_seconds,
+            "directories": directories,
+        }
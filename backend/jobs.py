@@ -0,0 +1,554 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台分析任务队列
+上传接口只负责保存文件并返回任务ID，分析在有界的进程池中执行；
+任务状态保存在本地 SQLite 文件（默认）或 Redis（配置 REDIS_URL 时），
+因此多个 gunicorn worker 与分析子进程都能读写同一份任务状态。
+同一进程内各分组（单个上传 / 同一批量任务）轮流执行，批量任务不会挤占单个上传。
+每个任务记录创建它的服务进程，服务进程退出后遗留的排队/执行中任务在其他进程启动时标记为失败。
+"""
+
+import json
+import os
+import sys
+import time
+import uuid
+import socket
+import sqlite3
+import multiprocessing
+import threading
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+# 添加父目录到路径以导入 logger
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger import get_logger
+from progress import ProgressTracker
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = get_logger(__name__)
+
+# 任务状态
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+FINISHED_STATUSES = (DONE, FAILED)
+
+_FIELDS = ('kind', 'status', 'stage', 'progress', 'detail', 'result', 'error', 'owner', 'worker',
+           'created_at', 'updated_at')
+_JSON_FIELDS = ('detail', 'result')
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+_worker_id = None
+_worker_pid = None
+
+
+def current_worker_id() -> str:
+    """本服务进程的标识 主机名:PID:随机串（随机串用于区分 PID 复用）"""
+    global _worker_id, _worker_pid
+    if _worker_pid != os.getpid():
+        _worker_pid = os.getpid()
+        _worker_id = f"{socket.gethostname()}:{_worker_pid}:{uuid.uuid4().hex[:8]}"
+    return _worker_id
+
+
+def worker_alive(worker: Optional[str]) -> bool:
+    """
+    任务所属的服务进程是否仍在运行
+    无法判断的情况（其他主机上的进程）视为仍在运行，这类任务由存储的过期时间兜底清理
+    """
+    if not worker:
+        return False
+    try:
+        host, pid, _ = worker.split(':')
+        pid = int(pid)
+    except ValueError:
+        return False
+    if host != socket.gethostname():
+        return True
+    if pid == os.getpid():
+        return worker == current_worker_id()
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+class SQLiteJobStore:
+    """SQLite 文件任务存储，每次操作单独连接，可跨进程使用"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, kind TEXT, status TEXT, stage TEXT, progress REAL, detail TEXT,"
+                " result TEXT, error TEXT, owner TEXT, worker TEXT, created_at REAL, updated_at REAL)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if 'detail' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN detail TEXT")
+            if 'worker' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN worker TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs(updated_at)")
+
+    @property
+    def spec(self):
+        return ('sqlite', self.path)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def create(self, job_id: str, kind: str, owner: Optional[str] = None):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, stage, progress, owner, worker, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, QUEUED, 0.0, owner, current_worker_id(), now, now),
+            )
+
+    def update(self, job_id: str, **fields):
+        for name in _JSON_FIELDS:
+            if name in fields:
+                fields[name] = json.dumps(fields[name], ensure_ascii=False)
+        fields['updated_at'] = time.time()
+        columns = ', '.join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {', '.join(_FIELDS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(_FIELDS, row))
+        job['id'] = job_id
+        for name in _JSON_FIELDS:
+            if job[name] is not None:
+                job[name] = json.loads(job[name])
+        return job
+
+    def purge(self, older_than: float) -> int:
+        """删除最后更新时间早于 older_than（时间戳）且已结束的任务"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE updated_at < ? AND status IN (?, ?)",
+                (older_than, *FINISHED_STATUSES),
+            )
+            return cursor.rowcount
+
+    def active_jobs(self):
+        """排队中或执行中的任务 [{id, kind, worker}]"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, kind, worker FROM jobs WHERE status IN (?, ?)", ACTIVE_STATUSES
+            ).fetchall()
+        return [{'id': job_id, 'kind': kind, 'worker': worker} for job_id, kind, worker in rows]
+
+
+class RedisJobStore:
+    """Redis 任务存储，每个任务一个 hash，过期时间由 ttl 控制"""
+
+    def __init__(self, url: str, ttl: int = 86400, prefix: str = 'jobs:'):
+        self.url = url
+        self.ttl = ttl
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+
+    @property
+    def spec(self):
+        return ('redis', self.url, self.ttl, self.prefix)
+
+    def _key(self, job_id):
+        return f"{self.prefix}{job_id}"
+
+    def create(self, job_id: str, kind: str, owner: Optional[str] = None):
+        now = time.time()
+        self.update(job_id, kind=kind, status=QUEUED, stage=QUEUED, progress=0.0,
+                    owner=owner or '', worker=current_worker_id(), created_at=now)
+
+    def update(self, job_id: str, **fields):
+        for name in _JSON_FIELDS:
+            if name in fields:
+                fields[name] = json.dumps(fields[name], ensure_ascii=False)
+        fields['updated_at'] = time.time()
+        key = self._key(job_id)
+        pipe = self.client.pipeline()
+        pipe.hset(key, mapping={name: '' if value is None else value for name, value in fields.items()})
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.client.hgetall(self._key(job_id))
+        if not raw:
+            return None
+        job = {name: raw.get(name) or None for name in _FIELDS}
+        job['id'] = job_id
+        for name in ('progress', 'created_at', 'updated_at'):
+            if job[name] is not None:
+                job[name] = float(job[name])
+        for name in _JSON_FIELDS:
+            if job[name] is not None:
+                job[name] = json.loads(job[name])
+        return job
+
+    def purge(self, older_than: float) -> int:
+        # 由 Redis 过期时间负责清理
+        return 0
+
+    def active_jobs(self):
+        jobs = []
+        for key in self.client.scan_iter(match=f"{self.prefix}*", count=500):
+            kind, status, worker = self.client.hmget(key, 'kind', 'status', 'worker')
+            if status in ACTIVE_STATUSES:
+                jobs.append({'id': key[len(self.prefix):], 'kind': kind, 'worker': worker})
+        return jobs
+
+
+def create_job_store(sqlite_path: str, redis_url: str = '', ttl: int = 86400):
+    """配置了 REDIS_URL 且安装了 redis 时使用 Redis，否则使用 SQLite 文件"""
+    if redis_url:
+        if redis is None:
+            logger.warning("⚠️ 已配置 REDIS_URL 但未安装 redis，任务队列改用 SQLite 存储")
+        else:
+            try:
+                store = RedisJobStore(redis_url, ttl=ttl)
+                store.client.ping()
+                return store
+            except Exception as e:
+                logger.warning(f"⚠️ 连接 Redis 失败，任务队列改用 SQLite 存储: {e}")
+    return SQLiteJobStore(sqlite_path)
+
+
+def job_store_from_spec(spec):
+    """在子进程中按 spec 重建任务存储"""
+    if spec[0] == 'redis':
+        _, url, ttl, prefix = spec
+        return RedisJobStore(url, ttl=ttl, prefix=prefix)
+    return SQLiteJobStore(spec[1])
+
+
+class JobProgress:
+    """
+    把 ProgressTracker 的进度事件写入任务存储（节流由 ProgressTracker 负责）
+    事件本身保存在 detail 字段，供 /api/jobs/<id>/events 推送阶段、进度与速度
+    """
+
+    def __init__(self, store, job_id: str):
+        self.store = store
+        self.job_id = job_id
+
+    def __call__(self, event: Dict[str, Any]):
+        self.store.update(self.job_id, stage=event['stage'], progress=event['progress'], detail=event)
+
+
+def _init_worker():
+    """分析子进程启动时预加载共用资源（jieba 基础词典、停用词），进程内的后续任务直接复用"""
+    import analyzer as analyzer_mod
+    try:
+        analyzer_mod.preload_shared_resources()
+    except Exception as e:
+        logger.warning(f"⚠️ 预加载分析资源失败: {e}")
+
+
+def _run_in_worker(store_spec, job_id: str, func: Callable, args, kwargs):
+    """在分析子进程中执行任务函数，进度直接写入共享的任务存储"""
+    progress = ProgressTracker(JobProgress(job_store_from_spec(store_spec), job_id))
+    return func(*args, progress=progress, **kwargs)
+
+
+def analyze_chat_export(file_path: str, use_stopwords: bool = False,
+                        start_date: Optional[str] = None, end_date: Optional[str] = None,
+                        progress: Optional[ProgressTracker] = None, max_bytes: Optional[int] = None) -> Dict:
+    """
+    分析子进程中的群聊分析任务：加载 → 分析 → 导出，返回 ChatAnalyzer.export_json() 的结果
+    max_bytes 为解压后内容的字节数上限（见 utils.open_export）
+    """
+    from utils import load_json
+
+    progress = progress or ProgressTracker()
+    data = load_json(file_path, progress=progress, max_bytes=max_bytes)
+    return analyze_chat_data(data, use_stopwords, start_date, end_date, progress=progress)
+
+
+def analyze_chat_data(data: Dict, use_stopwords: bool = False,
+                      start_date: Optional[str] = None, end_date: Optional[str] = None,
+                      progress: Optional[ProgressTracker] = None) -> Dict:
+    """分析已解析的群聊数据"""
+    import analyzer as analyzer_mod
+
+    progress = progress or ProgressTracker()
+    # 时间范围等参数随任务传入，不修改 config 模块（子进程会被复用，也可能并发执行多个分析）
+    options = analyzer_mod.AnalysisOptions(start_date=start_date, end_date=end_date, use_stopwords=use_stopwords)
+    analyzer = analyzer_mod.ChatAnalyzer(data, progress=progress, options=options)
+    analyzer.analyze()
+    progress.start('exporting')
+    report = analyzer.export_json()
+    progress.finish()
+    return report
+
+
+class JobManager:
+    """
+    任务调度：有空闲执行槽且内存预算足够时，按分组轮流取出任务交给执行线程，
+    执行线程把任务提交到进程池，完成后（在本进程中）执行 on_complete 回调，再把最终结果写入任务存储
+    """
+
+    # 两次检查遗留任务的最小间隔（秒）
+    REAP_INTERVAL = 300
+
+    def __init__(self, store, max_workers: int = 2, ttl: int = 86400, admission=None):
+        """
+        Args:
+            admission: 可选的内存准入控制器（backend.admission.MemoryAdmission）
+        """
+        self.store = store
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self.admission = admission
+        self._threads = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._processes = None
+        self._lock = threading.Lock()
+        # 待执行任务按分组排队：分组 -> 任务参数队列，各分组轮流取出
+        self._pending = OrderedDict()
+        self._pending_lock = threading.Lock()
+        self._active = 0  # 已派发到执行线程的任务数，不超过 max_workers
+        self._blocked = None  # 因内存预算不足停在队首的任务ID（只标记一次 waiting_memory）
+        self._last_reap = 0.0
+
+    def _process_pool(self, reset=False):
+        with self._lock:
+            if reset and self._processes is not None:
+                self._processes.shutdown(wait=False)
+                self._processes = None
+            if self._processes is None:
+                # 使用 spawn：子进程不继承本进程的线程与 SQLite 连接状态（fork 后写 SQLite 会报 database is locked），
+                # 与 Windows 下的行为一致
+                self._processes = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                )
+            return self._processes
+
+    def submit(self, kind: str, func: Optional[Callable], args=(), kwargs=None, owner: Optional[str] = None,
+               on_complete: Optional[Callable] = None, on_error: Optional[Callable] = None,
+               cached_result: Any = None, memory: int = 0, group: Optional[str] = None) -> str:
+        """
+        创建并排队一个任务，立即返回任务ID
+
+        Args:
+            kind: 任务类型（如 upload）
+            func: 在子进程中执行的模块级函数，需接受 progress 关键字参数；
+                  为 None 时不启动子进程，直接以 cached_result 作为结果（如命中分析结果缓存）
+            on_complete: 可选，在本进程中处理子进程结果，返回写入任务存储的最终结果；
+                         抛出异常则任务失败
+            on_error: 可选，任务失败时在本进程中调用（参数为异常），用于清理临时文件等
+            memory: 预计内存占用（字节）；配置了准入控制时超出预算或排队过多抛出 AdmissionRejected，
+                    否则任务排队直到内存预算足够
+            group: 公平调度分组（如批量任务ID），各分组轮流执行；为 None 时任务单独成组
+        """
+        admitted = self.admission is not None and func is not None and memory > 0
+        if admitted:
+            self.admission.reserve(memory, limit_waiting=group is None)
+        job_id = str(uuid.uuid4())
+        try:
+            self.store.create(job_id, kind, owner)
+        except Exception:
+            if admitted:
+                self.admission.cancel()
+            raise
+        try:
+            self.store.purge(time.time() - self.ttl)
+        except Exception as e:
+            logger.warning(f"⚠️ 清理过期任务失败: {e}")
+        if time.time() - self._last_reap > self.REAP_INTERVAL:
+            self.reap_orphans()
+        task = (job_id, func, tuple(args), dict(kwargs or {}),
+                on_complete, on_error, cached_result, group, memory if admitted else 0)
+        with self._pending_lock:
+            self._pending.setdefault(group or job_id, deque()).append(task)
+        logger.info(f"📥 任务已排队: {job_id} ({kind})")
+        self._dispatch()
+        return job_id
+
+    def _take_next(self):
+        """
+        取出下一个可执行的任务（调用方持有 _pending_lock）
+        各分组轮流取队首任务；轮到的任务内存预算不足时不跳过它去执行后面需要内存的任务（避免大任务饿死），
+        只让无需准入的任务（如命中缓存）先执行。返回 (任务, 被阻塞的任务ID)
+        """
+        blocked = None
+        for group, queue in self._pending.items():
+            task = queue[0]
+            memory = task[-1]
+            if memory and blocked is not None:
+                continue
+            if memory and not self.admission.try_acquire(memory):
+                blocked = task[0]
+                continue
+            queue.popleft()
+            del self._pending[group]
+            if queue:
+                # 本分组还有任务，排到其他分组之后
+                self._pending[group] = queue
+            return task, blocked
+        return None, blocked
+
+    def _dispatch(self):
+        """有空闲执行槽时派发任务；内存预算不足时任务留在队列中，不占用执行线程，等已有任务结束后再派发"""
+        while True:
+            with self._pending_lock:
+                if self._active >= self.max_workers:
+                    return
+                task, blocked = self._take_next()
+                newly_blocked = blocked if blocked != self._blocked else None
+                self._blocked = blocked
+                if task is not None:
+                    self._active += 1
+            if newly_blocked is not None:
+                logger.info(f"⏳ 内存预算不足，任务排队等待: {newly_blocked}")
+                try:
+                    self.store.update(newly_blocked, stage='waiting_memory')
+                except Exception as e:
+                    logger.warning(f"⚠️ 写入任务状态失败: {newly_blocked} | {e}")
+            if task is None:
+                return
+            self._threads.submit(self._run, *task)
+
+    def _run(self, job_id, func, args, kwargs, on_complete, on_error, cached_result, group, memory):
+        try:
+            self._execute(job_id, func, args, kwargs, on_complete, on_error, cached_result, memory)
+            if group is not None:
+                # 批量任务的最后一个子任务结束时，把批量任务记录为已完成（之后随其他已结束任务一起过期清理）
+                try:
+                    self.get_batch(group)
+                except Exception as e:
+                    logger.warning(f"⚠️ 更新批量任务状态失败: {group} | {e}")
+        finally:
+            with self._pending_lock:
+                self._active -= 1
+            self._dispatch()
+
+    def _execute(self, job_id, func, args, kwargs, on_complete, on_error, cached_result, memory):
+        started = time.time()
+        try:
+            try:
+                self.store.update(job_id, status=RUNNING, stage='starting')
+                if func is None:
+                    result = cached_result
+                else:
+                    try:
+                        future = self._process_pool().submit(_run_in_worker, self.store.spec, job_id, func, args, kwargs)
+                        result = future.result()
+                    except BrokenProcessPool:
+                        # 子进程异常退出（如内存不足被杀），重建进程池，本任务记为失败
+                        self._process_pool(reset=True)
+                        raise RuntimeError("分析进程异常退出")
+            finally:
+                if memory:
+                    self.admission.release(memory)
+                    self._dispatch()
+            if on_complete is not None:
+                self.store.update(job_id, stage='finalizing')
+                result = on_complete(result)
+            self.store.update(job_id, status=DONE, stage=DONE, progress=1.0, result=result)
+            logger.info(f"✅ 任务完成: {job_id}，耗时 {time.time() - started:.1f}s")
+        except Exception as e:
+            logger.error(f"❌ 任务失败: {job_id} | {e}")
+            try:
+                self.store.update(job_id, status=FAILED, stage=FAILED, error=str(e))
+            except Exception as store_error:
+                logger.error(f"❌ 写入任务状态失败: {job_id} | {store_error}")
+            if on_error is not None:
+                try:
+                    on_error(e)
+                except Exception as callback_error:
+                    logger.warning(f"⚠️ 任务失败回调出错: {job_id} | {callback_error}")
+
+    def reap_orphans(self) -> int:
+        """
+        把所属服务进程已退出的排队中/执行中任务标记为失败（进程重启或被杀后这些任务不会再执行）
+        批量任务的状态由子任务汇总：子任务回收后，所属服务进程已退出的批量任务按子任务状态更新
+        """
+        self._last_reap = time.time()
+        reaped = 0
+        try:
+            batches = []
+            for job in self.store.active_jobs():
+                if worker_alive(job['worker']):
+                    continue
+                if job['kind'] == 'batch':
+                    batches.append(job['id'])
+                    continue
+                self.store.update(job['id'], status=FAILED, stage=FAILED,
+                                  error='服务进程已重启，任务已中断，请重新提交')
+                reaped += 1
+            for batch_id in batches:
+                self.get_batch(batch_id)
+        except Exception as e:
+            logger.warning(f"⚠️ 检查遗留任务失败: {e}")
+        if reaped:
+            logger.warning(f"⚠️ 已将 {reaped} 个遗留的未完成任务标记为失败")
+        return reaped
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    def create_batch(self, batch_id: str, owner: Optional[str], items):
+        """
+        登记批量任务（子任务需已用 group=batch_id 提交）
+        items 为各群的 {filename, job_id, report_id, ...}；未能提交的项 job_id 为 None 并附带 error
+        """
+        self.store.create(batch_id, 'batch', owner)
+        self.store.update(batch_id, status=RUNNING, stage=RUNNING, detail={'items': items})
+        # 子任务可能已全部结束（或都未能提交）
+        self.get_batch(batch_id)
+
+    def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """批量任务状态：按子任务汇总各群的状态、进度与结果；子任务全部结束时把批量任务记录为已完成"""
+        batch = self.store.get(batch_id)
+        if not batch or batch['kind'] != 'batch':
+            return None
+        items = []
+        counts = Counter()
+        for item in (batch['detail'] or {}).get('items', []):
+            entry = dict(item)
+            job = self.store.get(item['job_id']) if item.get('job_id') else None
+            if job is not None:
+                entry.update(status=job['status'], stage=job['stage'], progress=job['progress'],
+                             result=job['result'], error=job['error'])
+            else:
+                entry.setdefault('status', FAILED)
+                entry.setdefault('error', '任务不存在或已过期')
+            counts[entry['status']] += 1
+            items.append(entry)
+        status = DONE if counts[DONE] + counts[FAILED] == len(items) else RUNNING
+        if status == DONE and batch['status'] != DONE:
+            self.store.update(batch_id, status=DONE, stage=DONE, progress=1.0)
+        return {
+            'id': batch_id,
+            'created_at': batch['created_at'],
+            'status': status,
+            'total': len(items),
+            'counts': dict(counts),
+            'progress': round(sum(entry.get('progress') or (1.0 if entry['status'] == FAILED else 0.0)
+                                  for entry in items) / len(items), 4) if items else 1.0,
+            'items': items,
+        }
@@ -125,6 +125,17 @@ class JSONStorageService:
             logger.error(f"❌ 获取报告失败: {e}")
             return None
     
+    def get_report_version(self, report_id: str) -> Optional[str]:
+        """报告版本标识（不读取报告内容），报告不存在时返回 None"""
+        try:
+            # 报告每次写入都会整体重写文件，文件修改时间与 updated_at 同步变化
+            return str(self._get_report_file(report_id).stat().st_mtime_ns)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"❌ 获取报告版本失败: {e}")
+            return None
+    
     def create_personal_report(self, report_id: str, user_name: str, chat_name: str,
                               report_data: Dict, user_id: str = 'anonymous') -> bool:
         """保存个人报告"""
@@ -19,6 +19,10 @@ OUTPUT_ENCODING = "utf-8"
 # 控制台输出宽度
 CONSOLE_WIDTH = 60
 
+# 导出文件解压后的大小上限（MB），防止压缩率异常高的文件（压缩炸弹）解压时耗尽内存
+# 0 表示不限制
+MAX_EXPORT_CONTENT_MB = 4096
+
 
 # ============================================
 # 词频统计参数
@@ -131,6 +135,20 @@ RANK_TOP_N = 10
 # 热词贡献者显示的前 N 名
 CONTRIBUTOR_TOP_N = 10
 
+# 热词贡献者统计模式（只统计最终的 TOP_N 个热词）
+# 'exact'  - 精确统计每个热词的全部贡献者（内存占用随 TOP_N×人数 增长）
+# 'sketch' - 使用 Space-Saving 有界计数器，只保留每个词的高频贡献者
+# 'auto'   - 消息数不超过 CONTRIBUTOR_EXACT_MAX_MESSAGES 时精确统计，否则使用 sketch（默认）
+CONTRIBUTOR_MODE = 'auto'
+
+# sketch 模式下每个词最多追踪的贡献者数量
+# 贡献次数超过 该词总次数/此值 的用户一定会被保留，计数误差不超过 该词总次数/此值
+# 推荐值：不小于 CONTRIBUTOR_TOP_N 的 3 倍
+CONTRIBUTOR_SKETCH_SIZE = 50
+
+# auto 模式下使用精确统计的最大消息数
+CONTRIBUTOR_EXACT_MAX_MESSAGES = 200000
+
 # 每个热词显示的示例消息数量
 SAMPLE_COUNT = 10
 
@@ -153,6 +171,10 @@ NIGHT_OWL_HOURS = range(0, 6)
 # 早起鸟时段（6-9点）
 EARLY_BIRD_HOURS = range(6, 9)
 
+# 是否使用 numpy 计算按用户统计的榜单（话痨、字数、图片、深夜、早起）和时段分布
+# 需要安装 numpy，未安装时自动退回纯 Python 统计
+USE_NUMPY_STATS = True
+
 
 # ============================================
 # 机器人过滤
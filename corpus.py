@@ -0,0 +1,576 @@
+# -*- coding: utf-8 -*-
+"""
+群聊消息的共享索引结构
+在加载阶段构建一次，供 ChatAnalyzer / PersonalAnalyzer 复用
+"""
+
+from array import array
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from datetime import datetime, timezone, timedelta
+from sys import intern
+# 尝试导入 jieba_fast（更快），如果失败则回退到 jieba（标准版本）
+try:
+    import jieba_fast as jieba
+except ImportError:
+    import jieba
+from utils import clean_text
+
+_INT64_LIMIT = 1 << 63
+_NAN = float('nan')
+
+# 报告统一使用东八区时间
+_CST_OFFSET_SECONDS = 8 * 3600
+_CST = timezone(timedelta(hours=8))
+
+# 这些 subMsgType 为 QQ 机器人/系统消息
+BOT_SUB_MSG_TYPES = (577, 65)
+
+
+class SenderRegistry:
+    """
+    发送者 UIN -> 连续整数下标 的映射
+
+    所有按用户统计的数据都以下标为键，下标从 0 开始连续分配，
+    因此可以直接作为数组下标（例如 numpy.bincount）。
+    UIN 统一按字符串处理，避免同一用户以 str / int 两种形式出现。
+    """
+
+    __slots__ = ('_index', 'uins')
+
+    def __init__(self, uins=None):
+        self._index = {}
+        self.uins = []
+        if uins:
+            for uin in uins:
+                self.intern(uin)
+
+    def intern(self, uin):
+        """返回 uin 的下标，首次出现时分配新下标"""
+        uin = str(uin)
+        idx = self._index.get(uin)
+        if idx is None:
+            idx = len(self.uins)
+            self._index[uin] = idx
+            self.uins.append(uin)
+        return idx
+
+    def get(self, uin, default=None):
+        """返回已注册 uin 的下标，不分配新下标"""
+        if uin is None:
+            return default
+        return self._index.get(str(uin), default)
+
+    def uin(self, idx):
+        """下标 -> uin 字符串"""
+        return self.uins[idx]
+
+    def __contains__(self, uin):
+        return uin is not None and str(uin) in self._index
+
+    def __len__(self):
+        return len(self.uins)
+
+    def __iter__(self):
+        return iter(self.uins)
+
+
+class MessageColumns:
+    """
+    按列存储的逐条消息统计（发送者下标、字数、图片数、小时）
+
+    使用 array 紧凑存储，分析结束后交给 numpy 做分组求和。
+    字数为 -1 表示该消息没有有效文本，小时为 -1 表示时间解析失败。
+    """
+
+    __slots__ = ('sender', 'chars', 'images', 'hour')
+
+    def __init__(self):
+        self.sender = array('i')
+        self.chars = array('i')
+        self.images = array('i')
+        self.hour = array('b')
+
+    def append(self, sender_idx, chars, images, hour):
+        self.sender.append(sender_idx)
+        self.chars.append(chars)
+        self.images.append(images)
+        self.hour.append(hour)
+
+    def __len__(self):
+        return len(self.sender)
+
+    def to_numpy(self):
+        """返回 (sender, chars, images, hour) 四个 numpy 数组"""
+        import numpy as np
+        return (
+            np.frombuffer(self.sender, dtype=np.dtype(self.sender.typecode)).astype(np.intp),
+            np.frombuffer(self.chars, dtype=np.dtype(self.chars.typecode)),
+            np.frombuffer(self.images, dtype=np.dtype(self.images.typecode)),
+            np.frombuffer(self.hour, dtype=np.int8),
+        )
+
+
+def reply_ref_id(reply_elem):
+    """
+    取回复元素引用的消息 ID
+    优先 sourceMsgIdInRecords，缺失或为 '0' 时回退到 replayMsgId
+    """
+    ref_msg_id = reply_elem.get('sourceMsgIdInRecords')
+    if not ref_msg_id or ref_msg_id == '0':
+        ref_msg_id = reply_elem.get('replayMsgId')
+    if ref_msg_id and ref_msg_id != '0':
+        return ref_msg_id
+    return None
+
+
+def _parse_msg_id(msg_id):
+    """消息 ID 转为 int64；非数字或越界时返回 None"""
+    try:
+        value = int(msg_id)
+    except (TypeError, ValueError):
+        return None
+    if -_INT64_LIMIT <= value < _INT64_LIMIT:
+        return value
+    return None
+
+
+def parse_epoch(ts):
+    """ISO 8601 时间字符串 -> Unix 时间戳（秒），解析失败返回 NaN"""
+    if not ts:
+        return _NAN
+    try:
+        return datetime.fromisoformat(ts.replace('Z', '+00:00')).timestamp()
+    except (TypeError, ValueError):
+        return _NAN
+
+
+class MessageIndex:
+    """
+    messageId -> (发送者下标, 时间戳) 的紧凑索引（用于解析回复目标和回复间隔）
+
+    消息 ID 解析为 int64 后排序存放在 array 中，发送者下标、时间戳与机器人标记为平行数组，
+    查找使用二分。相比以字符串为键的 dict，内存约降低一个数量级。
+    无法解析为整数的 ID 放在一个小的兜底 dict 中。
+    """
+
+    __slots__ = ('senders', '_ids', '_sender', '_ts', '_bot', '_extra')
+
+    def __init__(self, messages=(), senders=None, sender_column=None, ts_column=None):
+        """
+        Args:
+            messages: 消息列表（流式构建时留空，之后调用 add() 与 finalize()）
+            senders: 共享的 SenderRegistry（可选）
+            sender_column / ts_column: 已按消息位置计算好的发送者下标与时间戳（可选，
+                由 MessageCorpus 传入以避免重复解析）
+        """
+        self.senders = senders if senders is not None else SenderRegistry()
+        self._extra = {}
+        self._ids = array('q')
+        self._sender = array('i')
+        self._bot = array('b')
+        self._ts = array('d')
+
+        for pos, msg in enumerate(messages):
+            if sender_column is not None:
+                sender_idx = sender_column[pos]
+                if sender_idx < 0:
+                    continue
+            else:
+                uin = msg.get('sender', {}).get('uin')
+                if not uin:
+                    continue
+                sender_idx = self.senders.intern(uin)
+            ts = ts_column[pos] if ts_column is not None else parse_epoch(msg.get('timestamp'))
+            self.add_message(msg, sender_idx, ts)
+        self.finalize()
+
+    def add_message(self, msg, sender_idx, ts):
+        """追加一条消息（发送者下标与时间戳由调用方给出）"""
+        msg_id = msg.get('messageId')
+        if not msg_id:
+            return
+        is_bot = msg.get('rawMessage', {}).get('subMsgType', 0) in BOT_SUB_MSG_TYPES
+        key = _parse_msg_id(msg_id)
+        if key is None:
+            self._extra[msg_id] = (sender_idx, is_bot, ts)
+            return
+        self._ids.append(key)
+        self._sender.append(sender_idx)
+        self._bot.append(is_bot)
+        self._ts.append(ts)
+
+    def finalize(self):
+        """按消息 ID 排序，之后才能查找"""
+        ids = self._ids
+        if all(ids[i] <= ids[i + 1] for i in range(len(ids) - 1)):
+            return
+        # 稳定排序：ID 重复时保留最后出现的消息（与 dict 覆盖语义一致）
+        order = sorted(range(len(ids)), key=ids.__getitem__)
+        self._ids = array('q', (ids[i] for i in order))
+        self._sender = array('i', (self._sender[i] for i in order))
+        self._bot = array('b', (self._bot[i] for i in order))
+        self._ts = array('d', (self._ts[i] for i in order))
+
+    def _position(self, msg_id):
+        key = _parse_msg_id(msg_id)
+        if key is None:
+            return None
+        pos = bisect_right(self._ids, key) - 1
+        if pos >= 0 and self._ids[pos] == key:
+            return pos
+        return None
+
+    def sender_of(self, msg_id, include_bots=True):
+        """返回消息发送者下标，找不到（或 include_bots=False 时为机器人消息）返回 None"""
+        if not msg_id:
+            return None
+        pos = self._position(msg_id)
+        if pos is not None:
+            if not include_bots and self._bot[pos]:
+                return None
+            return self._sender[pos]
+        extra = self._extra.get(msg_id)
+        if extra is None or (not include_bots and extra[1]):
+            return None
+        return extra[0]
+
+    def timestamp_of(self, msg_id):
+        """返回消息的 Unix 时间戳（秒），找不到或时间无效返回 None"""
+        if not msg_id:
+            return None
+        pos = self._position(msg_id)
+        if pos is not None:
+            ts = self._ts[pos]
+        else:
+            extra = self._extra.get(msg_id)
+            if extra is None:
+                return None
+            ts = extra[2]
+        return None if ts != ts else ts
+
+    def __contains__(self, msg_id):
+        return self._position(msg_id) is not None or msg_id in self._extra
+
+    def __len__(self):
+        return len(self._ids) + len(self._extra)
+
+
+def tokenize(text):
+    """jieba 分词（未过滤空白和停用词），词语字符串驻留以减少重复占用"""
+    return tuple(intern(w) for w in jieba.cut(text)) if text else ()
+
+
+def extract_at_contents(msg):
+    """
+    取消息中 @成员 的文本片段（用于从正文中去除）
+    共享语料按群聊分析的规则只去除 atType == 2 的片段；个人报告去除任意 atType > 0
+    且带有效 atUid 的片段，在 PersonalAnalyzer 中对目标用户的消息单独处理
+    """
+    at_contents = []
+    for element in msg.get('rawMessage', {}).get('elements', []):
+        text_element = element.get('textElement')
+        if not text_element:
+            continue
+        content_text = text_element.get('content', '')
+        if text_element.get('atType', 0) == 2 and content_text:
+            at_contents.append(content_text)
+    return at_contents
+
+
+def clean_message_text(msg):
+    """消息正文清洗后的文本（去除 @成员、方括号内容和链接）"""
+    content = msg.get('content', {})
+    text = content.get('text', '') if isinstance(content, dict) else ''
+    at_contents = extract_at_contents(msg) if text and '@' in text else None
+    return clean_text(text, at_contents)
+
+
+def build_uin_to_name(messages):
+    """
+    构建 uin -> 显示名称 的映射
+    优先最近使用的有效昵称，其次群名片，兜底为 "用户{uin}"
+    """
+    return build_user_names(messages)[0]
+
+
+def build_user_names(messages):
+    """
+    同 build_uin_to_name，额外返回每个 uin 用过的全部名称（昵称与群名片，按首次出现排序）
+
+    Returns:
+        (uin_to_name, uin_history)
+    """
+    collector = UserNameCollector()
+    for msg in messages:
+        collector.add(msg)
+    return collector.result()
+
+
+class UserNameCollector:
+    """逐条收集发送者名称（可用于流式处理），最后由 result() 选出显示名称"""
+
+    def __init__(self):
+        self._names = defaultdict(list)
+        self._member_names = {}
+        self._history = defaultdict(dict)
+        self._uins = {}
+
+    def add(self, msg):
+        sender = msg.get('sender', {})
+        uin = sender.get('uin')
+        if not uin:
+            return
+        uin = str(uin)
+        self._uins[uin] = None
+        name = (sender.get('name') or '').strip()
+        if name:
+            names = self._names[uin]
+            if not names or names[-1] != name:
+                names.append(name)
+                self._history[uin][name] = None
+        send_member_name = (msg.get('rawMessage', {}).get('sendMemberName') or '').strip()
+        if send_member_name:
+            self._member_names[uin] = send_member_name
+            self._history[uin][send_member_name] = None
+
+    def result(self):
+        """返回 (uin_to_name, uin_history)"""
+        uin_to_name = {}
+        for uin in self._uins:
+            chosen_name = None
+
+            # 优先使用有效的name
+            names = self._names.get(uin)
+            if names:
+                for name in reversed(names):
+                    if name != uin:
+                        chosen_name = name
+                        break
+                if chosen_name is None:
+                    chosen_name = names[-1]
+
+            # 其次使用sendMemberName
+            if chosen_name is None and uin in self._member_names:
+                chosen_name = self._member_names[uin]
+
+            # 兜底：使用uin本身
+            if chosen_name is None or chosen_name == uin:
+                chosen_name = f"用户{uin}"
+
+            uin_to_name[uin] = chosen_name
+        return uin_to_name, {uin: list(names) for uin, names in self._history.items()}
+
+
+class MessageCorpus:
+    """
+    预处理后的群聊语料，按消息在 data['messages'] 中的位置对齐
+
+    - sender[pos]:     发送者下标（无发送者为 -1）
+    - timestamps[pos]: Unix 时间戳（解析失败为 NaN）
+    - cleaned[pos]:    去除 @/方括号/链接后的文本（无有效文本为空字符串）
+    - tokens(pos):     jieba 分词结果（启用 cache_tokens 时缓存）
+    - sender_positions(idx): 某发送者按时间排序的消息位置，首次访问时对全部发送者一次性分区
+
+    ChatAnalyzer 与 PersonalAnalyzer 共用同一份语料，每条消息只清洗一次；
+    启用 cache_tokens 时每条消息在词典不变的情况下也只分词一次。
+    分词缓存与消息数同量级，默认关闭，由 ChatAnalyzer 只在分析期间开启并在结束后释放。
+    """
+
+    def __init__(self, messages, cache_tokens=False, senders=None, index=None, cleaned=None):
+        """
+        Args:
+            messages: 消息列表
+            cache_tokens: 是否缓存分词结果
+            senders / index / cleaned: 流式处理时传入已构建的发送者表、全量消息索引
+                与已清洗文本，此时 messages 可以只是全部消息的一个子集
+        """
+        self.messages = messages
+        self.senders = senders if senders is not None else SenderRegistry()
+        self.sender = array('i')
+        self.timestamps = array('d')
+        self.cleaned = cleaned if cleaned is not None else []
+        self.cache_tokens = cache_tokens
+        self._tokens = {}
+        self._by_sender = None
+        self._repeat_chains = None
+
+        for msg in messages:
+            uin = msg.get('sender', {}).get('uin')
+            self.sender.append(self.senders.intern(uin) if uin else -1)
+            self.timestamps.append(parse_epoch(msg.get('timestamp')))
+            if cleaned is None:
+                self.cleaned.append(clean_message_text(msg))
+
+        if index is None:
+            index = MessageIndex(
+                messages, self.senders, sender_column=self.sender, ts_column=self.timestamps
+            )
+        self.index = index
+
+    def tokens(self, pos):
+        """返回第 pos 条消息清洗后文本的分词结果（未过滤空白和停用词）"""
+        words = self._tokens.get(pos)
+        if words is None:
+            words = tokenize(self.cleaned[pos])
+            if self.cache_tokens:
+                self._tokens[pos] = words
+        return words
+
+    def _partition_by_sender(self):
+        """按时间全局排序一次，再按发送者分桶，得到每人按时间排序的消息位置"""
+        sender = self.sender
+        timestamps = self.timestamps
+        partitions = [array('i') for _ in range(len(self.senders))]
+        valid = [pos for pos in range(len(sender)) if sender[pos] >= 0 and timestamps[pos] == timestamps[pos]]
+        valid.sort(key=timestamps.__getitem__)
+        for pos in valid:
+            partitions[sender[pos]].append(pos)
+        self._by_sender = partitions
+
+    def sender_positions(self, sender_idx):
+        """
+        返回某发送者全部消息的位置（按时间升序，同一时间保持原始顺序；不含时间无效的消息）
+        个人报告直接从这里取得已排序的消息切片，耗时与群聊规模无关
+        """
+        if self._by_sender is None:
+            self._partition_by_sender()
+        if sender_idx is None or not 0 <= sender_idx < len(self._by_sender):
+            return array('i')
+        return self._by_sender[sender_idx]
+
+    def repeat_chains(self):
+        """全部消息（按导出顺序）的复读链，首次访问时计算并缓存"""
+        if self._repeat_chains is None:
+            sender = self.sender
+            self._repeat_chains = RepeatChains(
+                self, (pos for pos in range(len(sender)) if sender[pos] >= 0)
+            )
+        return self._repeat_chains
+
+    def reset_tokens(self):
+        """分词词典变化（例如新词发现后 jieba.add_word）时清空分词缓存"""
+        self._tokens.clear()
+
+    def datetime_at(self, pos):
+        """第 pos 条消息的东八区 datetime，时间无效返回 None"""
+        ts = self.timestamps[pos]
+        if ts != ts:
+            return None
+        return datetime.fromtimestamp(ts, _CST)
+
+    def hour_at(self, pos):
+        """第 pos 条消息的东八区小时，时间无效返回 None"""
+        ts = self.timestamps[pos]
+        if ts != ts:
+            return None
+        return int((ts + _CST_OFFSET_SECONDS) // 3600 % 24)
+
+    def __len__(self):
+        return len(self.messages)
+
+
+class RepeatChains:
+    """
+    群聊复读链检测（对已清洗文本单次线性扫描）
+
+    按消息流顺序，连续出现的相同文本（长度 >= min_chars）构成一条复读链；
+    链中发送者与上一条消息不同的每条消息记为一次复读。只记录至少包含一次复读的链：
+        - starts[i]:       链首消息位置
+        - lengths[i]:      链中消息条数
+        - participants[i]: 按加入顺序排列的参与者下标（含发起者，去重）
+    """
+
+    __slots__ = ('_corpus', 'min_chars', 'starts', 'lengths', 'participants',
+                 '_repeats', '_participation', '_text', '_start', '_length', '_members',
+                 '_prev_sender')
+
+    def __init__(self, corpus, positions=None, min_chars=2):
+        self._corpus = corpus
+        self.min_chars = min_chars
+        self.starts = array('i')
+        self.lengths = array('i')
+        self.participants = []
+        self._repeats = Counter()
+        self._participation = {}
+        self._text = None
+        self._start = -1
+        self._length = 0
+        self._members = []
+        self._prev_sender = None
+        if positions is not None:
+            for pos in positions:
+                self.add(pos)
+            self.close()
+
+    def add(self, pos):
+        """按消息流顺序送入语料中的一条消息（空文本同样会打断复读链）"""
+        self.feed(pos, self._corpus.sender[pos], self._corpus.cleaned[pos])
+
+    def feed(self, pos, sender_idx, text):
+        """按消息流顺序送入一条消息的发送者下标与清洗后文本（流式处理时不需要语料）"""
+        if text and len(text) >= self.min_chars and text == self._text:
+            self._length += 1
+            if sender_idx != self._prev_sender:
+                self._repeats[sender_idx] += 1
+                if sender_idx not in self._members:
+                    self._members.append(sender_idx)
+        else:
+            self._flush()
+            self._text = text
+            self._start = pos
+            self._length = 1
+            self._members = [sender_idx]
+        self._prev_sender = sender_idx
+
+    def close(self):
+        """消息流结束，记录最后一条未结束的链"""
+        self._flush()
+        self._text = None
+        self._prev_sender = None
+
+    def _flush(self):
+        if len(self._members) >= 2:
+            self._participation.clear()
+            self.starts.append(self._start)
+            self.lengths.append(self._length)
+            self.participants.append(tuple(self._members))
+
+    def repeat_counts(self):
+        """发送者下标 -> 复读次数（跟随上一条不同发送者的相同消息）"""
+        return Counter(self._repeats)
+
+    def repeats_of(self, sender_idx):
+        """单个发送者的复读次数"""
+        return self._repeats.get(sender_idx, 0)
+
+    def participation(self, min_participants=3):
+        """发送者下标 -> 参与（含发起）至少 min_participants 人的复读链次数"""
+        counts = self._participation.get(min_participants)
+        if counts is None:
+            counts = Counter()
+            for members in self.participants:
+                if len(members) >= min_participants:
+                    counts.update(members)
+            self._participation[min_participants] = counts
+        return counts
+
+    def __len__(self):
+        return len(self.starts)
+
+
+def get_corpus(data):
+    """
+    返回群聊数据的共享预处理语料
+    每份加载后的数据只构建一次，缓存在 data 字典中，ChatAnalyzer 与 PersonalAnalyzer 共用
+    """
+    corpus = data.get('_corpus')
+    if corpus is None:
+        corpus = MessageCorpus(data.get('messages', []))
+        data['_corpus'] = corpus
+    return corpus
+
+
+def get_message_index(data):
+    """返回群聊数据的共享消息索引（messageId -> 发送者/时间）"""
+    return get_corpus(data).index
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+群成员互动图（回复 / @ 关系）
+以发送者下标为节点的稀疏有向图：边 (发起者 -> 目标) 带次数，回复边另带回复间隔
+"""
+
+from array import array
+from collections import Counter
+
+from corpus import get_corpus, reply_ref_id
+
+# 边类型
+REPLY = 0
+AT = 1
+_KINDS = (REPLY, AT)
+
+_NAN = float('nan')
+
+
+class InteractionGraphBuilder:
+    """
+    逐条追加互动边（COO 格式），build() 时合并重复边并生成 CSR
+
+    回复目标优先取 replyElement.senderUid，否则用消息索引按被回复消息 ID 查找；
+    构建时没有可用索引（流式读取）的回复会暂存，build(index=...) 时再解析。
+    """
+
+    def __init__(self):
+        self._kind = array('b')
+        self._src = array('i')
+        self._dst = array('i')
+        self._latency = array('d')
+        self._pending = []  # (发起者, senderUid, 被回复消息ID, 回复时间)
+
+    def add(self, kind, src, dst, latency=_NAN):
+        self._kind.append(kind)
+        self._src.append(src)
+        self._dst.append(dst)
+        self._latency.append(_NAN if latency is None else latency)
+
+    def add_message(self, msg, sender_idx, ts, senders, index=None, include_bots=True):
+        """
+        追加一条消息中的全部 @ 与回复
+
+        Args:
+            msg: 消息
+            sender_idx: 发送者下标
+            ts: 消息时间戳（NaN 表示无效）
+            senders: SenderRegistry（@/回复目标在其中登记下标）
+            index: 已完成的 MessageIndex；为 None 时回复暂存到 build() 再解析
+            include_bots: 按消息 ID 查找回复目标时是否包含机器人消息
+        """
+        for element in msg.get('rawMessage', {}).get('elements', []):
+            elem_type = element.get('elementType')
+            if elem_type == 1:
+                text_elem = element.get('textElement', {})
+                at_uid = text_elem.get('atUid', '')
+                at_uid = str(at_uid) if at_uid else ''
+                if text_elem.get('atType', 0) > 0 and at_uid and at_uid != '0':
+                    self.add(AT, sender_idx, senders.intern(at_uid))
+            elif elem_type == 7:
+                reply_elem = element.get('replyElement', {})
+                target_uin = reply_elem.get('senderUid')
+                target_uin = str(target_uin) if target_uin and str(target_uin) != '0' else None
+                ref_msg_id = reply_ref_id(reply_elem)
+                if index is None:
+                    self._pending.append((sender_idx, target_uin, ref_msg_id, ts))
+                else:
+                    self._add_reply(sender_idx, target_uin, ref_msg_id, ts, senders, index, include_bots)
+
+    def _add_reply(self, sender_idx, target_uin, ref_msg_id, ts, senders, index, include_bots):
+        if target_uin is not None:
+            target_idx = senders.intern(target_uin)
+        else:
+            target_idx = index.sender_of(ref_msg_id, include_bots=include_bots)
+            if target_idx is None:
+                return
+        latency = _NAN
+        if ts == ts:
+            ref_ts = index.timestamp_of(ref_msg_id)
+            if ref_ts is not None:
+                latency = ts - ref_ts
+        self.add(REPLY, sender_idx, target_idx, latency)
+
+    def build(self, n_nodes=None, index=None, senders=None, include_bots=True):
+        """
+        合并重复边，生成 InteractionGraph
+
+        Args:
+            n_nodes: 节点数（通常为 len(senders)），默认取出现过的最大下标 + 1
+            index / senders: 解析暂存回复所需的消息索引与发送者表
+        """
+        if self._pending:
+            if index is None:
+                raise ValueError("存在未解析的回复，build() 需要传入 index")
+            senders = senders if senders is not None else index.senders
+            for sender_idx, target_uin, ref_msg_id, ts in self._pending:
+                self._add_reply(sender_idx, target_uin, ref_msg_id, ts, senders, index, include_bots)
+            self._pending = []
+
+        if n_nodes is None:
+            n_nodes = max(max(self._src, default=-1), max(self._dst, default=-1)) + 1
+
+        merged = ({}, {})  # 每种边: (src, dst) -> [次数, 间隔总和, 有效间隔数]
+        for kind, src, dst, latency in zip(self._kind, self._src, self._dst, self._latency):
+            edge = merged[kind].get((src, dst))
+            if edge is None:
+                edge = merged[kind][(src, dst)] = [0, 0.0, 0]
+            edge[0] += 1
+            if latency == latency:
+                edge[1] += latency
+                edge[2] += 1
+        return InteractionGraph(n_nodes, merged)
+
+
+class _CSR:
+    """按行压缩的一种边：indptr / indices / counts / latency_sum / latency_n"""
+
+    __slots__ = ('indptr', 'indices', 'counts', 'latency_sum', 'latency_n')
+
+    def __init__(self, n_nodes, edges, by_target=False):
+        # edges: (src, dst) -> [次数, 间隔总和, 有效间隔数]
+        rows = sorted(edges.items(), key=(lambda e: (e[0][1], e[0][0])) if by_target else (lambda e: e[0]))
+        self.indptr = array('i', [0] * (n_nodes + 1))
+        self.indices = array('i')
+        self.counts = array('i')
+        self.latency_sum = array('d')
+        self.latency_n = array('i')
+        for (src, dst), (count, latency_sum, latency_n) in rows:
+            row, col = (dst, src) if by_target else (src, dst)
+            self.indptr[row + 1] += 1
+            self.indices.append(col)
+            self.counts.append(count)
+            self.latency_sum.append(latency_sum)
+            self.latency_n.append(latency_n)
+        for i in range(n_nodes):
+            self.indptr[i + 1] += self.indptr[i]
+
+    def row(self, idx):
+        if idx is None or not 0 <= idx < len(self.indptr) - 1:
+            return range(0)
+        return range(self.indptr[idx], self.indptr[idx + 1])
+
+
+class InteractionGraph:
+    """
+    稀疏互动图，每种边分别以 CSR（按发起者）和 CSC（按目标）存储
+
+    节点为 SenderRegistry 中的发送者下标；边类型为 REPLY / AT
+    """
+
+    def __init__(self, n_nodes, merged):
+        self.n_nodes = n_nodes
+        self._out = tuple(_CSR(n_nodes, merged[kind]) for kind in _KINDS)
+        self._in = tuple(_CSR(n_nodes, merged[kind], by_target=True) for kind in _KINDS)
+        # 度数按节点首次出现在边中的顺序累加（merged 按每条边首次出现的顺序排列），
+        # 榜单中次数相同的成员按首次发起/收到互动的先后排列
+        self._out_degree = tuple(Counter() for _ in _KINDS)
+        self._in_degree = tuple(Counter() for _ in _KINDS)
+        for kind in _KINDS:
+            out_degree = self._out_degree[kind]
+            in_degree = self._in_degree[kind]
+            for (src, dst), (count, _, _) in merged[kind].items():
+                out_degree[src] += count
+                in_degree[dst] += count
+
+    def out_neighbors(self, idx, kind):
+        """idx 发起的边：Counter(目标下标 -> 次数)"""
+        csr = self._out[kind]
+        return Counter({csr.indices[i]: csr.counts[i] for i in csr.row(idx)})
+
+    def in_neighbors(self, idx, kind):
+        """指向 idx 的边：Counter(发起者下标 -> 次数)"""
+        csc = self._in[kind]
+        return Counter({csc.indices[i]: csc.counts[i] for i in csc.row(idx)})
+
+    def out_degree(self, kind):
+        """每个节点发起的边次数之和：Counter(下标 -> 次数)，不含 0，按首次发起的顺序排列"""
+        return Counter(self._out_degree[kind])
+
+    def in_degree(self, kind):
+        """每个节点收到的边次数之和：Counter(下标 -> 次数)，不含 0，按首次收到的顺序排列"""
+        return Counter(self._in_degree[kind])
+
+    def reply_latency(self, src, dst):
+        """src 回复 dst 的平均间隔（秒），没有有效间隔返回 None"""
+        csr = self._out[REPLY]
+        for i in csr.row(src):
+            if csr.indices[i] == dst:
+                return csr.latency_sum[i] / csr.latency_n[i] if csr.latency_n[i] else None
+        return None
+
+    def top_partners(self, idx, n=5):
+        """与 idx 互动（回复与 @，双向合计）最多的成员：[(下标, 次数), ...]"""
+        total = Counter()
+        for kind in _KINDS:
+            total.update(self.out_neighbors(idx, kind))
+            total.update(self.in_neighbors(idx, kind))
+        total.pop(idx, None)
+        return total.most_common(n)
+
+    def edges(self, kind):
+        """遍历某种边：(发起者, 目标, 次数, 平均间隔或 None)"""
+        csr = self._out[kind]
+        for src in range(self.n_nodes):
+            for i in csr.row(src):
+                mean = csr.latency_sum[i] / csr.latency_n[i] if csr.latency_n[i] else None
+                yield src, csr.indices[i], csr.counts[i], mean
+
+    def num_edges(self, kind):
+        return len(self._out[kind].indices)
+
+
+def build_interaction_graph(corpus, positions=None, include_bots=True):
+    """由预处理语料构建互动图（positions 为空时使用全部消息）"""
+    builder = InteractionGraphBuilder()
+    messages = corpus.messages
+    if positions is None:
+        positions = range(len(messages))
+    for pos in positions:
+        sender_idx = corpus.sender[pos]
+        if sender_idx < 0:
+            continue
+        builder.add_message(messages[pos], sender_idx, corpus.timestamps[pos],
+                            corpus.senders, corpus.index, include_bots)
+    return builder.build(len(corpus.senders))
+
+
+def get_interaction_graph(data):
+    """
+    返回群聊数据全部消息的互动图
+    每份加载后的数据只构建一次，缓存在 data 字典中
+    """
+    graph = data.get('_interaction_graph')
+    if graph is None:
+        graph = build_interaction_graph(get_corpus(data))
+        data['_interaction_graph'] = graph
+    return graph
@@ -7,13 +7,19 @@ Licensed under AGPL-3.0: https://www.gnu.org/licenses/agpl-3.0.html
 
 Usage:
     python main.py [input_file]
+    python main.py --batch <文件或目录> [...] [--workers N] [--output-dir DIR]
     
-    input_file: 可选，JSON文件路径，默认读取config.py中的INPUT_FILE
+    input_file: 可选，JSON文件路径（也支持 .json.gz / .json.zst / .zip 压缩文件），默认读取config.py中的INPUT_FILE
+    --batch: 批量模式，多个群的导出文件（目录中的导出文件全部处理）在进程池中并行分析，
+             每个群生成文本报告和 JSON 结果，不生成可视化报告
 """
 
 import sys
 import os
 import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # 添加当前目录到路径
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -28,8 +34,8 @@ except ImportError:
     pass  # python-dotenv 未安装，跳过
 
 import config as cfg
-from utils import load_json, sanitize_filename
-from analyzer import ChatAnalyzer
+from utils import load_json, sanitize_filename, EXPORT_EXTENSIONS
+from analyzer import ChatAnalyzer, preload_shared_resources
 from report_generator import ReportGenerator
 from image_generator import ImageGenerator
 from logger import get_logger, init_logging
@@ -143,5 +149,92 @@ def main():
     logger.info("=" * 60)
 
 
+def collect_export_files(paths):
+    """展开批量模式的输入：目录中取所有导出文件（不递归），文件直接使用"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                full_path = os.path.join(path, name)
+                if os.path.isfile(full_path) and name.lower().endswith(EXPORT_EXTENSIONS):
+                    files.append(full_path)
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            logger.warning(f"⚠️ 文件不存在，已跳过: {path}")
+    return files
+
+
+def analyze_export_file(input_file, output_dir=None):
+    """批量模式下在工作进程中分析单个导出文件，保存文本报告和 JSON 结果，返回摘要"""
+    started = time.time()
+    data = load_json(input_file)
+    analyzer = ChatAnalyzer(data)
+    analyzer.analyze()
+
+    # 每个导出文件单独一个子目录（以文件名命名），避免同名群聊的报告互相覆盖
+    name = os.path.basename(input_file)
+    stem = next((name[:-len(ext)] for ext in EXPORT_EXTENSIONS if name.lower().endswith(ext)), name)
+    output_dir = os.path.join(output_dir or os.path.dirname(os.path.abspath(input_file)), stem)
+    os.makedirs(output_dir, exist_ok=True)
+    ReportGenerator(analyzer, output_dir=output_dir).generate_file_report()
+    json_path = os.path.join(output_dir, f"{sanitize_filename(analyzer.chat_name)}_分析结果.json")
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(analyzer.export_json(), f, ensure_ascii=False, indent=2)
+
+    return {
+        'file': input_file,
+        'chat_name': analyzer.chat_name,
+        'message_count': len(analyzer.messages),
+        'json_path': json_path,
+        'elapsed': time.time() - started,
+    }
+
+
+def batch_main(argv):
+    """批量模式：多个群的导出文件在进程池中并行分析"""
+    parser = argparse.ArgumentParser(prog='main.py --batch', description='批量分析多个群的聊天记录')
+    parser.add_argument('paths', nargs='+', help='导出文件或包含导出文件的目录')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help='并行分析的进程数（默认 CPU 核数的一半）')
+    parser.add_argument('--output-dir', default=None,
+                        help='报告输出目录（默认与各导出文件同目录），每个导出文件的报告在以文件名命名的子目录中')
+    args = parser.parse_args(argv)
+
+    files = collect_export_files(args.paths)
+    if not files:
+        logger.error("没有找到可分析的导出文件")
+        sys.exit(1)
+    # 大文件先提交，减少最后只剩一个大群在跑的等待时间
+    files.sort(key=os.path.getsize, reverse=True)
+    workers = max(1, min(args.workers, len(files)))
+    logger.info(f"📦 批量分析 {len(files)} 个文件，进程数 {workers}")
+
+    started = time.time()
+    failed = []
+    # 每个工作进程启动时加载一次 jieba 词典和停用词，之后的文件直接复用
+    with ProcessPoolExecutor(max_workers=workers, initializer=preload_shared_resources) as pool:
+        futures = {pool.submit(analyze_export_file, path, args.output_dir): path for path in files}
+        for done, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                summary = future.result()
+                logger.info(f"✅ [{done}/{len(files)}] {summary['chat_name']}: {summary['message_count']} 条消息，"
+                            f"用时 {summary['elapsed']:.1f}s → {summary['json_path']}")
+            except Exception as e:
+                failed.append(path)
+                logger.error(f"❌ [{done}/{len(files)}] 分析失败: {path} | {e}")
+
+    logger.info("\n" + "=" * 60)
+    logger.info(f"✨ 批量分析完成：成功 {len(files) - len(failed)} 个，失败 {len(failed)} 个，"
+                f"总用时 {time.time() - started:.1f}s")
+    logger.info("=" * 60)
+    if failed:
+        sys.exit(1)
+
+
 if __name__ == '__main__':
-    main()
+    if len(sys.argv) > 1 and sys.argv[1] == '--batch':
+        batch_main(sys.argv[2:])
+    else:
+        main()
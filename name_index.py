@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+群成员名称索引
+支持按当前名称/历史昵称精确查找、基于 n-gram 倒排索引的排序模糊查找，以及"你是不是要找"候选列表
+"""
+
+import heapq
+import unicodedata
+from collections import defaultdict
+
+# 单次模糊查找最多评估的候选名称数
+_CANDIDATE_BUDGET = 2000
+
+
+def normalize_name(name):
+    """名称归一化：全角转半角、忽略大小写和空白"""
+    return ''.join(unicodedata.normalize('NFKC', name).casefold().split())
+
+
+def name_grams(name):
+    """
+    名称的 n-gram 集合：首尾补位的双字组
+    群昵称多为 2~6 个汉字，双字组比三字组召回更好，且长度 >= 2 的包含关系一定共享至少一个双字组
+    """
+    padded = f"\x02{name}\x03"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+class NameIndex:
+    """
+    群成员名称索引
+
+    - uin_to_name: uin -> 当前显示名称
+    - uin_history: uin -> 用过的全部名称（昵称与群名片）
+    - weights:     uin -> 权重（通常为发言数），得分相同时权重高者优先
+    """
+
+    def __init__(self, uin_to_name, uin_history=None, weights=None):
+        self.uin_to_name = dict(uin_to_name)
+        self.uin_history = {uin: list(names) for uin, names in (uin_history or {}).items()}
+        self.weights = dict(weights or {})
+
+        self._entries = []  # 名称编号 -> (uin, 原始名称, 归一化名称, 是否当前名称)
+        self._grams = []    # 名称编号 -> n-gram 集合
+        self._exact = defaultdict(list)     # 原始名称 -> 名称编号
+        self._normalized = defaultdict(list)  # 归一化名称 -> 名称编号
+        self._postings = defaultdict(list)  # n-gram -> 名称编号
+        self._char_postings = defaultdict(set)  # 单字 -> 名称编号（仅用于单字查询）
+
+        for uin, name in self.uin_to_name.items():
+            self._add(uin, name, True)
+        for uin, names in self.uin_history.items():
+            current = self.uin_to_name.get(uin)
+            for name in names:
+                if name != current:
+                    self._add(uin, name, False)
+
+    def _add(self, uin, name, is_current):
+        normalized = normalize_name(name)
+        if not normalized:
+            return
+        name_id = len(self._entries)
+        grams = name_grams(normalized)
+        self._entries.append((uin, name, normalized, is_current))
+        self._grams.append(grams)
+        self._exact[name].append(name_id)
+        self._normalized[normalized].append(name_id)
+        for gram in grams:
+            self._postings[gram].append(name_id)
+        for char in normalized:
+            self._char_postings[char].add(name_id)
+
+    def _best_uin(self, name_ids):
+        """同名时优先当前名称，其次权重高者"""
+        uin, _, _, _ = max(
+            (self._entries[i] for i in name_ids),
+            key=lambda e: (e[3], self.weights.get(e[0], 0)),
+        )
+        return uin
+
+    def exact(self, name):
+        """精确查找：先按原始名称，再按归一化名称；未找到返回 None"""
+        name_ids = self._exact.get(name) or self._normalized.get(normalize_name(name))
+        if not name_ids:
+            return None
+        return self._best_uin(name_ids)
+
+    def search(self, query, limit=5):
+        """
+        排序模糊查找，每个 uin 只保留得分最高的名称
+
+        得分：完全一致为 1；存在包含关系为 0.5 + 0.5 × Jaccard；否则为 n-gram Jaccard 相似度
+
+        Returns:
+            [{'uin', 'name', 'matched_name', 'score', 'contains'}, ...]，按得分降序
+        """
+        normalized = normalize_name(query)
+        if not normalized:
+            return []
+        query_grams = name_grams(normalized)
+
+        # 从倒排表最短的 n-gram 开始召回候选，候选数超过预算后不再合并常见 n-gram
+        candidates = set()
+        for gram in sorted(query_grams, key=lambda g: len(self._postings.get(g, ()))):
+            postings = self._postings.get(gram, ())
+            if candidates and len(candidates) + len(postings) > _CANDIDATE_BUDGET:
+                break
+            candidates.update(postings)
+        if len(normalized) == 1:
+            # 单字查询：补充召回在中间位置包含该字的名称
+            candidates.update(self._char_postings.get(normalized, ()))
+
+        best = {}
+        for name_id in candidates:
+            uin, name, candidate, is_current = self._entries[name_id]
+            overlap = len(query_grams & self._grams[name_id])
+            jaccard = overlap / (len(query_grams) + len(self._grams[name_id]) - overlap)
+            contains = normalized in candidate or candidate in normalized
+            if candidate == normalized:
+                score = 1.0
+            elif contains:
+                score = 0.5 + 0.5 * jaccard
+            else:
+                score = jaccard
+            rank = (score, is_current, self.weights.get(uin, 0))
+            if uin not in best or rank > best[uin][0]:
+                best[uin] = (rank, name, contains)
+
+        ranked = heapq.nlargest(limit, best.items(), key=lambda item: item[1][0])
+        return [
+            {
+                'uin': uin,
+                'name': self.uin_to_name.get(uin, matched_name),
+                'matched_name': matched_name,
+                'score': round(rank[0], 4),
+                'contains': contains,
+            }
+            for uin, (rank, matched_name, contains) in ranked
+        ]
+
+    def resolve(self, query):
+        """
+        解析用户名称为 uin：精确匹配（含历史昵称）优先，其次取存在包含关系的最佳模糊匹配
+        找不到返回 None
+        """
+        uin = self.exact(query)
+        if uin is not None:
+            return uin
+        for candidate in self.search(query, limit=1):
+            if candidate['contains']:
+                return candidate['uin']
+        return None
+
+    def did_you_mean(self, query, limit=5):
+        """候选用户的当前显示名称列表"""
+        return [candidate['name'] for candidate in self.search(query, limit)]
+
+    def to_dict(self):
+        return {'names': self.uin_to_name, 'history': self.uin_history, 'weights': self.weights}
+
+    @classmethod
+    def from_dict(cls, payload):
+        return cls(payload.get('names', {}), payload.get('history'), payload.get('weights'))
+
+    def __len__(self):
+        return len(self.uin_to_name)
@@ -4,17 +4,16 @@
 分析指定用户在群聊中的年度数据
 """
 
-import re
-# 尝试导入 jieba_fast（更快），如果失败则回退到 jieba（标准版本）
-try:
-    import jieba_fast as jieba
-except ImportError:
-    import jieba
-from datetime import datetime, timezone, timedelta
+from datetime import datetime
 from collections import Counter, defaultdict
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional
 from logger import get_logger
-from utils import parse_datetime, clean_text
+from utils import read_stopwords_file, iter_messages, clean_text
+from corpus import (
+    MessageCorpus, MessageIndex, RepeatChains, SenderRegistry, UserNameCollector,
+    build_user_names, clean_message_text, get_corpus, parse_epoch, reply_ref_id, tokenize,
+)
+from name_index import NameIndex
 import os
 
 logger = get_logger(__name__)
@@ -22,6 +21,9 @@ logger = get_logger(__name__)
 # 停用词缓存
 _STOPWORDS_CACHE = None
 
+# 个人报告分析逻辑版本（统计口径变化时递增，使已缓存的个人报告失效）
+PERSONAL_ANALYZER_VERSION = '4'
+
 def load_stopwords_for_personal():
     """加载停用词（不依赖config）"""
     global _STOPWORDS_CACHE
@@ -57,8 +59,7 @@ def load_stopwords_for_personal():
         return _STOPWORDS_CACHE
     
     try:
-        with open(stopwords_path, 'r', encoding='utf-8') as f:
-            words = {line.strip() for line in f if line.strip() and not line.startswith('#')}
+        words = read_stopwords_file(stopwords_path)
         _STOPWORDS_CACHE = words
         logger.info(f"📚 已加载个人报告停用词 {len(words)} 个 from {os.path.basename(stopwords_path)}")
         return _STOPWORDS_CACHE
@@ -68,6 +69,39 @@ def load_stopwords_for_personal():
         return _STOPWORDS_CACHE
 
 
+class IncomingInteractionCounter:
+    """
+    统计其他成员@和回复目标用户的次数
+    @ 按 atUid 等于目标UIN计数（不看 atType）；回复按被回复的消息是否为目标用户所发计数（不看 senderUid）。
+    与群聊榜单的互动图口径不同，保持个人报告原有的统计结果
+    """
+    
+    def __init__(self, target_uin: str):
+        self.target_uin = str(target_uin)
+        self.at_by = Counter()
+        self._replies = []  # (回复者UIN, 被回复消息ID)，被回复消息是否为目标用户所发在读取结束后判断
+    
+    def add(self, msg: Dict):
+        sender_uin = msg.get('sender', {}).get('uin')
+        if not sender_uin or str(sender_uin) == self.target_uin:
+            return  # 跳过目标用户自己的消息
+        sender_uin = str(sender_uin)
+        for element in msg.get('rawMessage', {}).get('elements', []):
+            elem_type = element.get('elementType')
+            if elem_type == 1:  # 文本元素
+                if str(element.get('textElement', {}).get('atUid', '')) == self.target_uin:
+                    self.at_by[sender_uin] += 1
+            elif elem_type == 7:  # 回复元素
+                reply_elem = element.get('replyElement', {})
+                ref_msg_id = reply_elem.get('sourceMsgIdInRecords') or reply_elem.get('replayMsgId')
+                if ref_msg_id:
+                    self._replies.append((sender_uin, ref_msg_id))
+    
+    def replied_by(self, user_msg_ids) -> Counter:
+        """谁回复了目标用户；user_msg_ids 为目标用户消息的 messageId 集合"""
+        return Counter(sender_uin for sender_uin, ref_msg_id in self._replies if ref_msg_id in user_msg_ids)
+
+
 class PersonalAnalyzer:
     """个人年度报告分析器"""
     
@@ -98,11 +132,15 @@ class PersonalAnalyzer:
         # 查找目标用户
         self.target_uin = self._find_target_user()
         if not self.target_uin:
+            suggestions = self.name_index.did_you_mean(target_name)
+            if suggestions:
+                raise ValueError(f"未找到用户: {target_name}，你是不是要找: {'、'.join(suggestions)}")
             raise ValueError(f"未找到用户: {target_name}")
         
-        # 过滤出目标用户的消息
-        self.user_messages = [msg for msg in self.messages 
-                             if msg.get('sender', {}).get('uin') == self.target_uin]
+        # 目标用户的消息直接取自语料的按发送者分区（已按时间排序）
+        corpus = get_corpus(self.data)
+        self.user_positions = corpus.sender_positions(corpus.senders.get(self.target_uin))
+        self.user_messages = [self.messages[pos] for pos in self.user_positions]
         
         if not self.user_messages:
             raise ValueError(f"用户 {target_name} 在指定时间范围内没有发言")
@@ -112,59 +150,131 @@ class PersonalAnalyzer:
         
         # 初始化统计变量
         self._init_stats()
+        self._incoming = None  # 分析时遍历全部消息统计
     
-    def _build_user_mapping(self):
-        """构建用户UIN到名称的映射"""
-        self.uin_to_name = {}
-        uin_names = defaultdict(list)
-        uin_member_names = {}
-        
-        for msg in self.messages:
-            sender = msg.get('sender', {})
-            uin = sender.get('uin')
-            name = (sender.get('name') or '').strip()
-            
-            if uin and name:
-                if not uin_names[uin] or uin_names[uin][-1] != name:
-                    uin_names[uin].append(name)
-            
-            if uin:
-                raw_msg = msg.get('rawMessage', {})
-                send_member_name = raw_msg.get('sendMemberName', '').strip()
-                if send_member_name:
-                    uin_member_names[uin] = send_member_name
-        
-        for uin, names in uin_names.items():
-            chosen_name = None
-            for name in reversed(names):
-                if name != str(uin):
-                    chosen_name = name
-                    break
-            if chosen_name is None and names:
-                chosen_name = names[-1]
-            
-            if chosen_name is None and uin in uin_member_names:
-                chosen_name = uin_member_names[uin]
-            
-            if chosen_name is None or chosen_name == str(uin):
-                chosen_name = f"用户{uin}"
+    @classmethod
+    def from_stream(cls, messages, target_uin: str, use_stopwords: bool = False,
+                    chat_info: Optional[Dict] = None) -> 'PersonalAnalyzer':
+        """
+        流式构建个人分析器：只消费一次消息迭代器，不保留整个群聊的消息列表
+        
+        内存中只保留目标用户的消息、紧凑的 msgId -> (发送者, 时间) 索引、成员名称和复读链统计；
+        其他成员对目标用户的@与回复在读取过程中直接计数。
+        
+        Args:
+            messages: 消息迭代器（例如 utils.iter_messages）
+            target_uin: 目标用户UIN
+            use_stopwords: 是否使用停用词库
+            chat_info: 读取过程中被填充群聊信息的 dict（与 iter_messages 共用）
+        """
+        target_uin = str(target_uin)
+        senders = SenderRegistry()
+        index = MessageIndex(senders=senders)
+        names = UserNameCollector()
+        chains = RepeatChains(None)
+        message_counts = Counter()
+        
+        user_messages = []
+        user_cleaned = []
+        incoming = IncomingInteractionCounter(target_uin)
+        
+        for pos, msg in enumerate(messages):
+            sender_uin = msg.get('sender', {}).get('uin')
+            if not sender_uin:
+                continue
+            sender_uin = str(sender_uin)
+            sender_idx = senders.intern(sender_uin)
+            message_counts[sender_uin] += 1
+            names.add(msg)
+            ts = parse_epoch(msg.get('timestamp'))
+            index.add_message(msg, sender_idx, ts)
+            incoming.add(msg)
+            cleaned = clean_message_text(msg)
+            chains.feed(pos, sender_idx, cleaned)
             
-            self.uin_to_name[uin] = chosen_name
+            if sender_uin == target_uin:
+                user_messages.append(msg)
+                user_cleaned.append(cleaned)
+        
+        index.finalize()
+        chains.close()
+        uin_to_name, uin_history = names.result()
+        
+        if not user_messages:
+            raise ValueError(f"用户 {uin_to_name.get(target_uin, target_uin)} 在指定时间范围内没有发言")
+        
+        chat_name = (chat_info or {}).get('name') or '未知群聊'
+        data = {'messages': user_messages, 'chatInfo': {'name': chat_name}}
+        corpus = MessageCorpus(user_messages, senders=senders, index=index, cleaned=user_cleaned)
+        corpus._repeat_chains = chains
+        data['_corpus'] = corpus
+        
+        analyzer = cls.__new__(cls)
+        analyzer.data = data
+        analyzer.messages = user_messages
+        analyzer.chat_name = chat_name
+        analyzer.target_uin = target_uin
+        analyzer.target_name = uin_to_name.get(target_uin, f"用户{target_uin}")
+        analyzer.use_stopwords = use_stopwords
+        analyzer.stopwords = load_stopwords_for_personal() if use_stopwords else set()
+        analyzer.uin_to_name = uin_to_name
+        analyzer.name_index = NameIndex(uin_to_name, uin_history, message_counts)
+        analyzer.user_positions = corpus.sender_positions(senders.get(target_uin))
+        analyzer.user_messages = [user_messages[pos] for pos in analyzer.user_positions]
+        analyzer._init_stats()
+        analyzer._incoming = incoming
+        
+        logger.info(f"📊 流式读取完成: {len(senders)} 位成员, "
+                    f"目标用户 {analyzer.target_name} 共 {len(user_messages)} 条消息")
+        return analyzer
     
-    def _find_target_user(self) -> Optional[str]:
-        """查找目标用户的UIN"""
-        # 精确匹配
-        for uin, name in self.uin_to_name.items():
-            if name == self.target_name:
-                return uin
-        
-        # 模糊匹配（包含）
-        for uin, name in self.uin_to_name.items():
-            if self.target_name in name or name in self.target_name:
-                logger.info(f"🔍 模糊匹配到用户: {name} (UIN: {uin})")
-                return uin
+    @classmethod
+    def from_file(cls, filepath: str, target_name: str, use_stopwords: bool = False,
+                  max_bytes: Optional[int] = None) -> 'PersonalAnalyzer':
+        """
+        从导出文件流式构建个人分析器
+        第一遍只收集成员名称以解析目标用户，第二遍交给 from_stream；全程不加载整个群聊
+        max_bytes 为解压后内容的字节数上限（见 utils.open_export）
+        """
+        names = UserNameCollector()
+        message_counts = Counter()
+        for msg in iter_messages(filepath, max_bytes=max_bytes):
+            names.add(msg)
+            sender_uin = msg.get('sender', {}).get('uin')
+            if sender_uin:
+                message_counts[str(sender_uin)] += 1
+        uin_to_name, uin_history = names.result()
+        name_index = NameIndex(uin_to_name, uin_history, message_counts)
+        
+        target_uin = name_index.resolve(target_name)
+        if target_uin is None:
+            suggestions = name_index.did_you_mean(target_name)
+            if suggestions:
+                raise ValueError(f"未找到用户: {target_name}，你是不是要找: {'、'.join(suggestions)}")
+            raise ValueError(f"未找到用户: {target_name}")
+        if uin_to_name.get(target_uin) != target_name:
+            logger.info(f"🔍 模糊匹配到用户: {uin_to_name.get(target_uin)} (UIN: {target_uin})")
         
-        return None
+        chat_info = {}
+        return cls.from_stream(iter_messages(filepath, chat_info, max_bytes), target_uin,
+                               use_stopwords=use_stopwords, chat_info=chat_info)
+    
+    def _build_user_mapping(self):
+        """构建用户UIN到名称的映射，以及包含历史昵称的名称索引"""
+        self.uin_to_name, uin_history = build_user_names(self.messages)
+        corpus = get_corpus(self.data)
+        weights = {uin: len(corpus.sender_positions(corpus.senders.get(uin))) for uin in self.uin_to_name}
+        self.name_index = NameIndex(self.uin_to_name, uin_history, weights)
+    
+    def _find_target_user(self) -> Optional[str]:
+        """查找目标用户的UIN（精确匹配当前名称或历史昵称，其次按相似度排序的模糊匹配）"""
+        uin = self.name_index.exact(self.target_name)
+        if uin is not None:
+            return uin
+        uin = self.name_index.resolve(self.target_name)
+        if uin is not None:
+            logger.info(f"🔍 模糊匹配到用户: {self.uin_to_name.get(uin)} (UIN: {uin})")
+        return uin
     
     def _init_stats(self):
         """初始化统计变量"""
@@ -198,7 +308,7 @@ class PersonalAnalyzer:
         self.reply_intervals = defaultdict(list)  # 与不同人的回复间隔
         
         # 复读相关
-        self.repeat_count = 0  # 与上一条消息完全相同
+        self.repeat_count = 0  # 复读上一位群友的消息
         self.chain_repeat_count = 0  # 连续3人以上复读的参与次数
         
         # 词频
@@ -206,7 +316,7 @@ class PersonalAnalyzer:
         self.word_samples = defaultdict(list)
         
         # 消息内容
-        self.all_messages = []  # 存储所有消息文本
+        self.word_consecutive_count = Counter()  # 同一条消息内连续重复出现的词
         self.long_messages = 0  # >200字的消息
         
         # 特殊消息
@@ -214,73 +324,60 @@ class PersonalAnalyzer:
         self.most_emoji_message = None  # 表情反应最多的消息
         self.chain_repeat_message = None  # 引发复读的消息
         
-        # 构建msgid到发送者的映射（用于回复分析）
-        self.msgid_to_sender = {}
-        for msg in self.messages:
-            msg_id = msg.get('messageId')
-            sender_uin = msg.get('sender', {}).get('uin')
-            if msg_id and sender_uin:
-                self.msgid_to_sender[msg_id] = sender_uin
+        # 预处理语料与 msgid 到发送者的索引（与 ChatAnalyzer 共用）
+        self.corpus = get_corpus(self.data)
+        self.message_index = self.corpus.index
     
     def analyze(self):
         """执行分析"""
         logger.info("🔍 开始分析个人数据...")
         
-        # 先遍历所有消息，统计@和回复关系（避免重复计算）
-        msg_id_to_user_msg = {msg.get('messageId'): msg for msg in self.user_messages}
-        
-        for msg in self.messages:
-            sender_uin = msg.get('sender', {}).get('uin')
-            if not sender_uin or str(sender_uin) == str(self.target_uin):
-                continue  # 跳过目标用户自己的消息
-            
-            elements = msg.get('rawMessage', {}).get('elements', [])
-            for element in elements:
-                elem_type = element.get('elementType')
-                
-                # 检查是否@了目标用户
-                if elem_type == 1:  # 文本元素
-                    text_elem = element.get('textElement', {})
-                    at_uid = text_elem.get('atUid', '')
-                    if str(at_uid) == str(self.target_uin):
-                        self.ated_count += 1
-                        self.at_by[str(sender_uin)] += 1
-                
-                # 检查是否回复了目标用户
-                elif elem_type == 7:  # 回复元素
-                    reply_elem = element.get('replyElement', {})
-                    ref_msg_id = reply_elem.get('sourceMsgIdInRecords') or reply_elem.get('replayMsgId')
-                    if ref_msg_id and ref_msg_id in msg_id_to_user_msg:
-                        self.replied_count += 1
-                        self.replied_by[str(sender_uin)] += 1
+        # 先统计其他人对目标用户的@和回复（流式构建时已在读取过程中计数）
+        self._count_incoming_interactions()
         
         # 再遍历用户消息，统计用户自己的数据
-        # 先按时间排序用户消息，确保时间计算的准确性
-        user_messages_with_time = []
-        for msg in self.user_messages:
-            timestamp = msg.get('timestamp', '')
-            msg_dt = parse_datetime(timestamp)
-            if msg_dt:
-                user_messages_with_time.append((msg_dt, msg))
+        self._analyze_own_messages()
         
-        # 按时间排序
-        user_messages_with_time.sort(key=lambda x: x[0])
+        if self.first_message_time:
+            logger.info(f"📅 最早发言: {self.first_message_time.strftime('%Y-%m-%d %H:%M:%S')}")
+            logger.info(f"📅 最晚发言: {self.last_message_time.strftime('%Y-%m-%d %H:%M:%S')}")
         
-        # 更新用户消息列表为排序后的
-        self.user_messages = [msg for _, msg in user_messages_with_time]
+        logger.info("✅ 个人数据分析完成")
+    
+    def _count_incoming_interactions(self):
+        """统计其他人@和回复目标用户的次数"""
+        incoming = self._incoming
+        if incoming is None:
+            incoming = IncomingInteractionCounter(self.target_uin)
+            for msg in self.messages:
+                incoming.add(msg)
+        at_by = incoming.at_by
+        replied_by = incoming.replied_by({msg.get('messageId') for msg in self.user_messages})
+        self.at_by.update(at_by)
+        self.ated_count += sum(at_by.values())
+        self.replied_by.update(replied_by)
+        self.replied_count += sum(replied_by.values())
+    
+    def _analyze_own_messages(self):
+        """统计目标用户自己发送的消息"""
+        # user_positions 来自语料的按发送者分区，已按时间排序
+        corpus = self.corpus
+        user_messages_with_time = [
+            (corpus.datetime_at(pos), self.messages[pos], pos) for pos in self.user_positions
+        ]
         
         # 从排序后的消息中确定最早和最晚时间
         if user_messages_with_time:
             self.first_message_time = user_messages_with_time[0][0]
             self.last_message_time = user_messages_with_time[-1][0]
-            logger.info(f"📅 最早发言: {self.first_message_time.strftime('%Y-%m-%d %H:%M:%S')}")
-            logger.info(f"📅 最晚发言: {self.last_message_time.strftime('%Y-%m-%d %H:%M:%S')}")
         
-        prev_message_text = None
-        prev_sender_uin = None
-        repeat_chain = []  # 当前复读链
+        # 复读统计来自全群复读链（按群聊消息流检测，而不是只看自己的消息）
+        chains = corpus.repeat_chains()
+        target_idx = corpus.senders.get(self.target_uin)
+        self.repeat_count = chains.repeats_of(target_idx)
+        self.chain_repeat_count = chains.participation(3).get(target_idx, 0)
         
-        for i, (msg_dt, msg) in enumerate(user_messages_with_time):
+        for msg_dt, msg, pos in user_messages_with_time:
             # 基本统计
             self.total_messages += 1
             
@@ -302,11 +399,7 @@ class PersonalAnalyzer:
                 if hour >= 22 or hour < 6:
                     self.night_messages += 1
             
-            # 内容分析
-            content = msg.get('content', {})
-            text = content.get('text', '') if isinstance(content, dict) else ''
-            
-            # 提取@信息
+            # @信息与其他元素
             at_contents = []
             elements = msg.get('rawMessage', {}).get('elements', [])
             for element in elements:
@@ -341,29 +434,35 @@ class PersonalAnalyzer:
                     self.reply_count += 1
                     reply_elem = element.get('replyElement', {})
                     target_uin = reply_elem.get('senderUid')
+                    ref_msg_id = reply_ref_id(reply_elem)
                     
                     if not target_uin or target_uin == '0':
-                        ref_msg_id = reply_elem.get('sourceMsgIdInRecords') or reply_elem.get('replayMsgId')
-                        if ref_msg_id:
-                            target_uin = self.msgid_to_sender.get(ref_msg_id)
+                        target_idx = self.message_index.sender_of(ref_msg_id)
+                        if target_idx is not None:
+                            target_uin = self.message_index.senders.uin(target_idx)
                     
                     if target_uin and str(target_uin) != '0' and str(target_uin) != self.target_uin:
                         target_uin_str = str(target_uin)
                         self.reply_to[target_uin_str] += 1
                         
-                        # 计算回复间隔（需要找到被回复的消息时间）
-                        ref_msg_id = reply_elem.get('sourceMsgIdInRecords') or reply_elem.get('replayMsgId')
-                        if ref_msg_id:
-                            for prev_msg in self.messages:
-                                if prev_msg.get('messageId') == ref_msg_id:
-                                    prev_msg_dt = parse_datetime(prev_msg.get('timestamp', ''))
-                                    if prev_msg_dt and msg_dt:
-                                        interval = (msg_dt - prev_msg_dt).total_seconds()
-                                        self.reply_intervals[target_uin_str].append(interval)
-                                    break
+                        # 计算回复间隔（被回复消息的时间从共享索引中直接取得）
+                        if ref_msg_id and msg_dt:
+                            ref_ts = self.message_index.timestamp_of(ref_msg_id)
+                            if ref_ts is not None:
+                                interval = msg_dt.timestamp() - ref_ts
+                                self.reply_intervals[target_uin_str].append(interval)
             
-            # 文本处理
-            cleaned = clean_text(text, at_contents)
+            # 文本处理（清洗结果来自共享语料）
+            # 共享语料只去除 atType == 2 的 @；个人报告去除任意类型的 @，含 @ 的消息重新清洗
+            cleaned = corpus.cleaned[pos]
+            content = msg.get('content', {})
+            text = content.get('text', '') if isinstance(content, dict) else ''
+            tokens = None
+            if at_contents or '@' in text:
+                personal_cleaned = clean_text(text, at_contents)
+                if personal_cleaned != cleaned:
+                    cleaned = personal_cleaned
+                    tokens = tokenize(cleaned)
             
             # 消息类型统计（如果没有任何特殊类型，则视为纯文字）
             if not current_msg_has_emoji and not current_msg_has_image:
@@ -371,16 +470,15 @@ class PersonalAnalyzer:
                     self.message_types['text'] += 1
             
             if cleaned:
-                self.all_messages.append(cleaned)
                 self.total_chars += len(cleaned)
                 
                 # 超长消息
                 if len(cleaned) > 200:
                     self.long_messages += 1
                 
-                # 词频分析
-                words = list(jieba.cut(cleaned))
-                for word in words:
+                # 词频分析（同一次分词结果顺带统计连续重复的词）
+                prev_word = None
+                for word in (tokens if tokens is not None else corpus.tokens(pos)):
                     word = word.strip()
                     if not word:
                         continue
@@ -389,37 +487,14 @@ class PersonalAnalyzer:
                     self.word_freq[word] += 1
                     if len(self.word_samples[word]) < 3:
                         self.word_samples[word].append(cleaned)
+                    if word == prev_word:
+                        self.word_consecutive_count[word] += 1
+                    prev_word = word
             
             # 消息类型统计（如果没有任何特殊类型，则视为纯文字）
             if not current_msg_has_emoji and not current_msg_has_image:
                 if cleaned:
                     self.message_types['text'] += 1
-            
-            # 复读检测
-            if prev_message_text and cleaned and cleaned == prev_message_text:
-                self.repeat_count += 1
-            
-            # 复读链检测（需要检查前后消息）
-            if i > 0 and i < len(user_messages_with_time) - 1:
-                prev_msg = user_messages_with_time[i-1][1]
-                next_msg = user_messages_with_time[i+1][1] if i+1 < len(user_messages_with_time) else None
-                
-                prev_text = clean_text(prev_msg.get('content', {}).get('text', ''), [])
-                next_text = clean_text(next_msg.get('content', {}).get('text', ''), []) if next_msg else None
-                
-                if cleaned and prev_text and cleaned == prev_text:
-                    # 检查是否形成复读链
-                    repeat_chain.append(i)
-                    if next_text and next_text == cleaned:
-                        # 连续复读
-                        if len(repeat_chain) >= 2:
-                            self.chain_repeat_count += 1
-            
-            # 更新前一条消息文本（用于复读检测）
-            prev_message_text = cleaned if cleaned else None
-            prev_sender_uin = self.target_uin
-        
-        logger.info("✅ 个人数据分析完成")
     
     def export_json(self) -> Dict:
         """导出分析结果为JSON格式"""
@@ -580,22 +655,8 @@ class PersonalAnalyzer:
         return result
     
     def _find_consecutive_words(self) -> Optional[Dict]:
-        """查找连续出现频率最高的词"""
-        if not self.all_messages:
-            return None
-        
-        word_consecutive_count = Counter()
-        for msg_text in self.all_messages:
-            words = list(jieba.cut(msg_text))
-            prev_word = None
-            for word in words:
-                word = word.strip()
-                if not word or (self.use_stopwords and word in self.stopwords):
-                    continue
-                if word == prev_word:
-                    word_consecutive_count[word] += 1
-                prev_word = word
-        
+        """查找连续出现频率最高的词（计数在 _analyze_own_messages 的分词循环中完成）"""
+        word_consecutive_count = self.word_consecutive_count
         if word_consecutive_count:
             most_consecutive_word, count = word_consecutive_count.most_common(1)[0]
             return {
@@ -650,4 +711,3 @@ class PersonalAnalyzer:
             tags.append('群聊活跃成员')
         
         return tags
-
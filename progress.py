@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+分析进度上报
+各阶段（加载、第一轮处理、新词发现、词组合并、重新分词……）通过 ProgressTracker 报告
+已完成数量，回调收到阶段名、阶段内进度、总体进度与处理速度
+"""
+
+import time
+
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# 阶段顺序与在总体进度中的权重（大致按大群实测耗时分配）
+STAGE_WEIGHTS = (
+    ('loading', 0.20),
+    ('processing', 0.33),
+    ('single_chars', 0.05),
+    ('discovering', 0.15),
+    ('merging', 0.10),
+    ('reprocessing', 0.10),
+    ('filtering', 0.03),
+    ('contributors', 0.02),
+    ('exporting', 0.02),
+)
+
+_STAGE_OFFSETS = {}
+_offset = 0.0
+for _stage, _weight in STAGE_WEIGHTS:
+    _STAGE_OFFSETS[_stage] = (_offset, _weight)
+    _offset += _weight
+del _stage, _weight, _offset
+
+
+class ProgressTracker:
+    """
+    进度跟踪器
+
+    callback(event) 中的 event 为 dict：
+        stage      阶段名（见 STAGE_WEIGHTS，未登记的阶段不计入总体进度）
+        fraction   阶段内进度 0~1（总量未知时为 None）
+        progress   总体进度 0~1
+        done/total 阶段内已完成数量 / 总量
+        rate       阶段内处理速度（每秒完成数量，loading 阶段为字节）
+        elapsed    阶段已用时（秒）
+
+    同一阶段内的回调按 min_interval 节流；阶段开始和结束时总会回调，
+    结束时记录阶段耗时日志。未设置回调时只记录耗时。
+    """
+
+    def __init__(self, callback=None, min_interval=0.5):
+        self.callback = callback
+        self.min_interval = min_interval
+        self.stage = None
+        self.total = None
+        self.done = 0
+        self._stage_started = 0.0
+        self._last_emit = 0.0
+        self._progress = 0.0
+
+    def start(self, stage, total=None):
+        """开始新阶段（自动结束上一阶段）"""
+        if self.stage is not None:
+            self.finish()
+        self.stage = stage
+        self.total = total
+        self.done = 0
+        self._stage_started = time.monotonic()
+        self._emit()
+
+    def update(self, done, total=None):
+        """报告阶段内已完成数量；热循环中可每处理一批调用一次"""
+        self.done = done
+        if total is not None:
+            self.total = total
+        if self.callback is not None and time.monotonic() - self._last_emit >= self.min_interval:
+            self._emit()
+
+    def finish(self):
+        """结束当前阶段"""
+        if self.stage is None:
+            return
+        if self.total is not None:
+            self.done = self.total
+        elapsed = time.monotonic() - self._stage_started
+        rate = self.done / elapsed if elapsed > 0 and self.done else None
+        logger.debug(f"⏱️ 阶段 {self.stage} 用时 {elapsed:.2f}s"
+                     + (f"，{self.done} 项，{rate:.0f}/秒" if rate else ""))
+        self._emit(finished=True)
+        self.stage = None
+
+    def _emit(self, finished=False):
+        self._last_emit = time.monotonic()
+        if self.callback is None:
+            return
+        elapsed = self._last_emit - self._stage_started
+        if finished:
+            fraction = 1.0
+        elif self.total:
+            fraction = min(self.done / self.total, 1.0)
+        else:
+            fraction = None
+        offset, weight = _STAGE_OFFSETS.get(self.stage, (None, 0.0))
+        if offset is not None:
+            # 总体进度只增不减（跳过的阶段直接计为完成）
+            self._progress = max(self._progress, offset + weight * (fraction or 0.0))
+        event = {
+            'stage': self.stage,
+            'fraction': round(fraction, 4) if fraction is not None else None,
+            'progress': round(self._progress, 4),
+            'done': self.done,
+            'total': self.total,
+            'rate': round(self.done / elapsed, 1) if elapsed > 0 else None,
+            'elapsed': round(elapsed, 2),
+        }
+        try:
+            self.callback(event)
+        except Exception as e:
+            logger.warning(f"⚠️ 进度回调出错: {e}")
+
+
+def as_tracker(progress):
+    """接受 ProgressTracker、回调函数或 None，统一返回 ProgressTracker"""
+    if isinstance(progress, ProgressTracker):
+        return progress
+    return ProgressTracker(progress)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+有界内存的频次统计结构
+用于大群聊中只需要 Top-K 结果的场景（例如热词贡献者）
+"""
+
+import heapq
+from collections import Counter
+from itertools import count as _count
+
+
+class SpaceSavingCounter:
+    """
+    Space-Saving 重头项（heavy hitter）计数器
+
+    最多保留 capacity 个键。当计数器已满且出现新键时，淘汰当前计数最小的键，
+    新键继承其计数并记录为误差。对于总计数为 N 的数据流：
+        - 任何真实频次 > N / capacity 的键一定会被保留
+        - 估计值 count(key) 满足 真实值 <= count(key) <= 真实值 + error(key)
+        - error(key) <= N / capacity
+
+    最小计数键用懒删除的小顶堆查找：每次计数变化压入新条目，旧条目在出堆时跳过，
+    堆长度超过 capacity 的数倍时按当前计数重建，单次操作均摊 O(log capacity)。
+    """
+
+    __slots__ = ('capacity', 'total', '_counts', '_errors', '_heap', '_tick')
+
+    def __init__(self, capacity=50):
+        if capacity < 1:
+            raise ValueError("capacity 必须为正整数")
+        self.capacity = capacity
+        self.total = 0
+        self._counts = {}
+        self._errors = {}
+        # (计数, 序号, 键)：序号保证计数相同时不比较键本身
+        self._heap = []
+        self._tick = _count()
+
+    def add(self, key, count=1):
+        """累加 key 的计数"""
+        self.total += count
+        counts = self._counts
+        if key in counts:
+            counts[key] += count
+        elif len(counts) < self.capacity:
+            counts[key] = count
+        else:
+            # 已满：用新键替换计数最小的键
+            min_key, min_count = self._pop_min()
+            del counts[min_key]
+            self._errors.pop(min_key, None)
+            counts[key] = min_count + count
+            self._errors[key] = min_count
+        self._push(key, counts[key])
+
+    def _push(self, key, value):
+        heap = self._heap
+        heapq.heappush(heap, (value, next(self._tick), key))
+        if len(heap) > 4 * self.capacity + 64:
+            # 过期条目太多，按当前计数重建
+            self._heap = [(c, next(self._tick), k) for k, c in self._counts.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self):
+        """弹出当前计数最小的键（跳过计数已变化或已淘汰的过期条目）"""
+        heap = self._heap
+        counts = self._counts
+        while True:
+            value, _, key = heapq.heappop(heap)
+            if counts.get(key) == value:
+                return key, value
+
+    def _min_count(self):
+        heap = self._heap
+        counts = self._counts
+        while counts.get(heap[0][2]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0][0]
+
+    def get(self, key, default=0):
+        return self._counts.get(key, default)
+
+    def error(self, key):
+        """返回 key 的最大高估量（未被追踪的键返回当前误差上界）"""
+        if key in self._counts:
+            return self._errors.get(key, 0)
+        return self.error_bound()
+
+    def error_bound(self):
+        """
+        所有估计值的全局误差上界：未满时为 0，已满时为当前最小计数 m
+        （任何键的高估量都不超过 m，且 m <= N / capacity）
+        """
+        if len(self._counts) < self.capacity:
+            return 0
+        return self._min_count()
+
+    def most_common(self, n=None):
+        """与 Counter.most_common 相同的返回格式"""
+        return Counter(self._counts).most_common(n)
+
+    def items(self):
+        return self._counts.items()
+
+    def __getitem__(self, key):
+        return self._counts.get(key, 0)
+
+    def __contains__(self, key):
+        return key in self._counts
+
+    def __len__(self):
+        return len(self._counts)
+
+    def __iter__(self):
+        return iter(self._counts)
+
+    def __repr__(self):
+        return f"SpaceSavingCounter(capacity={self.capacity}, total={self.total}, tracked={len(self._counts)})"
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+测试公共配置
+- 仓库根目录加入 sys.path，测试直接导入顶层模块
+- 没有 config.py 时以 config.example.py 作为 config 模块
+- 日志写到临时目录，不在仓库中生成 runtime_outputs
+"""
+
+import importlib.util
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURES = Path(__file__).resolve().parent / 'fixtures'
+
+sys.path.insert(0, str(ROOT))
+
+try:
+    import config  # noqa: F401
+except ImportError:
+    spec = importlib.util.spec_from_file_location('config', ROOT / 'config.example.py')
+    config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(config)
+    sys.modules['config'] = config
+
+from logger import LoggerManager  # noqa: E402
+
+LoggerManager.setup(log_dir=os.path.join(tempfile.gettempdir(), 'qq-chat-analyzer-test-logs'))
+
+
+def require_jieba():
+    """分词相关模块（corpus / analyzer 等）依赖 jieba 或 jieba_fast，均未安装时跳过"""
+    for name in ('jieba_fast', 'jieba'):
+        try:
+            __import__(name)
+            return
+        except ImportError:
+            continue
+    pytest.skip('需要 jieba 或 jieba_fast', allow_module_level=True)
+
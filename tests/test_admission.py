@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""MemoryAdmission 的排队登记、准入与归还"""
+
+import pytest
+
+from backend.admission import (
+    BASE_BYTES, BYTES_FACTOR, MB, PERSONAL_BASE_BYTES, AdmissionRejected, MemoryAdmission,
+    estimate_memory, estimate_personal_memory,
+)
+
+
+def test_estimates():
+    assert estimate_memory() == BASE_BYTES
+    assert estimate_memory(10 * MB) == BASE_BYTES + 10 * MB * BYTES_FACTOR
+    assert estimate_personal_memory(10 * MB) == PERSONAL_BASE_BYTES + 10 * MB
+
+
+def test_reserve_rejects_oversized_and_too_many_waiting():
+    admission = MemoryAdmission(100 * MB, max_waiting=2)
+    with pytest.raises(AdmissionRejected):
+        admission.reserve(101 * MB)
+    admission.reserve(10 * MB)
+    admission.reserve(10 * MB)
+    with pytest.raises(AdmissionRejected):
+        admission.reserve(10 * MB)
+    # 批量任务不受排队数量限制
+    admission.reserve(10 * MB, limit_waiting=False)
+    admission.cancel()
+    stats = admission.stats()
+    assert stats['waiting'] == 2
+    assert stats['rejected'] == 2
+    assert admission.fits_budget(100 * MB) and not admission.fits_budget(100 * MB + 1)
+
+
+def test_try_acquire_and_release():
+    admission = MemoryAdmission(100 * MB)
+    admission.reserve(60 * MB)
+    admission.reserve(60 * MB)
+    assert admission.try_acquire(60 * MB)
+    # 预算不足时不阻塞，任务仍在排队
+    assert not admission.try_acquire(60 * MB)
+    assert admission.stats() == {'budget_mb': 100, 'reserved_mb': 60, 'running': 1, 'waiting': 1, 'rejected': 0}
+    admission.release(60 * MB)
+    assert admission.try_acquire(60 * MB)
+    assert admission.stats()['waiting'] == 0
+    admission.release(60 * MB)
+    assert admission.stats()['reserved_mb'] == 0
+
+
+def test_always_admits_when_idle():
+    admission = MemoryAdmission(100 * MB)
+    assert admission.try_acquire(150 * MB, queued=False)
+    assert not admission.try_acquire(1, queued=False)
+    admission.release(150 * MB)
+    assert admission.stats()['running'] == 0
+    assert admission.stats()['waiting'] == 0
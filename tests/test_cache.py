@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""LRUCache / ResultCache 的淘汰和磁盘回退、分析结果去重缓存与 ReportPayloadCache 的 ETag"""
+
+import json
+
+from backend.cache import AnalysisResultCache, LRUCache, ReportPayloadCache, ResultCache, etag_matches
+
+
+def test_lru_evicts_by_count_and_bytes():
+    cache = LRUCache(max_items=2, max_bytes=100)
+    cache.set('a', 1, 10)
+    cache.set('b', 2, 10)
+    assert cache.get('a') == 1  # a 变为最近使用
+    cache.set('c', 3, 10)
+    assert 'b' not in cache and 'a' in cache and 'c' in cache
+
+    cache.set('d', 4, 95)
+    assert list(cache._data) == ['d']
+    assert cache.stats()['bytes'] == 95
+
+    # 超过总上限的条目不缓存
+    cache.set('e', 5, 101)
+    assert 'e' not in cache
+    assert cache.pop('d') == 4
+    assert cache.stats() == {'items': 0, 'bytes': 0, 'hits': 1, 'misses': 0}
+
+
+def test_lru_replace_updates_size():
+    cache = LRUCache(max_items=4, max_bytes=100)
+    cache.set('a', 1, 60)
+    cache.set('a', 2, 30)
+    cache.set('b', 3, 60)
+    assert cache.get('a') == 2 and cache.get('b') == 3
+    assert cache.stats()['bytes'] == 90
+
+
+def test_result_cache_falls_back_to_disk(tmp_path):
+    cache = ResultCache(tmp_path, max_items=1)
+    cache.set(('k', 1), {'v': 1})
+    cache.set(('k', 2), {'v': 2})
+    assert ('k', 1) not in cache.memory
+    assert cache.get(('k', 1)) == {'v': 1}
+    assert ('k', 1) in cache.memory
+
+    # 新实例（其他服务进程）直接读磁盘
+    assert ResultCache(tmp_path).get(('k', 2)) == {'v': 2}
+    cache.delete(('k', 2))
+    assert cache.get(('k', 2)) is None
+
+    # 损坏的缓存文件被忽略
+    cache._path(('bad',)).write_text('{', encoding='utf-8')
+    assert cache.get(('bad',)) is None
+
+
+def test_analysis_result_cache_key_normalization(tmp_path):
+    cache = AnalysisResultCache(tmp_path)
+    cache.set('hash', None, '2024-01-01', 1, 'v1', {'ok': True})
+    assert cache.get('hash', '', '2024-01-01', True, 'v1') == {'ok': True}
+    assert cache.get('hash', '', '2024-01-01', False, 'v1') is None
+    assert cache.get('hash', '', '2024-01-01', True, 'v2') is None
+
+
+def test_report_payload_etag():
+    cache = ReportPayloadCache(max_items=4)
+    body = json.dumps({'id': 'r1', 'data': [1, 2, 3]})
+    stored = cache.set('r1', 'v1', body)
+    assert stored == (body, ReportPayloadCache.make_etag(body))
+    assert cache.get('r1', 'v1') == stored
+    # 版本变化后旧条目不再命中
+    assert cache.get('r1', 'v2') is None
+
+    same = cache.set('r2', 'v1', body)
+    changed = cache.set('r1', 'v2', body + ' ')
+    assert same[1] == stored[1]
+    assert changed[1] != stored[1]
+
+    cache.invalidate('r1', 'v1')
+    assert cache.get('r1', 'v1') is None
+    assert cache.stats()['redis'] is False
+
+
+def test_etag_matches_if_none_match():
+    etag = ReportPayloadCache.make_etag('body')
+    assert etag_matches(f'"{etag}"', etag)
+    assert etag_matches(f'"other", W/"{etag}"', etag)
+    assert etag_matches('*', etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('', etag)
+    assert not etag_matches('"other"', etag)
+    # 不带引号的值不是合法的实体标签
+    assert not etag_matches(etag, etag)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""语料索引结构：SenderRegistry、MessageIndex 与 RepeatChains"""
+
+import pytest
+
+from conftest import require_jieba
+
+require_jieba()
+
+from corpus import MessageCorpus, MessageIndex, RepeatChains, SenderRegistry  # noqa: E402
+
+
+def _msg(msg_id, uin, text, ts='2024-01-01T00:00:00.000Z', sub_type=0):
+    return {
+        'messageId': msg_id,
+        'timestamp': ts,
+        'sender': {'uin': uin},
+        'content': {'text': text},
+        'rawMessage': {'subMsgType': sub_type, 'elements': []},
+    }
+
+
+def test_sender_registry_interns_str_and_int():
+    registry = SenderRegistry([10001, '10002'])
+    assert registry.intern('10001') == 0
+    assert registry.intern(10002) == 1
+    assert registry.intern(10003) == 2
+    assert registry.get(10003) == 2
+    assert registry.get('99999') is None
+    assert registry.get(None, -1) == -1
+    assert 10001 in registry and None not in registry
+    assert registry.uin(1) == '10002'
+    assert list(registry) == ['10001', '10002', '10003']
+    assert len(registry) == 3
+
+
+def test_message_index_lookup():
+    messages = [
+        _msg('300', 1, 'a', '2024-01-01T00:00:03.000Z'),
+        _msg('100', 2, 'b', '2024-01-01T00:00:01.000Z'),
+        _msg('abc', 3, 'c', '2024-01-01T00:00:02.000Z'),
+        _msg('200', 4, 'bot', 'invalid', sub_type=577),
+        _msg('100', 5, 'dup', '2024-01-01T00:00:05.000Z'),
+        {'messageId': '400', 'sender': {}},
+    ]
+    index = MessageIndex(messages)
+    senders = index.senders
+    assert len(index) == 5
+    assert index.sender_of('300') == senders.get(1)
+    # 重复 ID 保留最后出现的消息
+    assert index.sender_of('100') == senders.get(5)
+    assert index.timestamp_of('100') == pytest.approx(1704067205.0)
+    assert index.sender_of('abc') == senders.get(3)
+    assert index.sender_of('200') == senders.get(4)
+    assert index.sender_of('200', include_bots=False) is None
+    assert index.timestamp_of('200') is None
+    assert index.sender_of('400') is None
+    assert index.sender_of('') is None
+    assert 'abc' in index and '999' not in index
+
+
+def test_repeat_chains_streaming():
+    chains = RepeatChains(None, min_chars=2)
+    stream = [
+        (0, 0, '哈哈哈'), (1, 1, '哈哈哈'), (2, 1, '哈哈哈'), (3, 2, '哈哈哈'),
+        (4, 0, '别复读'), (5, 3, '好'), (6, 4, '好'),
+        (7, 1, '+1'), (8, 2, '+1'),
+    ]
+    for pos, sender_idx, text in stream:
+        chains.feed(pos, sender_idx, text)
+    chains.close()
+
+    # 单字消息不构成复读链；同一发送者连续发送不计复读
+    assert list(chains.starts) == [0, 7]
+    assert list(chains.lengths) == [4, 2]
+    assert chains.participants == [(0, 1, 2), (1, 2)]
+    assert chains.repeat_counts() == {1: 1, 2: 2}
+    assert chains.repeats_of(0) == 0
+    assert chains.participation(3) == {0: 1, 1: 1, 2: 1}
+    assert chains.participation(2) == {0: 1, 1: 2, 2: 2}
+    assert len(chains) == 2
+
+
+def test_corpus_repeat_chains_match_streaming():
+    messages = [_msg(str(i), uin, text) for i, (uin, text) in enumerate(
+        [(1, '早上好'), (2, '早上好'), (3, '早上好'), (3, '中午'), (1, '中午')])]
+    corpus = MessageCorpus(messages)
+    chains = corpus.repeat_chains()
+    assert list(chains.starts) == [0, 3]
+    assert chains.participants == [(0, 1, 2), (2, 0)]
+    assert corpus.cache_tokens is False
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""导出文件的解压读取（gzip / zstd / zip）与解压大小上限"""
+
+import gzip
+import io
+import json
+import zipfile
+
+import pytest
+
+from conftest import FIXTURES
+from utils import ExportTooLarge, export_content_size, iter_messages, load_json, open_export
+
+_UTF8_BOM = b'\xef\xbb\xbf'
+
+
+class _WriteOnly:
+    """不可回退的写入流：zipfile 写入时改用数据描述符记录大小（与边压缩边上传的工具一致）"""
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def write(self, data):
+        return self.buffer.write(data)
+
+    def flush(self):
+        pass
+
+
+def _zip_bytes(payload, force_zip64=False, streamed=False):
+    target = _WriteOnly() if streamed else io.BytesIO()
+    with zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('__MACOSX/._chat.json', b'junk')
+        with archive.open('chat.json', 'w', force_zip64=force_zip64) as entry:
+            entry.write(payload)
+    return (target.buffer if streamed else target).getvalue()
+
+
+def _zstd_bytes(payload):
+    zstandard = pytest.importorskip('zstandard')
+    # 写入多帧且后一帧不在帧头记录内容大小，与流式压缩工具的输出一致
+    half = len(payload) // 2
+    return (zstandard.ZstdCompressor().compress(payload[:half]) +
+            zstandard.ZstdCompressor(write_content_size=False).compress(payload[half:]))
+
+
+ENCODINGS = {
+    'plain': lambda data: data,
+    'bom': lambda data: _UTF8_BOM + data,
+    'gzip': gzip.compress,
+    'zstd': _zstd_bytes,
+    'zip': _zip_bytes,
+    'zip-descriptor': lambda data: _zip_bytes(data, streamed=True),
+    'zip64-descriptor': lambda data: _zip_bytes(data, force_zip64=True, streamed=True),
+}
+
+
+@pytest.fixture(scope='module')
+def payload():
+    return (FIXTURES / 'chat_export.json').read_bytes()
+
+
+@pytest.fixture(params=sorted(ENCODINGS))
+def export_file(request, tmp_path, payload):
+    encoded = ENCODINGS[request.param](payload)
+    path = tmp_path / 'export.bin'
+    path.write_bytes(encoded)
+    return request.param, path, encoded
+
+
+def test_open_export_decodes(export_file, payload):
+    encoding, path, encoded = export_file
+    with open_export(str(path), max_bytes=0) as (stream, raw):
+        assert stream.read() == payload
+    # zip 由 zipfile 按中央目录读取，不经过原始字节计数
+    if not encoding.startswith('zip'):
+        assert raw.bytes_read == len(encoded)
+
+
+def test_load_json(export_file, payload):
+    _, path, _ = export_file
+    data = load_json(str(path), max_bytes=0)
+    expected = json.loads(payload)
+    assert data['chatInfo']['name'] == expected['chatInfo']['name']
+    assert [m['messageId'] for m in data['messages']] == [m['messageId'] for m in expected['messages']]
+
+
+def test_iter_messages(export_file, payload):
+    pytest.importorskip('ijson')
+    _, path, _ = export_file
+    chat_info = {}
+    ids = [m['messageId'] for m in iter_messages(str(path), chat_info, max_bytes=0)]
+    assert ids == [m['messageId'] for m in json.loads(payload)['messages']]
+    assert chat_info['name'] == '测试群'
+
+
+def test_decompressed_size_cap(export_file, payload):
+    _, path, _ = export_file
+    limit = len(payload) // 2
+    with pytest.raises(ExportTooLarge) as excinfo:
+        with open_export(str(path), max_bytes=limit) as (stream, _):
+            stream.read()
+    assert excinfo.value.limit == limit
+    # 超出上限时不回退到标准加载
+    with pytest.raises(ExportTooLarge):
+        load_json(str(path), max_bytes=limit)
+    with pytest.raises(ExportTooLarge):
+        list(iter_messages(str(path), max_bytes=limit))
+    with open_export(str(path), max_bytes=len(payload) + len(_UTF8_BOM)) as (stream, _):
+        assert stream.read() == payload
+
+
+def test_compression_bomb_is_stopped_early(tmp_path):
+    path = tmp_path / 'bomb.json.gz'
+    path.write_bytes(gzip.compress(b'[' + b' ' * (64 * 1024 * 1024) + b']'))
+    with pytest.raises(ExportTooLarge):
+        with open_export(str(path), max_bytes=1024 * 1024) as (stream, _):
+            while stream.read(64 * 1024):
+                pass
+
+
+@pytest.mark.parametrize('encoding', ['plain', 'gzip', 'zip', 'zip-descriptor'])
+def test_export_content_size(tmp_path, payload, encoding):
+    path = tmp_path / 'export.bin'
+    path.write_bytes(ENCODINGS[encoding](payload))
+    assert export_content_size(str(path)) == len(payload)
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""TempJanitor 按保留时长、目录大小上限清理与 hold 保护"""
+
+import os
+import time
+
+from backend.janitor import TempJanitor
+
+
+def _write(path, size, age):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b'x' * size)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_ttl_removes_expired_files(tmp_path):
+    old = _write(tmp_path / 'old.json', 10, age=7200)
+    nested = _write(tmp_path / 'sub' / 'old.json', 10, age=7200)
+    fresh = _write(tmp_path / 'fresh.json', 10, age=10)
+    janitor = TempJanitor(interval=60, protect=0)
+    janitor.add(tmp_path, ttl=3600)
+
+    assert janitor.sweep() == {'files_removed': 2, 'bytes_reclaimed': 20}
+    assert not old.exists() and not nested.exists() and fresh.exists()
+    stats = janitor.stats()
+    assert stats['files_removed'] == 2
+    assert stats['directories'][tmp_path.name] == {'files': 1, 'bytes': 10, 'max_bytes': 0}
+
+
+def test_size_cap_removes_oldest_outside_protect(tmp_path):
+    files = [_write(tmp_path / f'{i}.json', 100, age=age)
+             for i, age in enumerate([5000, 4000, 3000, 10])]
+    janitor = TempJanitor(interval=60, protect=600)
+    janitor.add(tmp_path, ttl=0, max_bytes=250)
+
+    janitor.sweep()
+    # 先删最旧的；最近写入（protect 内）的文件不因大小上限删除
+    assert [f.exists() for f in files] == [False, False, True, True]
+    assert janitor.usage[str(tmp_path)] == {'files': 2, 'bytes': 200}
+
+    _write(tmp_path / 'new.json', 100, age=0)
+    janitor.sweep()
+    assert not files[2].exists()
+    assert janitor.usage[str(tmp_path)] == {'files': 2, 'bytes': 200}
+
+    # 剩余文件都在 protect 内时允许暂时超出上限
+    _write(tmp_path / 'newer.json', 100, age=0)
+    janitor.sweep()
+    assert janitor.usage[str(tmp_path)] == {'files': 3, 'bytes': 300}
+
+
+def test_protect_is_at_least_two_intervals():
+    assert TempJanitor(interval=600, protect=60).protect == 1200
+
+
+def test_held_files_survive_until_released(tmp_path):
+    held = _write(tmp_path / 'queued.json', 10, age=7200)
+    janitor = TempJanitor(interval=60, protect=0)
+    janitor.add(tmp_path, ttl=3600)
+
+    janitor.hold(str(held))
+    janitor.sweep()
+    assert held.exists()
+    # 修改时间已更新，其他进程的清理器同样视其为最近写入
+    assert time.time() - held.stat().st_mtime < 60
+
+    janitor.release(str(held))
+    os.utime(held, (time.time() - 7200, time.time() - 7200))
+    janitor.sweep()
+    assert not held.exists()
+
+
+def test_hold_of_missing_file_is_dropped(tmp_path):
+    janitor = TempJanitor()
+    janitor.hold(str(tmp_path / 'gone.json'))
+    janitor.sweep()
+    assert not janitor._held
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""JobManager 的分组轮转、批量状态、遗留任务回收与内存准入调度"""
+
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend.admission import MB, MemoryAdmission
+from backend.jobs import DONE, FAILED, QUEUED, RUNNING, JobManager, create_job_store, worker_alive
+
+
+@pytest.fixture
+def make_manager(tmp_path):
+    managers = []
+
+    def make(max_workers=1, admission=None):
+        manager = JobManager(create_job_store(str(tmp_path / 'jobs.sqlite3')),
+                             max_workers=max_workers, admission=admission)
+        # 分析子进程需要 jieba 等依赖，测试中用线程池代替进程池执行任务函数
+        manager._processes = ThreadPoolExecutor(max_workers=max_workers)
+        managers.append(manager)
+        return manager
+
+    yield make
+    for manager in managers:
+        manager._threads.shutdown(wait=True)
+        manager._processes.shutdown(wait=True)
+
+
+def _wait(predicate, timeout=10):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, '等待任务状态超时'
+        time.sleep(0.01)
+
+
+def _finished(manager, job_id):
+    return manager.get(job_id)['status'] in (DONE, FAILED)
+
+
+def _task(log, tag, gate=None):
+    def run(progress=None):
+        log.append(tag)
+        if gate is not None:
+            assert gate.wait(10)
+        return {'tag': tag}
+    return run
+
+
+def test_cached_result_and_failure(make_manager):
+    manager = make_manager()
+    job_id = manager.submit('upload', None, owner='u', cached_result={'x': 5},
+                            on_complete=lambda result: {'n': result['x']})
+    _wait(lambda: _finished(manager, job_id))
+    job = manager.get(job_id)
+    assert (job['status'], job['result'], job['owner']) == (DONE, {'n': 5}, 'u')
+
+    errors = []
+
+    def boom(progress=None):
+        raise ValueError('bad export')
+
+    job_id = manager.submit('upload', boom, on_error=errors.append)
+    _wait(lambda: _finished(manager, job_id))
+    job = manager.get(job_id)
+    assert (job['status'], job['error']) == (FAILED, 'bad export')
+    assert [str(e) for e in errors] == ['bad export']
+
+
+def test_groups_take_turns(make_manager):
+    manager = make_manager(max_workers=1)
+    order = []
+    gate = threading.Event()
+    batch = [manager.submit('upload', _task(order, 'b0', gate), group='batch-1')]
+    batch += [manager.submit('upload', _task(order, f'b{i}'), group='batch-1') for i in range(1, 4)]
+    single = manager.submit('upload', _task(order, 'single'))
+    gate.set()
+    _wait(lambda: all(_finished(manager, job_id) for job_id in batch + [single]))
+    # 单个上传排在批量任务的下一个子任务之后执行，不等整个批量任务结束
+    assert order == ['b0', 'b1', 'single', 'b2', 'b3']
+
+
+def test_batch_status(make_manager):
+    manager = make_manager(max_workers=2)
+    gate = threading.Event()
+    log = []
+    job_ids = [manager.submit('upload', _task(log, i, gate), group='batch-1') for i in range(2)]
+    items = [{'filename': f'{i}.json', 'job_id': job_id} for i, job_id in enumerate(job_ids)]
+    items.append({'filename': 'bad.json', 'job_id': None, 'error': '格式错误'})
+    manager.create_batch('batch-1', 'u', items)
+
+    batch = manager.get_batch('batch-1')
+    assert batch['status'] == RUNNING
+    assert batch['total'] == 3
+    assert batch['counts'][FAILED] == 1
+
+    gate.set()
+    _wait(lambda: manager.get_batch('batch-1')['status'] == DONE)
+    batch = manager.get_batch('batch-1')
+    assert batch['counts'] == {DONE: 2, FAILED: 1}
+    assert batch['progress'] == 1.0
+    assert [item['result'] for item in batch['items'][:2]] == [{'tag': 0}, {'tag': 1}]
+    assert batch['items'][2]['error'] == '格式错误'
+    assert manager.get_batch(job_ids[0]) is None
+
+
+def test_batch_row_finishes_and_is_purged(make_manager):
+    manager = make_manager(max_workers=2)
+    gate = threading.Event()
+    job_ids = [manager.submit('upload', _task([], i, gate), group='batch-1') for i in range(2)]
+    manager.create_batch('batch-1', 'u', [{'filename': f'{i}.json', 'job_id': job_id}
+                                          for i, job_id in enumerate(job_ids)])
+    assert manager.store.get('batch-1')['status'] == RUNNING
+
+    # 不查询批量状态，最后一个子任务结束时批量任务记录也变为已完成
+    gate.set()
+    _wait(lambda: manager.store.get('batch-1')['status'] == DONE)
+    assert manager.store.purge(time.time() + 1) == 3
+    assert manager.get_batch('batch-1') is None
+
+    # 子任务都未能提交时登记即完成
+    manager.create_batch('batch-2', 'u', [{'filename': 'bad.json', 'job_id': None, 'error': '格式错误'}])
+    assert manager.store.get('batch-2')['status'] == DONE
+
+
+def test_reap_orphans(make_manager):
+    manager = make_manager()
+    store = manager.store
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    dead = f"{socket.gethostname()}:{process.pid}:deadbeef"
+    other_host = f"other-{socket.gethostname()}:{process.pid}:deadbeef"
+
+    for job_id, kind, worker, status in [
+        ('dead-queued', 'upload', dead, QUEUED),
+        ('dead-running', 'upload', dead, RUNNING),
+        ('dead-done', 'upload', dead, DONE),
+        ('dead-batch', 'batch', dead, RUNNING),
+        ('remote', 'upload', other_host, RUNNING),
+        ('alive', 'upload', None, RUNNING),
+    ]:
+        store.create(job_id, kind)
+        if worker is not None:
+            store.update(job_id, worker=worker, status=status)
+        else:
+            store.update(job_id, status=status)
+
+    assert not worker_alive(dead)
+    assert worker_alive(other_host)
+    assert worker_alive(store.get('alive')['worker'])
+
+    assert manager.reap_orphans() == 2
+    # 所属服务进程已退出的批量任务按子任务汇总（没有子任务时即为已完成）
+    statuses = {job_id: store.get(job_id)['status'] for job_id in
+                ('dead-queued', 'dead-running', 'dead-done', 'dead-batch', 'remote', 'alive')}
+    assert statuses == {'dead-queued': FAILED, 'dead-running': FAILED, 'dead-done': DONE,
+                        'dead-batch': DONE, 'remote': RUNNING, 'alive': RUNNING}
+    assert manager.reap_orphans() == 0
+
+
+def test_dispatch_waits_for_memory_budget(make_manager):
+    admission = MemoryAdmission(100 * MB, max_waiting=4)
+    manager = make_manager(max_workers=2, admission=admission)
+    log = []
+    gate = threading.Event()
+    first = manager.submit('upload', _task(log, 'first', gate), memory=60 * MB)
+    second = manager.submit('upload', _task(log, 'second'), memory=60 * MB)
+    # 无需准入的任务（命中缓存）不被内存不足的任务阻塞
+    cached = manager.submit('upload', None, cached_result={'cached': True})
+
+    _wait(lambda: _finished(manager, cached))
+    assert manager.get(second)['status'] == QUEUED
+    assert manager.get(second)['stage'] == 'waiting_memory'
+    assert log == ['first']
+    assert admission.stats()['running'] == 1
+
+    gate.set()
+    _wait(lambda: _finished(manager, first) and _finished(manager, second))
+    assert log == ['first', 'second']
+    assert manager.get(second)['status'] == DONE
+    assert admission.stats() == {'budget_mb': 100, 'reserved_mb': 0, 'running': 0, 'waiting': 0, 'rejected': 0}
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""NameIndex 精确查找、模糊查找与序列化"""
+
+from name_index import NameIndex, normalize_name
+
+
+def _index():
+    return NameIndex(
+        {'1': '小明', '2': '小明同学', '3': 'Alice', '4': '张三'},
+        uin_history={'4': ['张三', '法外狂徒'], '1': ['小明']},
+        weights={'1': 10, '2': 50, '3': 5, '4': 1},
+    )
+
+
+def test_normalize_name():
+    assert normalize_name(' Ａｌｉｃｅ ') == 'alice'
+
+
+def test_exact_prefers_current_then_history():
+    index = _index()
+    assert index.exact('小明') == '1'
+    assert index.exact('alice') == '3'
+    assert index.exact('法外狂徒') == '4'
+    assert index.exact('不存在') is None
+
+
+def test_search_ranks_exact_first():
+    results = _index().search('小明', limit=5)
+    assert [r['uin'] for r in results[:2]] == ['1', '2']
+    assert results[0]['score'] == 1.0
+    assert results[1]['contains'] is True
+    assert 0.5 < results[1]['score'] < 1.0
+
+
+def test_resolve_and_did_you_mean():
+    index = _index()
+    assert index.resolve('狂徒') == '4'
+    assert index.resolve('ALICE') == '3'
+    assert index.resolve('完全无关') is None
+    assert index.did_you_mean('小明同', limit=1) == ['小明同学']
+
+
+def test_single_char_query_matches_middle():
+    results = _index().search('外', limit=5)
+    assert [r['uin'] for r in results] == ['4']
+
+
+def test_round_trip():
+    index = _index()
+    restored = NameIndex.from_dict(index.to_dict())
+    assert len(restored) == len(index)
+    assert restored.resolve('法外狂徒') == '4'
+    assert restored.search('小明') == index.search('小明')
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+个人报告中其他成员@和回复目标用户的统计
+
+fixtures/personal_incoming_baseline.json 由改用互动图之前的 PersonalAnalyzer 对 fixtures/chat_export.json
+逐个成员生成，格式为 {uin: {name, at_by: [[uin, 次数], ...], replied_by: [...]}}；
+全量加载与流式读取两种方式的结果都需与其完全一致（含成员顺序）
+"""
+
+import json
+
+import pytest
+
+from conftest import FIXTURES, require_jieba
+
+require_jieba()
+
+from personal_analyzer import IncomingInteractionCounter, PersonalAnalyzer  # noqa: E402
+from utils import load_json  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def golden():
+    with open(FIXTURES / 'personal_incoming_baseline.json', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _incoming(analyzer):
+    analyzer.analyze()
+    assert analyzer.ated_count == sum(analyzer.at_by.values())
+    assert analyzer.replied_count == sum(analyzer.replied_by.values())
+    return [list(item) for item in analyzer.at_by.items()], [list(item) for item in analyzer.replied_by.items()]
+
+
+@pytest.mark.parametrize('streamed', [False, True])
+def test_incoming_counts_match_baseline(golden, streamed):
+    path = str(FIXTURES / 'chat_export.json')
+    data = None if streamed else load_json(path)
+    for uin, expected in golden.items():
+        if streamed:
+            analyzer = PersonalAnalyzer.from_file(path, expected['name'])
+        else:
+            analyzer = PersonalAnalyzer(data, expected['name'])
+        assert analyzer.target_uin == uin
+        assert _incoming(analyzer) == (expected['at_by'], expected['replied_by']), uin
+
+
+def _msg(msg_id, uin, *elements):
+    return {'messageId': msg_id, 'sender': {'uin': uin}, 'rawMessage': {'elements': list(elements)}}
+
+
+def _at(uin, at_type=0):
+    return {'elementType': 1, 'textElement': {'atUid': uin, 'atType': at_type}}
+
+
+def _reply(ref_msg_id, sender_uid=None):
+    return {'elementType': 7, 'replyElement': {'sourceMsgIdInRecords': ref_msg_id, 'senderUid': sender_uid}}
+
+
+def test_incoming_matching_rules():
+    counter = IncomingInteractionCounter('1')
+    for msg in [
+        _msg('m1', '1', _at('1'), _reply('m1')),  # 自己的消息不计
+        _msg('m2', '2', _at('1'), _at('1', at_type=2)),  # atType 为 0 时同样计入
+        _msg('m3', '3', _reply('m1', sender_uid='9')),  # 按被回复的消息判断，不看 senderUid
+        _msg('m4', '2', _reply('m2', sender_uid='1')),  # 被回复的不是目标用户的消息
+        _msg('m5', '', _at('1')),  # 没有发送者
+    ]:
+        counter.add(msg)
+    assert counter.at_by == {'2': 2}
+    assert counter.replied_by({'m1'}) == {'3': 1}
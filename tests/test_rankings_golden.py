@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+趣味榜单的黄金数据测试
+
+fixtures/rankings_baseline.json 由改用发送者下标统计之前的 ChatAnalyzer 对 fixtures/chat_export.json
+生成（RANK_TOP_N=1000，即不截断），格式为 {榜单: [[uin, 值], ...]}；
+次数相同的成员按首次计入该项统计的先后排列，逐条累加（Counter）与 NumPy 分组统计两种方式的榜单
+都需与其完全一致
+"""
+
+import json
+
+import pytest
+
+from conftest import FIXTURES, require_jieba
+
+require_jieba()
+
+from analyzer import AnalysisOptions, ChatAnalyzer  # noqa: E402
+from utils import load_json  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def golden():
+    with open(FIXTURES / 'rankings_baseline.json', encoding='utf-8') as f:
+        return {title: [tuple(entry) for entry in ranked] for title, ranked in json.load(f).items()}
+
+
+def _rankings(**overrides):
+    data = load_json(str(FIXTURES / 'chat_export.json'))
+    analyzer = ChatAnalyzer(data, options=AnalysisOptions(**overrides))
+    analyzer.analyze()
+    return {
+        title: [(entry['uin'], entry['value']) for entry in ranked]
+        for title, ranked in analyzer.export_json()['rankings'].items()
+    }
+
+
+@pytest.mark.parametrize('use_numpy', [False, True])
+def test_full_rankings_match_baseline(golden, use_numpy):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    assert _rankings(RANK_TOP_N=1000, USE_NUMPY_STATS=use_numpy) == golden
+
+
+@pytest.mark.parametrize('use_numpy', [False, True])
+def test_top_n_rankings_match_baseline(golden, use_numpy):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    top_n = AnalysisOptions().RANK_TOP_N
+    assert _rankings(USE_NUMPY_STATS=use_numpy) == {title: ranked[:top_n] for title, ranked in golden.items()}
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""SpaceSavingCounter 的精度与误差上界"""
+
+import random
+from collections import Counter
+
+import pytest
+
+from sketch import SpaceSavingCounter
+
+
+def _zipf_stream(seed, length=20000, vocabulary=2000):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(vocabulary)]
+    return rng.choices(range(vocabulary), weights=weights, k=length)
+
+
+def test_exact_when_not_full():
+    sketch = SpaceSavingCounter(capacity=10)
+    for key in 'aabbbc':
+        sketch.add(key)
+    assert dict(sketch.items()) == {'a': 2, 'b': 3, 'c': 1}
+    assert sketch.error_bound() == 0
+    assert sketch.error('a') == 0
+    assert sketch.most_common(1) == [('b', 3)]
+
+
+def test_invalid_capacity():
+    with pytest.raises(ValueError):
+        SpaceSavingCounter(capacity=0)
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+@pytest.mark.parametrize('capacity', [5, 50, 200])
+def test_estimates_within_error_bound(seed, capacity):
+    stream = _zipf_stream(seed)
+    truth = Counter(stream)
+    sketch = SpaceSavingCounter(capacity=capacity)
+    for key in stream:
+        sketch.add(key)
+
+    n = len(stream)
+    assert sketch.total == n
+    assert len(sketch) == capacity
+    bound = sketch.error_bound()
+    assert bound <= n / capacity
+    assert bound == min(count for _, count in sketch.items())
+    for key, estimate in sketch.items():
+        assert truth[key] <= estimate <= truth[key] + sketch.error(key)
+        assert sketch.error(key) <= bound
+    # 真实频次超过 N / capacity 的键一定被保留
+    for key, count in truth.items():
+        if count > n / capacity:
+            assert key in sketch
+
+
+def test_weighted_add_and_heap_rebuild():
+    rng = random.Random(7)
+    truth = Counter()
+    sketch = SpaceSavingCounter(capacity=8)
+    # 大量计数更新触发懒删除堆的重建
+    for _ in range(5000):
+        key = rng.randrange(6)
+        count = rng.randint(1, 3)
+        truth[key] += count
+        sketch.add(key, count)
+    assert dict(sketch.items()) == dict(truth)
+    assert sketch.error_bound() == 0
+    assert len(sketch._heap) <= 4 * sketch.capacity + 64
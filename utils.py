@@ -1,209 +1,235 @@
 # -*- coding: utf-8 -*-
+import os
 import re
+import gzip
 import json
 import math
+import struct
+import zipfile
+from contextlib import contextmanager
 from datetime import datetime, timezone, timedelta
 from collections import Counter
 from logger import get_logger
 
 logger = get_logger(__name__)
 
-def load_json(filepath):
+_GZIP_MAGIC = b'\x1f\x8b'
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+_ZIP_MAGIC = b'PK\x03\x04'
+_UTF8_BOM = b'\xef\xbb\xbf'
+
+# 支持的导出文件扩展名（压缩格式按文件头识别，扩展名仅用于上传校验和提示）
+EXPORT_EXTENSIONS = ('.json', '.json.gz', '.json.zst', '.zip')
+
+MB = 1024 * 1024
+
+
+class ExportTooLarge(ValueError):
+    """导出内容（解压后）超过大小上限，后端映射为 413"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        super().__init__(f"解压后的聊天记录超过 {limit // MB} MB 上限")
+
+
+def max_export_content_bytes():
+    """导出内容解压后的大小上限（字节）：config.py 的 MAX_EXPORT_CONTENT_MB，无 config.py 时读环境变量；0 表示不限制"""
+    try:
+        import config as cfg
+        limit_mb = getattr(cfg, 'MAX_EXPORT_CONTENT_MB', 4096)
+    except ImportError:
+        limit_mb = os.getenv('MAX_EXPORT_CONTENT_MB', '4096')
+    return int(limit_mb) * MB
+
+
+class ByteCountingReader:
+    """
+    二进制只读流包装：先返回预读的字节，再继续读底层流，并统计从底层流读取的字节数
+    用于识别格式后不回退文件位置继续读取，以及按已读取的压缩字节数报告进度
+    """
+    
+    def __init__(self, stream, prefix=b''):
+        self._stream = stream
+        self._prefix = prefix
+        self.bytes_read = len(prefix)
+    
+    def read(self, size=-1):
+        if self._prefix:
+            if size is None or size < 0:
+                data, self._prefix = self._prefix, b''
+                rest = self._stream.read()
+                self.bytes_read += len(rest)
+                return data + rest
+            data, self._prefix = self._prefix[:size], self._prefix[size:]
+            return data
+        data = self._stream.read(size)
+        self.bytes_read += len(data)
+        return data
+    
+    def readable(self):
+        return True
+
+
+class LimitedReader:
+    """
+    解码后内容的读取上限：累计读出超过 limit 字节时抛出 ExportTooLarge，
+    防止压缩率极高的文件（压缩炸弹）在解压时耗尽内存
+    """
+    
+    _CHUNK = 1024 * 1024
+    
+    def __init__(self, stream, limit):
+        self._stream = stream
+        self.limit = limit
+        self.bytes_read = 0
+    
+    def read(self, size=-1):
+        if size is None or size < 0:
+            chunks = []
+            while True:
+                chunk = self.read(self._CHUNK)
+                if not chunk:
+                    return b''.join(chunks)
+                chunks.append(chunk)
+        data = self._stream.read(size)
+        self.bytes_read += len(data)
+        if self.bytes_read > self.limit:
+            raise ExportTooLarge(self.limit)
+        return data
+    
+    def readable(self):
+        return True
+
+
+def _read_head(stream, size):
+    """从流开头读取最多 size 个字节（流可能一次返回不足）"""
+    head = b''
+    while len(head) < size:
+        chunk = stream.read(size - len(head))
+        if not chunk:
+            break
+        head += chunk
+    return head
+
+
+def _skip_bom(stream):
+    head = _read_head(stream, len(_UTF8_BOM))
+    if head == _UTF8_BOM:
+        return ByteCountingReader(stream)
+    return ByteCountingReader(stream, head)
+
+
+def _is_json_entry(name):
+    return name.lower().endswith('.json') and not name.startswith('__MACOSX/') and '/._' not in f"/{name}"
+
+
+def _open_zstd(raw):
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("读取 .zst 压缩文件需要安装 zstandard: pip install zstandard")
+    return zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+
+
+@contextmanager
+def open_export(filepath, max_bytes=None):
+    """
+    打开聊天记录导出文件
+    按文件头自动识别 gzip / zstd / zip 压缩并跳过 UTF-8 BOM，
+    边读边解压，解压后的内容不落盘
+    
+    Args:
+        max_bytes: 解压后内容的字节数上限，超过时读取中抛出 ExportTooLarge；
+            为 None 时取 max_export_content_bytes()，为 0 时不限制
+    
+    Yields:
+        (stream, raw): 解码后的二进制流，以及统计原始（压缩）字节数的读取器
+    """
+    with open(filepath, 'rb') as f:
+        head = _read_head(f, 4)
+        raw = ByteCountingReader(f, head)
+        if head[:2] == _GZIP_MAGIC:
+            stream = gzip.GzipFile(fileobj=raw, mode='rb')
+        elif head == _ZSTD_MAGIC:
+            stream = _open_zstd(raw)
+        elif head == _ZIP_MAGIC:
+            archive = zipfile.ZipFile(f)
+            names = [name for name in archive.namelist() if _is_json_entry(name)]
+            if not names:
+                raise ValueError("zip 压缩包中没有找到 JSON 文件")
+            stream = archive.open(names[0])
+        else:
+            stream = raw
+        if max_bytes is None:
+            max_bytes = max_export_content_bytes()
+        if max_bytes:
+            stream = LimitedReader(stream, max_bytes)
+        yield _skip_bom(stream), raw
+
+
+def export_content_size(path, compressed_ratio=8):
+    """
+    导出文件解压后的大致字节数（用于估算分析内存），不解压文件
+    gzip 读取尾部长度字段，zip 读取目录中的 JSON 条目大小，zstd 读取帧头；
+    无法得知时按 compressed_ratio 估算
+    """
+    size = os.path.getsize(path)
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(18)
+            if head[:2] == _GZIP_MAGIC:
+                # ISIZE 为解压后长度对 2^32 取模，小于压缩后大小时说明已回绕
+                f.seek(-4, os.SEEK_END)
+                isize = struct.unpack('<I', f.read(4))[0]
+                return isize if isize >= size else size * compressed_ratio
+            if head[:4] == _ZIP_MAGIC:
+                with zipfile.ZipFile(path) as archive:
+                    entries = [info.file_size for info in archive.infolist() if _is_json_entry(info.filename)]
+                return entries[0] if entries else size * compressed_ratio
+            if head[:4] == _ZSTD_MAGIC:
+                try:
+                    import zstandard
+                    content_size = zstandard.frame_content_size(head)
+                    if content_size > 0:
+                        return content_size
+                except Exception:
+                    pass
+                return size * compressed_ratio
+    except (OSError, struct.error, zipfile.BadZipFile):
+        pass
+    return size
+
+
+def _load_json_standard(filepath, max_bytes=None):
+    """标准 json 加载（ijson 不可用或流式解析失败时）"""
+    with open_export(filepath, max_bytes) as (stream, _):
+        # 解码后的流不一定是 io 模块的流（TextIOWrapper 要求 writable 等方法），直接按 UTF-8 字节解析
+        return json.loads(stream.read().decode('utf-8'))
+
+
+def load_json(filepath, progress=None, max_bytes=None):
     """
     使用流式解析加载 JSON 文件，减少内存占用
     对于大文件，只保留必要的字段
+    
+    Args:
+        filepath: JSON 文件路径（可为 gzip / zstd / zip 压缩）
+        progress: 可选的 ProgressTracker，按已读取字节数报告 loading 阶段进度
+        max_bytes: 解压后内容的字节数上限（见 open_export），超过时抛出 ExportTooLarge
     """
+    if progress is not None:
+        progress.start('loading', total=os.path.getsize(filepath))
     try:
         import ijson
         logger.info("📖 使用流式解析加载 JSON 文件...")
         
-        with open(filepath, 'rb') as f:
-            parser = ijson.parse(f)
+        with open_export(filepath, max_bytes) as (stream, raw):
             result = {
                 'messages': [],
                 'chatInfo': {}
             }
-            
-            current_message = None
-            current_element = None
-            in_messages = False
-            in_elements = False
-            message_count = 0
-            
-            for prefix, event, value in parser:
-                if prefix == 'chatInfo.name' and event == 'string':
-                    result['chatInfo']['name'] = value
-                
-                elif prefix == 'messages' and event == 'start_array':
-                    in_messages = True
-                elif prefix == 'messages' and event == 'end_array':
-                    in_messages = False
-                
-                elif in_messages:
-                    if prefix == 'messages.item' and event == 'start_map':
-                        current_message = {}
-                        message_count += 1
-                        if message_count % 10000 == 0:
-                            logger.debug(f"   已处理 {message_count} 条消息...")
-                    
-                    elif prefix == 'messages.item' and event == 'end_map':
-                        if current_message:
-                            result['messages'].append(current_message)
-                            current_message = None
-                    
-                    # 保留必要字段
-                    elif current_message is not None:
-                        # 消息 ID
-                        if prefix == 'messages.item.messageId' and event == 'string':
-                            current_message['messageId'] = value
-                        
-                        # 时间戳
-                        elif prefix == 'messages.item.timestamp' and event in ('string', 'number'):
-                            current_message['timestamp'] = str(value)
-                        
-                        # 发送者信息
-                        elif prefix == 'messages.item.sender.uin' and event == 'string':
-                            if 'sender' not in current_message:
-                                current_message['sender'] = {}
-                            current_message['sender']['uin'] = value
-                        elif prefix == 'messages.item.sender.name' and event == 'string':
-                            if 'sender' not in current_message:
-                                current_message['sender'] = {}
-                            current_message['sender']['name'] = value
-                        
-                        # 内容
-                        elif prefix == 'messages.item.content.text' and event == 'string':
-                            if 'content' not in current_message:
-                                current_message['content'] = {}
-                            current_message['content']['text'] = value
-                        
-                        # resources（图片等资源）
-                        elif prefix.startswith('messages.item.content.resources'):
-                            if 'content' not in current_message:
-                                current_message['content'] = {}
-                            if 'resources' not in current_message['content']:
-                                current_message['content']['resources'] = []
-                            
-                            if prefix == 'messages.item.content.resources.item' and event == 'start_map':
-                                current_message['content']['resources'].append({})
-                            elif prefix.endswith('.type') and event == 'string':
-                                if current_message['content']['resources']:
-                                    current_message['content']['resources'][-1]['type'] = value
-                        
-                        # emojis
-                        elif prefix == 'messages.item.content.emojis' and event == 'start_array':
-                            if 'content' not in current_message:
-                                current_message['content'] = {}
-                            current_message['content']['emojis'] = []
-                        elif prefix == 'messages.item.content.emojis.item' and event in ('string', 'start_map'):
-                            if 'content' in current_message and 'emojis' in current_message['content']:
-                                current_message['content']['emojis'].append({} if event == 'start_map' else value)
-                        
-                        # mentions
-                        elif prefix.startswith('messages.item.content.mentions'):
-                            if 'content' not in current_message:
-                                current_message['content'] = {}
-                            if 'mentions' not in current_message['content']:
-                                current_message['content']['mentions'] = []
-                            
-                            if prefix == 'messages.item.content.mentions.item' and event == 'start_map':
-                                current_message['content']['mentions'].append({})
-                            elif prefix.endswith('.uid') and event == 'string':
-                                if current_message['content']['mentions']:
-                                    current_message['content']['mentions'][-1]['uid'] = value
-                        
-                        # multiForward
-                        elif prefix == 'messages.item.content.multiForward' and event == 'start_map':
-                            if 'content' not in current_message:
-                                current_message['content'] = {}
-                            current_message['content']['multiForward'] = {}
-                        
-                        # 回复信息
-                        elif prefix == 'messages.item.content.reply.referencedMessageId' and event == 'string':
-                            if 'content' not in current_message:
-                                current_message['content'] = {}
-                            if 'reply' not in current_message['content']:
-                                current_message['content']['reply'] = {}
-                            current_message['content']['reply']['referencedMessageId'] = value
-                        
-                        # rawMessage 中的关键字段
-                        elif prefix == 'messages.item.rawMessage.subMsgType' and event == 'number':
-                            if 'rawMessage' not in current_message:
-                                current_message['rawMessage'] = {}
-                            current_message['rawMessage']['subMsgType'] = value
-                        elif prefix == 'messages.item.rawMessage.sendMemberName' and event == 'string':
-                            if 'rawMessage' not in current_message:
-                                current_message['rawMessage'] = {}
-                            current_message['rawMessage']['sendMemberName'] = value
-                        
-                        # 完整保留 elements
-                        elif prefix == 'messages.item.rawMessage.elements' and event == 'start_array':
-                            if 'rawMessage' not in current_message:
-                                current_message['rawMessage'] = {}
-                            current_message['rawMessage']['elements'] = []
-                            in_elements = True
-                        
-                        elif prefix == 'messages.item.rawMessage.elements' and event == 'end_array':
-                            in_elements = False
-                        
-                        elif in_elements:
-                            if prefix == 'messages.item.rawMessage.elements.item' and event == 'start_map':
-                                current_element = {}
-                            
-                            elif prefix == 'messages.item.rawMessage.elements.item' and event == 'end_map':
-                                if current_element:
-                                    current_message['rawMessage']['elements'].append(current_element)
-                                    current_element = None
-                            
-                            # 元素类型
-                            elif prefix == 'messages.item.rawMessage.elements.item.elementType' and event == 'number':
-                                if current_element is not None:
-                                    current_element['elementType'] = value
-                            
-                            # textElement（文本/艾特）
-                            elif prefix.startswith('messages.item.rawMessage.elements.item.textElement'):
-                                if current_element is not None:
-                                    if 'textElement' not in current_element:
-                                        current_element['textElement'] = {}
-                                    
-                                    if prefix.endswith('.atType') and event == 'number':
-                                        current_element['textElement']['atType'] = value
-                                    elif prefix.endswith('.atUid') and event == 'string':
-                                        current_element['textElement']['atUid'] = value
-                                    elif prefix.endswith('.content') and event == 'string':
-                                        current_element['textElement']['content'] = value
-                            
-                            # picElement（图片）
-                            elif prefix.startswith('messages.item.rawMessage.elements.item.picElement'):
-                                if current_element is not None:
-                                    if 'picElement' not in current_element:
-                                        current_element['picElement'] = {}
-                                    
-                                    if prefix.endswith('.summary') and event == 'string':
-                                        current_element['picElement']['summary'] = value
-                            
-                            # replyElement（回复）
-                            elif prefix.startswith('messages.item.rawMessage.elements.item.replyElement'):
-                                if current_element is not None:
-                                    if 'replyElement' not in current_element:
-                                        current_element['replyElement'] = {}
-                                    
-                                    if prefix.endswith('.sourceMsgIdInRecords') and event == 'string':
-                                        current_element['replyElement']['sourceMsgIdInRecords'] = value
-                                    elif prefix.endswith('.replayMsgId') and event == 'string':
-                                        current_element['replyElement']['replayMsgId'] = value
-                                    elif prefix.endswith('.senderUid') and event in ('string', 'number'):
-                                        current_element['replyElement']['senderUid'] = str(value)                            
-
-                            # arkElement（链接/小程序）
-                            elif prefix == 'messages.item.rawMessage.elements.item.arkElement' and event == 'start_map':
-                                if current_element is not None:
-                                    current_element['arkElement'] = {}
-                            
-                            # multiForwardMsgElement（合并转发）
-                            elif prefix == 'messages.item.rawMessage.elements.item.multiForwardMsgElement' and event == 'start_map':
-                                if current_element is not None:
-                                    current_element['multiForwardMsgElement'] = {}
+            on_batch = (lambda count: progress.update(raw.bytes_read)) if progress is not None else None
+            result['messages'].extend(_iter_parsed_messages(ijson.parse(stream), result['chatInfo'], on_batch))
         
         # 确保群名有值
         chat_name = result['chatInfo'].get('name', '未知群聊')
@@ -211,22 +237,242 @@ def load_json(filepath):
             chat_name = '未知群聊'
             result['chatInfo']['name'] = chat_name
             
+        if progress is not None:
+            progress.finish()
         logger.info(f"✅ 成功加载 {len(result['messages'])} 条消息, 群聊: {chat_name}")
         return result
         
     except ImportError:
         logger.warning("⚠️ ijson 未安装，使用标准加载（大文件可能导致内存不足）")
-        with open(filepath, 'r', encoding='utf-8-sig') as f:
-            return json.load(f)
+        return _load_json_standard(filepath, max_bytes)
+    except ExportTooLarge:
+        raise
     except Exception as e:
         logger.warning(f"⚠️ 流式解析失败，尝试标准加载: {e}")
         try:
-            with open(filepath, 'r', encoding='utf-8-sig') as f:
-                return json.load(f)
+            return _load_json_standard(filepath, max_bytes)
         except MemoryError:
             logger.error("❌ 文件过大，无法加载到内存")
             raise MemoryError("JSON 文件过大，请减小文件大小或增加系统内存")
         
+def _iter_parsed_messages(parser, chat_info, on_batch=None):
+    """
+    从 ijson 事件流中逐条产出消息，只保留分析所需字段
+    群名在遇到时写入 chat_info['name']
+    on_batch: 可选，每读取 1000 条消息以已读条数调用一次（用于进度上报）
+    """
+    current_message = None
+    current_element = None
+    in_messages = False
+    in_elements = False
+    message_count = 0
+    
+    for prefix, event, value in parser:
+        if prefix == 'chatInfo.name' and event == 'string':
+            chat_info['name'] = value
+        
+        elif prefix == 'messages' and event == 'start_array':
+            in_messages = True
+        elif prefix == 'messages' and event == 'end_array':
+            in_messages = False
+        
+        elif in_messages:
+            if prefix == 'messages.item' and event == 'start_map':
+                current_message = {}
+                message_count += 1
+                if message_count % 1000 == 0:
+                    if on_batch is not None:
+                        on_batch(message_count)
+                    if message_count % 10000 == 0:
+                        logger.debug(f"   已处理 {message_count} 条消息...")
+            
+            elif prefix == 'messages.item' and event == 'end_map':
+                if current_message:
+                    yield current_message
+                    current_message = None
+            
+            # 保留必要字段
+            elif current_message is not None:
+                # 消息 ID
+                if prefix == 'messages.item.messageId' and event == 'string':
+                    current_message['messageId'] = value
+                
+                # 时间戳
+                elif prefix == 'messages.item.timestamp' and event in ('string', 'number'):
+                    current_message['timestamp'] = str(value)
+                
+                # 发送者信息
+                elif prefix == 'messages.item.sender.uin' and event == 'string':
+                    if 'sender' not in current_message:
+                        current_message['sender'] = {}
+                    current_message['sender']['uin'] = value
+                elif prefix == 'messages.item.sender.name' and event == 'string':
+                    if 'sender' not in current_message:
+                        current_message['sender'] = {}
+                    current_message['sender']['name'] = value
+                
+                # 内容
+                elif prefix == 'messages.item.content.text' and event == 'string':
+                    if 'content' not in current_message:
+                        current_message['content'] = {}
+                    current_message['content']['text'] = value
+                
+                # resources（图片等资源）
+                elif prefix.startswith('messages.item.content.resources'):
+                    if 'content' not in current_message:
+                        current_message['content'] = {}
+                    if 'resources' not in current_message['content']:
+                        current_message['content']['resources'] = []
+                    
+                    if prefix == 'messages.item.content.resources.item' and event == 'start_map':
+                        current_message['content']['resources'].append({})
+                    elif prefix.endswith('.type') and event == 'string':
+                        if current_message['content']['resources']:
+                            current_message['content']['resources'][-1]['type'] = value
+                
+                # emojis
+                elif prefix == 'messages.item.content.emojis' and event == 'start_array':
+                    if 'content' not in current_message:
+                        current_message['content'] = {}
+                    current_message['content']['emojis'] = []
+                elif prefix == 'messages.item.content.emojis.item' and event in ('string', 'start_map'):
+                    if 'content' in current_message and 'emojis' in current_message['content']:
+                        current_message['content']['emojis'].append({} if event == 'start_map' else value)
+                
+                # mentions
+                elif prefix.startswith('messages.item.content.mentions'):
+                    if 'content' not in current_message:
+                        current_message['content'] = {}
+                    if 'mentions' not in current_message['content']:
+                        current_message['content']['mentions'] = []
+                    
+                    if prefix == 'messages.item.content.mentions.item' and event == 'start_map':
+                        current_message['content']['mentions'].append({})
+                    elif prefix.endswith('.uid') and event == 'string':
+                        if current_message['content']['mentions']:
+                            current_message['content']['mentions'][-1]['uid'] = value
+                
+                # multiForward
+                elif prefix == 'messages.item.content.multiForward' and event == 'start_map':
+                    if 'content' not in current_message:
+                        current_message['content'] = {}
+                    current_message['content']['multiForward'] = {}
+                
+                # 回复信息
+                elif prefix == 'messages.item.content.reply.referencedMessageId' and event == 'string':
+                    if 'content' not in current_message:
+                        current_message['content'] = {}
+                    if 'reply' not in current_message['content']:
+                        current_message['content']['reply'] = {}
+                    current_message['content']['reply']['referencedMessageId'] = value
+                
+                # rawMessage 中的关键字段
+                elif prefix == 'messages.item.rawMessage.subMsgType' and event == 'number':
+                    if 'rawMessage' not in current_message:
+                        current_message['rawMessage'] = {}
+                    current_message['rawMessage']['subMsgType'] = value
+                elif prefix == 'messages.item.rawMessage.sendMemberName' and event == 'string':
+                    if 'rawMessage' not in current_message:
+                        current_message['rawMessage'] = {}
+                    current_message['rawMessage']['sendMemberName'] = value
+                
+                # 完整保留 elements
+                elif prefix == 'messages.item.rawMessage.elements' and event == 'start_array':
+                    if 'rawMessage' not in current_message:
+                        current_message['rawMessage'] = {}
+                    current_message['rawMessage']['elements'] = []
+                    in_elements = True
+                
+                elif prefix == 'messages.item.rawMessage.elements' and event == 'end_array':
+                    in_elements = False
+                
+                elif in_elements:
+                    if prefix == 'messages.item.rawMessage.elements.item' and event == 'start_map':
+                        current_element = {}
+                    
+                    elif prefix == 'messages.item.rawMessage.elements.item' and event == 'end_map':
+                        if current_element:
+                            current_message['rawMessage']['elements'].append(current_element)
+                            current_element = None
+                    
+                    # 元素类型
+                    elif prefix == 'messages.item.rawMessage.elements.item.elementType' and event == 'number':
+                        if current_element is not None:
+                            current_element['elementType'] = value
+                    
+                    # textElement（文本/艾特）
+                    elif prefix.startswith('messages.item.rawMessage.elements.item.textElement'):
+                        if current_element is not None:
+                            if 'textElement' not in current_element:
+                                current_element['textElement'] = {}
+                            
+                            if prefix.endswith('.atType') and event == 'number':
+                                current_element['textElement']['atType'] = value
+                            elif prefix.endswith('.atUid') and event == 'string':
+                                current_element['textElement']['atUid'] = value
+                            elif prefix.endswith('.content') and event == 'string':
+                                current_element['textElement']['content'] = value
+                    
+                    # picElement（图片）
+                    elif prefix.startswith('messages.item.rawMessage.elements.item.picElement'):
+                        if current_element is not None:
+                            if 'picElement' not in current_element:
+                                current_element['picElement'] = {}
+                            
+                            if prefix.endswith('.summary') and event == 'string':
+                                current_element['picElement']['summary'] = value
+                    
+                    # replyElement（回复）
+                    elif prefix.startswith('messages.item.rawMessage.elements.item.replyElement'):
+                        if current_element is not None:
+                            if 'replyElement' not in current_element:
+                                current_element['replyElement'] = {}
+                            
+                            if prefix.endswith('.sourceMsgIdInRecords') and event == 'string':
+                                current_element['replyElement']['sourceMsgIdInRecords'] = value
+                            elif prefix.endswith('.replayMsgId') and event == 'string':
+                                current_element['replyElement']['replayMsgId'] = value
+                            elif prefix.endswith('.senderUid') and event in ('string', 'number'):
+                                current_element['replyElement']['senderUid'] = str(value)                            
+
+                    # arkElement（链接/小程序）
+                    elif prefix == 'messages.item.rawMessage.elements.item.arkElement' and event == 'start_map':
+                        if current_element is not None:
+                            current_element['arkElement'] = {}
+                    
+                    # multiForwardMsgElement（合并转发）
+                    elif prefix == 'messages.item.rawMessage.elements.item.multiForwardMsgElement' and event == 'start_map':
+                        if current_element is not None:
+                            current_element['multiForwardMsgElement'] = {}
+
+
+def iter_messages(filepath, chat_info=None, max_bytes=None):
+    """
+    流式逐条读取消息（字段裁剪与 load_json 一致），不在内存中保留整个消息列表
+    
+    Args:
+        filepath: JSON 文件路径（可为 gzip / zstd / zip 压缩）
+        chat_info: 可选的 dict，读取过程中写入群聊信息（群名在文件读完后才保证可用）
+        max_bytes: 解压后内容的字节数上限（见 open_export）
+    """
+    if chat_info is None:
+        chat_info = {}
+    try:
+        import ijson
+    except ImportError:
+        logger.warning("⚠️ ijson 未安装，使用标准加载（大文件可能导致内存不足）")
+        data = _load_json_standard(filepath, max_bytes)
+        chat_info.update(data.get('chatInfo', {}))
+        if data.get('chatName'):
+            chat_info['name'] = data['chatName']
+        yield from data.get('messages', [])
+    else:
+        with open_export(filepath, max_bytes) as (stream, _):
+            yield from _iter_parsed_messages(ijson.parse(stream), chat_info)
+    if not chat_info.get('name'):
+        chat_info['name'] = '未知群聊'
+
+
 def extract_emojis(text):
     emoji_pattern = re.compile(
         "["
@@ -313,6 +559,11 @@ def clean_text(text, at_contents=None):
     
     return text
 
+def read_stopwords_file(path, encoding='utf-8'):
+    """读取停用词文件（每行一个词，忽略空行和 # 开头的注释行）"""
+    with open(path, 'r', encoding=encoding) as f:
+        return {line.strip() for line in f if line.strip() and not line.startswith('#')}
+
 def calculate_entropy(neighbor_freq):
     total = sum(neighbor_freq.values())
     if total == 0: